@@ -16,11 +16,17 @@
 # """
 
 import base64
+import hashlib
 import io
 import json
+import math
 import re
 import random
-from typing import Any, Dict, List, Optional
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
 
 import streamlit as st
 from PIL import Image
@@ -33,7 +39,9 @@ from streamlit.errors import StreamlitSecretNotFoundError
 #"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" = ""
 GROQ_BASE_URL_DIRECT = ""
 GEMINI_API_KEY_DIRECT = ""
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+# Point at another Ollama box with OLLAMA_HOST (same variable the Ollama CLI uses).
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+OLLAMA_API_URL = f"{OLLAMA_BASE_URL}/api/generate"
 
 # Audio processing imports
 try:
@@ -44,10 +52,70 @@ except ImportError:
 
 
 CHAT_MODES = ["Chat", "Generate Code", "Explain Code"]
-MODEL_OPTIONS = ["gpt-oss-120b", "llama3", "deepseek-r1", "deepseek-ocr:3b"]
+# Ollama options per generation profile. num_ctx is the same everywhere
+# (preload included): a request with a different num_ctx reloads the model.
+OLLAMA_NUM_CTX = 4096
+GENERATION_PROFILES = {
+    "chat": {"num_predict": 1024, "temperature": 0.7},
+    "code-gen": {"num_predict": 2048, "temperature": 0.2},
+    "explain": {"num_predict": 1536, "temperature": 0.4},
+    "image-debug": {"num_predict": 2048, "temperature": 0.2},
+}
+MODE_PROFILES = {"Chat": "chat", "Generate Code": "code-gen", "Explain Code": "explain"}
+AUTO_MODEL = "Auto"
+MODEL_OPTIONS = [AUTO_MODEL, "gpt-oss-120b", "llama3", "deepseek-r1", "deepseek-ocr:3b"]
+# Auto routing: which model serves each kind of prompt. "light" goes to the
+# smallest of LIGHT_MODELS that is already loaded, "code" to the first of
+# CODE_MODELS that is installed (else the "general" model).
+ROUTE_MODELS = {
+    "vision": "deepseek-ocr:3b",
+    "general": "llama3",
+    "heavy": "gpt-oss-120b",
+}
+LIGHT_MODELS = ["llama3", "deepseek-r1"]  # smallest first
+CODE_MODELS = ["deepseek-coder:6.7b", "qwen2.5-coder", "codellama"]  # preferred first
+# "heavy" is remote and paid: Auto only uses it when this (or the sidebar
+# checkbox) allows it and a GROQ_API_KEY is set; otherwise long prompts stay local.
+AUTO_ALLOW_REMOTE = os.environ.get("AUTO_ALLOW_REMOTE", "").lower() in ("1", "true", "yes")
+# Thresholds (in words) for the Auto classifier; tune them from ROUTER_LOG_FILE
+AUTO_SHORT_WORDS = 30
+AUTO_LONG_WORDS = 250
+ROUTER_LOG_FILE = os.environ.get("ROUTER_LOG_FILE", "router_log.jsonl")
+# Per-request Ollama timings (final frame + client TTFT); set to append them as JSONL
+METRICS_LOG_FILE = os.environ.get("OLLAMA_METRICS_JSONL")
+METRICS_WINDOW = 1000  # requests per model kept for the percentiles
+CODE_REQUEST_PATTERN = re.compile(
+    r"\b(?:write|implement|generate|create|build|refactor|fix|debug|optimi[sz]e|convert|port)\b"
+    r".*\b(?:functions?|programs?|scripts?|code|class(?:es)?|methods?|api|query|regex|"
+    r"algorithms?|components?|tests?|endpoints?|sql)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+CODE_SIGNAL_PATTERN = re.compile(
+    r"```|^\s*(?:def|class|import|from|public|private|function|const|let|var|#include)\b|[;{}]\s*$",
+    re.MULTILINE,
+)
+OLLAMA_MODELS = ["llama3", "deepseek-r1", "deepseek-ocr:3b"]
+# Models preloaded at startup; override with a comma-separated OLLAMA_PRELOAD_MODELS.
+PRELOAD_MODELS = [
+    m.strip()
+    for m in os.environ.get("OLLAMA_PRELOAD_MODELS", ",".join(OLLAMA_MODELS)).split(",")
+    if m.strip()
+]
+MODEL_KEEP_ALIVE = "30m"
+MODEL_REFRESH_SECONDS = 600
+MODEL_IDLE_SECONDS = 1800
 DEFAULT_SYSTEM_PROMPT = "You are ChatGPT, a large language model trained by OpenAI. You are helpful, creative, clever, and very friendly."
-CODE_BLOCK_PATTERN = re.compile(r"```(?P<lang>[\w+\-]*)\n(?P<code>.*?)```", re.DOTALL)
-OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
+OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
+# Several Ollama boxes: OLLAMA_HOSTS=http://gpu1:11434,http://gpu2:11434
+OLLAMA_HOSTS = [
+    h.strip().rstrip("/")
+    for h in os.environ.get("OLLAMA_HOSTS", OLLAMA_BASE_URL).split(",")
+    if h.strip()
+]
+HOST_LOAD_FACTOR = 1.25
+HOST_RETRY_SECONDS = 30
+# Streaming replies are repainted at most this many times a second.
+STREAM_FPS = 20
 
 # Random Concept Explainer Data
 CONCEPTS_BY_DIFFICULTY = {
@@ -366,7 +434,10 @@ def init_session_state() -> None:
     st.session_state.setdefault("temp_messages", [])
     st.session_state.setdefault("display_name", "User")
     st.session_state.setdefault("mode_select", CHAT_MODES[0])
-    st.session_state.setdefault("model_select", MODEL_OPTIONS[0])
+    st.session_state.setdefault("model_pinned", False)
+    if not st.session_state.model_pinned:
+        # Until the user picks a model, default to one that is already loaded
+        st.session_state.model_select = preferred_default_model()
     st.session_state.setdefault("system_prompt_area", DEFAULT_SYSTEM_PROMPT)
     st.session_state.setdefault("show_search_box", False)
     st.session_state.setdefault("chat_search", "")
@@ -393,10 +464,288 @@ def init_session_state() -> None:
     st.session_state.setdefault("regenerate_index", None)
     st.session_state.setdefault("tts_playing", False)
     st.session_state.setdefault("tts_message_index", None)
+    st.session_state.setdefault("generation_cancel", None)
 
     ensure_current_chat()
 
 
+@st.cache_resource
+def _residency_state() -> Dict[str, Any]:
+    """Per-process warm-up bookkeeping (survives reruns, shared by sessions)."""
+    return {
+        "lock": threading.Lock(),
+        "started": False,
+        "last_active": time.monotonic(),
+        "hot": set(),
+        "hot_checked": 0.0,
+        "installed": set(),
+        "installed_checked": 0.0,
+    }
+
+
+def _warm_models() -> None:
+    """Ask every Ollama host to load the preload models with a long keep_alive."""
+    for host in OLLAMA_HOSTS:
+        for model in PRELOAD_MODELS:
+            try:
+                requests.post(
+                    f"{host}/api/generate",
+                    json={
+                        "model": model,
+                        "keep_alive": MODEL_KEEP_ALIVE,
+                        "options": {"num_ctx": OLLAMA_NUM_CTX},
+                    },
+                    timeout=(5, 300),
+                )
+            except requests.exceptions.RequestException:
+                continue
+    _residency_state()["hot_checked"] = 0.0
+
+
+def _residency_loop(state: Dict[str, Any]) -> None:
+    """Refresh keep_alive while sessions are active, then let models unload."""
+    while True:
+        if time.monotonic() - state["last_active"] < MODEL_IDLE_SECONDS:
+            _warm_models()
+        time.sleep(MODEL_REFRESH_SECONDS)
+
+
+def start_model_residency() -> None:
+    """Preload the Ollama models once per process and mark this session active."""
+    state = _residency_state()
+    with state["lock"]:
+        state["last_active"] = time.monotonic()
+        if state["started"]:
+            return
+        state["started"] = True
+    threading.Thread(target=_residency_loop, args=(state,), daemon=True).start()
+
+
+def get_hot_models() -> set:
+    """Models currently loaded on any Ollama host, via /api/ps (cached for 5 s)."""
+    state = _residency_state()
+    if time.monotonic() - state["hot_checked"] < 5:
+        return set(state["hot"])
+
+    hot = set()
+    for host in OLLAMA_HOSTS:
+        try:
+            resp = requests.get(f"{host}/api/ps", timeout=(1, 2))
+            resp.raise_for_status()
+            for entry in resp.json().get("models", []):
+                name = entry.get("name", "")
+                hot.add(name[: -len(":latest")] if name.endswith(":latest") else name)
+        except (requests.exceptions.RequestException, ValueError):
+            continue
+
+    state["hot"] = hot
+    state["hot_checked"] = time.monotonic()
+    return set(hot)
+
+
+def get_installed_models() -> set:
+    """Models pulled on any Ollama host, via /api/tags (cached for 60 s)."""
+    state = _residency_state()
+    if time.monotonic() - state["installed_checked"] < 60:
+        return set(state["installed"])
+
+    installed = set()
+    for host in OLLAMA_HOSTS:
+        try:
+            resp = requests.get(f"{host}/api/tags", timeout=(1, 2))
+            resp.raise_for_status()
+            for entry in resp.json().get("models", []):
+                name = entry.get("name", "")
+                installed.add(name[: -len(":latest")] if name.endswith(":latest") else name)
+        except (requests.exceptions.RequestException, ValueError):
+            continue
+
+    state["installed"] = installed
+    state["installed_checked"] = time.monotonic()
+    return set(installed)
+
+
+def is_code_model(model: str) -> bool:
+    """True for any tag of a CODE_MODELS entry (codellama:7b, qwen2.5-coder:14b, ...)."""
+    return any(model == m or model.startswith(m + ":") for m in CODE_MODELS)
+
+
+def preferred_default_model() -> str:
+    """Auto, which already prefers loaded models; a loaded model if Auto is removed."""
+    if AUTO_MODEL in MODEL_OPTIONS:
+        return AUTO_MODEL
+    hot = get_hot_models()
+    return next((m for m in MODEL_OPTIONS if m in hot), MODEL_OPTIONS[0])
+
+
+def pin_model() -> None:
+    """The user chose a model explicitly; stop switching to resident ones."""
+    st.session_state.model_pinned = True
+
+
+def classify_prompt(
+    prompt: str, mode: str, has_image: bool, allow_remote: bool = False
+) -> tuple[str, str]:
+    """Cheap local routing decision for Auto: (route, reason). Long prompts
+    only get the remote "heavy" route with `allow_remote`."""
+    if has_image:
+        return "vision", "image attached"
+    if mode in ("Generate Code", "Explain Code"):
+        return "code", f"{mode} mode"
+    if CODE_SIGNAL_PATTERN.search(prompt):
+        return "code", "code in prompt"
+    if CODE_REQUEST_PATTERN.search(prompt):
+        return "code", "asks for code"
+    words = len(prompt.split())
+    length = f"{words} word" + ("" if words == 1 else "s")
+    if words <= AUTO_SHORT_WORDS:
+        return "light", length
+    if words >= AUTO_LONG_WORDS:
+        if allow_remote:
+            return "heavy", length
+        return "general", f"{length}, remote off"
+    return "general", length
+
+
+def route_model(route: str) -> str:
+    """Model for a route; "light" prefers the smallest model already loaded,
+    "code" the first installed code model."""
+    if route == "light":
+        hot = get_hot_models()
+        return next((m for m in LIGHT_MODELS if m in hot), LIGHT_MODELS[0])
+    if route == "code":
+        installed = sorted(get_installed_models())
+        for wanted in CODE_MODELS:
+            match = next((m for m in installed if m == wanted or m.startswith(wanted + ":")), None)
+            if match:
+                return match
+        return ROUTE_MODELS["general"]
+    return ROUTE_MODELS[route]
+
+
+def auto_remote_allowed() -> bool:
+    """Whether Auto may send long prompts to the remote "heavy" model."""
+    opted_in = st.session_state.get("auto_remote", AUTO_ALLOW_REMOTE)
+    return bool(opted_in and get_secret_or_env("GROQ_API_KEY"))
+
+
+@st.cache_resource
+def _router_state() -> Dict[str, Any]:
+    # Process-wide: latency samples per route and the log file lock
+    return {"lock": threading.Lock(), "routes": {}}
+
+
+def record_route(decision: Dict[str, Any]) -> None:
+    """Append one Auto decision (with its latency) to the router log and stats."""
+    state = _router_state()
+    with state["lock"]:
+        if not decision.get("cancelled"):
+            samples = state["routes"].setdefault(
+                decision["route"], {"model": decision["model"], "ttft_ms": [], "total_ms": []}
+            )
+            samples["model"] = decision["model"]
+            for key in ("ttft_ms", "total_ms"):
+                if decision.get(key) is not None:
+                    samples[key] = (samples[key] + [decision[key]])[-200:]
+        try:
+            with open(ROUTER_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(decision) + "\n")
+        except OSError:
+            pass
+
+
+def router_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-route request count, median time to first token and mean total time."""
+    state = _router_state()
+    with state["lock"]:
+        routes = {route: dict(samples) for route, samples in state["routes"].items()}
+    stats = {}
+    for route, samples in routes.items():
+        ttft = sorted(samples["ttft_ms"])
+        total = samples["total_ms"]
+        stats[route] = {
+            "model": samples["model"],
+            "count": len(total),
+            "ttft_p50_ms": ttft[len(ttft) // 2] if ttft else None,
+            "total_avg_ms": sum(total) / len(total) if total else None,
+        }
+    return stats
+
+
+@st.cache_resource
+def _metrics_state() -> Dict[str, Any]:
+    # Process-wide: recent request records per model
+    return {"lock": threading.Lock(), "models": {}}
+
+
+def record_request_metrics(
+    model: str,
+    profile: str,
+    host: str,
+    started: float,
+    first_chunk_at: Optional[float],
+    frame: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Store one request's timings; `frame` is Ollama's final frame ({} if it never came)."""
+    def ms(ns: Optional[int]) -> Optional[float]:
+        return round(ns / 1e6, 3) if ns else None
+
+    def rate(count: Optional[int], ns: Optional[int]) -> Optional[float]:
+        return round(count / (ns / 1e9), 2) if count and ns else None
+
+    record = {
+        "ts": time.time(),
+        "model": model,
+        "kind": profile,
+        "host": host,
+        "cancelled": not frame,
+        "ttft_ms": round((first_chunk_at - started) * 1000, 3) if first_chunk_at else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 3),
+        "eval_count": frame.get("eval_count"),
+        "eval_ms": ms(frame.get("eval_duration")),
+        "prompt_eval_count": frame.get("prompt_eval_count"),
+        "prompt_eval_ms": ms(frame.get("prompt_eval_duration")),
+        "load_ms": ms(frame.get("load_duration")),
+        "tokens_per_s": rate(frame.get("eval_count"), frame.get("eval_duration")),
+        "prompt_tokens_per_s": rate(frame.get("prompt_eval_count"), frame.get("prompt_eval_duration")),
+    }
+    state = _metrics_state()
+    with state["lock"]:
+        state["models"].setdefault(model, deque(maxlen=METRICS_WINDOW)).append(record)
+        if METRICS_LOG_FILE:
+            try:
+                with open(METRICS_LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError:
+                pass
+    return record
+
+
+def request_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-model request count and p50/p95/p99 of TTFT, total time and tokens/sec."""
+    state = _metrics_state()
+    with state["lock"]:
+        models = {model: list(records) for model, records in state["models"].items()}
+    stats = {}
+    for model, records in models.items():
+        stats[model] = {"count": len(records)}
+        for key in ("ttft_ms", "total_ms", "tokens_per_s"):
+            values = sorted(r[key] for r in records if r.get(key) is not None)
+            stats[model][key] = {
+                f"p{int(q * 100)}": values[max(0, math.ceil(q * len(values)) - 1)] if values else None
+                for q in (0.5, 0.95, 0.99)
+            }
+    return stats
+
+
+def request_metrics_jsonl() -> str:
+    """The recorded requests, oldest first, as JSON lines."""
+    state = _metrics_state()
+    with state["lock"]:
+        records = [r for records in state["models"].values() for r in records]
+    return "".join(json.dumps(r) + "\n" for r in sorted(records, key=lambda r: r["ts"]))
+
+
 def inject_custom_css() -> None:
     """Inject Code Gen AI-inspired dark theme styling."""
     st.markdown(
@@ -854,8 +1203,170 @@ def transcribe_audio(audio_bytes: bytes) -> str:
         return f"[Audio processing error: {e}]"
 
 
-def stream_generate(model: str, prompt: str, image: Optional[Image.Image] = None):
+@st.cache_resource
+def _host_state() -> Dict[str, Any]:
+    """Per-process host bookkeeping (survives reruns, shared by sessions)."""
+    return {
+        "lock": threading.Lock(),
+        "in_flight": {host: 0 for host in OLLAMA_HOSTS},
+        "down_until": {},
+        "homes": {},
+        "affinity": {"hits": 0, "moves": 0, "new": 0},
+    }
+
+
+def _affinity_rank(chat_id: str, host: str) -> bytes:
+    return hashlib.blake2b(f"{chat_id}|{host}".encode("utf-8"), digest_size=8).digest()
+
+
+def pick_ollama_host(chat_id: Optional[str] = None) -> str:
+    """Pick the Ollama host for a request and count it as in flight.
+
+    Rendezvous hashing on the chat id keeps a conversation on the node that
+    already holds its prompt cache. A node more than HOST_LOAD_FACTOR times the
+    average load is skipped, and a node that refused a connection is left out
+    for HOST_RETRY_SECONDS, which rehomes its chats onto the next-ranked node.
+    """
+    state = _host_state()
+    in_flight = state["in_flight"]
+    now = time.monotonic()
+    with state["lock"]:
+        alive = [h for h in OLLAMA_HOSTS if state["down_until"].get(h, 0.0) <= now]
+        alive = alive or list(OLLAMA_HOSTS)
+
+        if not chat_id:
+            host = min(alive, key=lambda h: in_flight[h])
+        else:
+            ranked = sorted(alive, key=lambda h: _affinity_rank(chat_id, h), reverse=True)
+            total = sum(in_flight[h] for h in alive) + 1
+            limit = math.ceil(HOST_LOAD_FACTOR * total / len(alive))
+            host = next((h for h in ranked if in_flight[h] < limit), ranked[0])
+
+            previous = state["homes"].get(chat_id)
+            if previous is None:
+                state["affinity"]["new"] += 1
+            elif previous == host:
+                state["affinity"]["hits"] += 1
+            else:
+                state["affinity"]["moves"] += 1
+            state["homes"][chat_id] = host
+
+        in_flight[host] += 1
+    return host
+
+
+def release_ollama_host(host: str, failed: bool = False) -> None:
+    """Return a host picked by pick_ollama_host; failed hosts sit out for a while."""
+    state = _host_state()
+    with state["lock"]:
+        state["in_flight"][host] -= 1
+        if failed:
+            state["down_until"][host] = time.monotonic() + HOST_RETRY_SECONDS
+
+
+def affinity_hit_rate() -> float:
+    """Share of repeat chat requests that landed on the same host as before."""
+    stats = _host_state()["affinity"]
+    routed = stats["hits"] + stats["moves"]
+    return stats["hits"] / routed if routed else 0.0
+
+
+class CancelToken:
+    """Cancellation handle for one generation; callbacks run on the cancelling thread."""
+
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._callbacks: List[Any] = []
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback) -> None:
+        """Run `callback` on cancel, or right away if already cancelled."""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def _abort_response(response: requests.Response) -> None:
+    """Drop a streaming response's connection so Ollama stops generating.
+
+    The socket is shut down first because close() alone does not wake a read
+    blocked in another thread.
+    """
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def profile_options(profile: str) -> Dict[str, Any]:
+    """Ollama options for a generation profile (unknown names get "chat")."""
+    options = dict(GENERATION_PROFILES.get(profile) or GENERATION_PROFILES["chat"])
+    options["num_ctx"] = OLLAMA_NUM_CTX
+    return options
+
+
+def stream_generate(
+    model: str,
+    prompt: str,
+    image: Optional[Image.Image] = None,
+    chat_id: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+    profile: str = "chat",
+):
     """Stream generate response from Ollama API as a generator."""
+    host = pick_ollama_host(chat_id)
+    failed = False
+    frame: Dict[str, Any] = {}
+    started = time.perf_counter()
+    first_chunk_at = None
+    try:
+        for chunk in _stream_generate_from(
+            host, model, prompt, image, cancel, profile_options(profile), on_done=frame.update
+        ):
+            if chunk is None:
+                failed = True
+                continue
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            yield chunk
+    finally:
+        release_ollama_host(host, failed=failed)
+        if not failed:
+            record_request_metrics(model, profile, host, started, first_chunk_at, frame)
+
+
+def _stream_generate_from(
+    host: str,
+    model: str,
+    prompt: str,
+    image: Optional[Image.Image],
+    cancel: Optional[CancelToken] = None,
+    options: Optional[Dict[str, Any]] = None,
+    on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+):
+    """Stream one generation from a single Ollama host.
+
+    Yields None once if the host refused the connection, so the caller can
+    take it out of rotation. Cancelling `cancel` drops the connection.
+    `on_done` gets Ollama's final frame (token counts and durations).
+    """
     headers = {"Content-Type": "application/json"}
     
     # Use chat API for models like deepseek-ocr:3b
@@ -873,40 +1384,49 @@ def stream_generate(model: str, prompt: str, image: Optional[Image.Image] = None
         payload = {
             "model": model,
             "messages": [message],
-            "stream": True
+            "stream": True,
+            "options": options or {},
         }
         
         try:
-            response = requests.post(
-                OLLAMA_CHAT_URL,
+            with requests.post(
+                f"{host}/api/chat",
                 headers=headers,
                 json=payload,
                 stream=True,
                 timeout=120
-            )
-            response.raise_for_status()
+            ) as response:
+                response.raise_for_status()
+                if cancel is not None:
+                    cancel.on_cancel(lambda: _abort_response(response))
             
-            # Stream and yield only the assistant content
-            for line in response.iter_lines():
-                if not line:
-                    continue
+                # Stream and yield only the assistant content
+                for line in response.iter_lines():
+                    if cancel is not None and cancel.cancelled:
+                        break
+                    if not line:
+                        continue
                 
-                try:
-                    data = json.loads(line.decode("utf-8"))
-                except json.JSONDecodeError:
-                    continue
+                    try:
+                        data = json.loads(line.decode("utf-8"))
+                    except json.JSONDecodeError:
+                        continue
                 
-                # Extract content from message
-                if "message" in data and "content" in data["message"]:
-                    content = data["message"]["content"]
-                    if content:
-                        yield content
+                    # Extract content from message
+                    if "message" in data and "content" in data["message"]:
+                        content = data["message"]["content"]
+                        if content:
+                            yield content
                 
-                # Stop when done
-                if data.get("done"):
-                    break
+                    # Stop when done
+                    if data.get("done"):
+                        if on_done is not None:
+                            on_done(data)
+                        break
                 
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                yield None
             yield f"[Error connecting to Ollama: {e}. Make sure Ollama is running locally.]"
         except Exception as e:
             yield f"[Ollama API error: {e}]"
@@ -915,7 +1435,8 @@ def stream_generate(model: str, prompt: str, image: Optional[Image.Image] = None
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": True
+            "stream": True,
+            "options": options or {},
         }
 
         if image is not None:
@@ -923,10 +1444,14 @@ def stream_generate(model: str, prompt: str, image: Optional[Image.Image] = None
             payload["images"] = [encoded_image]
 
         try:
-            with requests.post(OLLAMA_API_URL, headers=headers, json=payload, stream=True, timeout=60) as resp:
+            with requests.post(f"{host}/api/generate", headers=headers, json=payload, stream=True, timeout=60) as resp:
                 resp.raise_for_status()
+                if cancel is not None:
+                    cancel.on_cancel(lambda: _abort_response(resp))
                 
                 for raw_line in resp.iter_lines(decode_unicode=True):
+                    if cancel is not None and cancel.cancelled:
+                        break
                     if not raw_line:
                         continue
                     
@@ -946,28 +1471,246 @@ def stream_generate(model: str, prompt: str, image: Optional[Image.Image] = None
                         yield chunk_text
                     
                     if obj.get("done") is True:
+                        if on_done is not None:
+                            on_done(obj)
                         break
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                yield None
             yield f"[Error connecting to Ollama: {e}. Make sure Ollama is running locally.]"
         except Exception as e:
             yield f"[Ollama API error: {e}]"
 
 
-def parse_and_render_segments(content: str) -> None:
-    """Render Markdown text mixed with fenced code blocks."""
-    start = 0
-    for match in CODE_BLOCK_PATTERN.finditer(content):
-        text_chunk = content[start : match.start()].strip()
-        if text_chunk:
-            st.markdown(text_chunk)
+class _SharedStream:
+    """Chunks of one upstream stream, fanned out to every subscriber."""
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.cancel = CancelToken()
+        self.cond = threading.Condition()
+
+
+@st.cache_resource
+def _shared_stream_registry() -> Dict[str, Any]:
+    """In-flight streams for the whole server process.
+
+    Kept in a cached resource because Streamlit re-executes this script (and so
+    its module globals) on every rerun and in every session.
+    """
+    return {"lock": threading.Lock(), "streams": {}}
+
+
+def _forget_shared_stream(key: tuple, shared: _SharedStream) -> None:
+    registry = _shared_stream_registry()
+    with registry["lock"]:
+        if registry["streams"].get(key) is shared:
+            del registry["streams"][key]
+
+
+def _pump_shared_stream(key: tuple, shared: _SharedStream, factory) -> None:
+    """Drain the upstream generator into the shared chunk list."""
+    upstream = factory(shared.cancel)
+    try:
+        for chunk in upstream:
+            if shared.cancel.cancelled:
+                break
+            with shared.cond:
+                shared.chunks.append(chunk)
+                shared.cond.notify_all()
+    finally:
+        upstream.close()
+        _forget_shared_stream(key, shared)
+        with shared.cond:
+            shared.done = True
+            shared.cond.notify_all()
+
+
+def _leave_shared_stream(key: tuple, shared: _SharedStream) -> None:
+    """Drop a subscriber; the last one to leave early cancels the upstream request."""
+    registry = _shared_stream_registry()
+    with registry["lock"]:
+        shared.subscribers -= 1
+        if shared.subscribers or shared.done:
+            return
+        # Unregister under the same lock so a new caller can't join a stream
+        # that is about to be cancelled
+        if registry["streams"].get(key) is shared:
+            del registry["streams"][key]
+    shared.cancel.cancel()
 
-        language = match.group("lang") or "text"
-        st.code(match.group("code"), language=language.strip())
-        start = match.end()
 
-    tail = content[start:].strip()
-    if tail:
-        st.markdown(tail)
+def coalesced_stream(key: tuple, factory, cancel: Optional[CancelToken] = None):
+    """Share one upstream stream between identical concurrent requests.
+
+    Template prompts (concept explainer, bug debugger, ...) are often sent by
+    several sessions at the same moment. The first caller starts `factory()` on
+    a worker thread; later callers with the same key replay the chunks received
+    so far and then follow the live stream instead of queueing a duplicate
+    generation in Ollama.
+
+    `factory` receives the shared stream's CancelToken. Cancelling `cancel`
+    (or closing this generator) detaches one caller; the upstream request is
+    dropped once nobody is left reading it.
+    """
+    registry = _shared_stream_registry()
+    with registry["lock"]:
+        shared = registry["streams"].get(key)
+        if shared is None:
+            shared = _SharedStream()
+            registry["streams"][key] = shared
+            threading.Thread(
+                target=_pump_shared_stream, args=(key, shared, factory), daemon=True
+            ).start()
+        shared.subscribers += 1
+
+    def stopped() -> bool:
+        return cancel is not None and cancel.cancelled
+
+    if cancel is not None:
+        def wake() -> None:
+            with shared.cond:
+                shared.cond.notify_all()
+        cancel.on_cancel(wake)
+
+    index = 0
+    try:
+        while not stopped():
+            with shared.cond:
+                while index >= len(shared.chunks) and not shared.done and not stopped():
+                    shared.cond.wait()
+                pending = shared.chunks[index:]
+                finished = shared.done
+            for chunk in pending:
+                if stopped():
+                    return
+                yield chunk
+            index += len(pending)
+            if finished and index >= len(shared.chunks):
+                return
+    finally:
+        _leave_shared_stream(key, shared)
+
+
+class SegmentParser:
+    """Split a reply into Markdown text and ``` code segments as it streams in.
+
+    Closed segments are returned once from `feed`; only the trailing open
+    segment is re-examined when more text arrives. An unterminated fence is
+    reported as an open code segment.
+    """
+
+    def __init__(self) -> None:
+        self.in_code = False
+        self.lang: Optional[str] = None
+        self.pending = ""
+        self._scan = 0
+        self._fence_wait = False
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self.pending += chunk
+        closed: List[tuple] = []
+        while True:
+            fence = self.pending.find("```", self._scan)
+            if fence < 0:
+                # A fence may be split across chunks, so rescan the last two chars.
+                self._scan = max(len(self.pending) - 2, 0)
+                self._fence_wait = False
+                return closed
+
+            if self.in_code:
+                closed.append(("code", self.pending[:fence], self.lang))
+                self.pending = self.pending[fence + 3 :]
+                self.in_code = False
+            else:
+                newline = self.pending.find("\n", fence + 3)
+                if newline < 0:
+                    # Opening fence seen but its language line is not complete yet.
+                    self._scan = fence
+                    self._fence_wait = True
+                    return closed
+                closed.append(("text", self.pending[:fence], None))
+                self.lang = self.pending[fence + 3 : newline].strip() or None
+                self.pending = self.pending[newline + 1 :]
+                self.in_code = True
+            self._scan = 0
+
+    def open_segment(self) -> tuple:
+        if self.in_code:
+            return ("code", self.pending, self.lang)
+        if self._fence_wait:
+            return ("text", self.pending[: self._scan], None)
+        return ("text", self.pending, None)
+
+    def close(self) -> List[tuple]:
+        return [self.open_segment() if self.in_code else ("text", self.pending, None)]
+
+
+def render_segment(target: Any, segment: tuple, cursor: str = "") -> None:
+    """Draw one parsed segment into `target` (the `st` module or a placeholder)."""
+    kind, body, lang = segment
+    if kind == "code":
+        target.code(body, language=(lang or "text").strip())
+        return
+    text = body.strip()
+    if text:
+        target.markdown(text + cursor)
+
+
+class StreamFlusher:
+    """Repaint a streaming reply at most `fps` times a second.
+
+    Chunks go into a list and are joined only for the final text. Each frame
+    feeds the new text to a SegmentParser: closed text and code segments keep
+    their own frozen element and only the open tail is redrawn.
+    """
+
+    def __init__(self, placeholder: Any, fps: int = STREAM_FPS, max_pending: int = 2048) -> None:
+        self.container = placeholder.container()
+        self.tail = self.container.empty()
+        self.parser = SegmentParser()
+        self.interval = 1.0 / fps
+        self.max_pending = max_pending
+        self.parts: List[str] = []
+        self._unrendered: List[str] = []
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self.parts.append(chunk)
+        self._unrendered.append(chunk)
+        self._pending += len(chunk)
+        if self._pending >= self.max_pending or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self, final: bool = False) -> None:
+        for segment in self.parser.feed("".join(self._unrendered)):
+            render_segment(self.tail, segment)
+            self.tail = self.container.empty()
+        if final:
+            for segment in self.parser.close():
+                render_segment(self.tail, segment)
+        else:
+            render_segment(self.tail, self.parser.open_segment(), cursor="▌")
+        self._unrendered = []
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> str:
+        """Draw the last frame without the cursor and return the full text."""
+        self.flush(final=True)
+        return "".join(self.parts)
+
+
+def parse_and_render_segments(content: str) -> None:
+    """Render Markdown text mixed with fenced code blocks."""
+    parser = SegmentParser()
+    for segment in parser.feed(content) + parser.close():
+        render_segment(st, segment)
 
 
 def render_chat_history(messages: List[Dict[str, Any]]) -> None:
@@ -1419,8 +2162,60 @@ def rename_chat(chat_id: str, new_title: str) -> None:
         st.session_state.rename_chat_title = ""
 
 
+TITLE_STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does for from get
+had has have how i if in into is it its just let like me my no not of on or our please so some
+than that the their them then there these this those to too up us use using was we were what
+when where which while who why will with would you your hi hii hey heyy hello thanks ok okay
+write give show tell explain create build generate implement need want help find provide make
+code program script snippet example simple basic function method way fix work vs two
+def return class import print if elif else for while try except self none true false
+""".split())
+TITLE_LANGUAGES = {
+    "python": "Python", "java": "Java", "javascript": "JavaScript", "js": "JavaScript",
+    "typescript": "TypeScript", "c++": "C++", "cpp": "C++", "c#": "C#", "c": "C",
+    "rust": "Rust", "go": "Go", "sql": "SQL", "html": "HTML", "css": "CSS", "react": "React",
+}
+TITLE_ACRONYMS = {"api", "sql", "html", "css", "json", "http", "dfs", "bfs", "oop", "csv", "rest"}
+_TITLE_ERROR = re.compile(r"\b([A-Z]\w*(?:Error|Exception))\b")
+_TITLE_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:[+#]{1,2})?")
+_TITLE_CAMEL = re.compile(r"[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])")
+
+
+def local_title(text: str, max_words: int = 5) -> tuple[str, float]:
+    """Extractive title (language first, then topic words) and a 0-1 confidence."""
+    prose = re.sub(r"```.*?(?:```|$)", " ", text, flags=re.DOTALL)
+    errors = {name.lower(): name for name in _TITLE_ERROR.findall(text)}
+    language: Optional[str] = None
+    keywords: List[str] = list(errors)
+
+    for token in _TITLE_WORD.findall(prose):
+        if token.lower() in errors:
+            continue
+        camel = token[1:] != token[1:].lower() and not token.isupper()
+        for word in (w.lower() for w in _TITLE_CAMEL.findall(token)) if camel else [token.lower()]:
+            if word in TITLE_LANGUAGES:
+                language = language or word
+            elif word not in TITLE_STOPWORDS and len(word) > 1 and word not in keywords:
+                keywords.append(word)
+
+    def display(word: str) -> str:
+        if word in errors:
+            return errors[word]
+        if word in TITLE_ACRONYMS:
+            return word.upper()
+        return word[:1].upper() + word[1:]
+
+    words = ([TITLE_LANGUAGES[language]] if language else []) + [display(w) for w in keywords]
+    confidence = min(1.0, len(keywords) / 2.0 + (0.25 if language and keywords else 0.0))
+    return " ".join(words[:max_words]), confidence
+
+
 def summarize_title(prompt: str) -> str:
     """Generate a short title from the first user message."""
+    title, confidence = local_title(prompt)
+    if confidence >= 0.5:
+        return title
     condensed = prompt.strip().splitlines()[0][:40]
     return condensed + ("…" if len(prompt.strip()) > len(condensed) else "") or "New chat"
 
@@ -1432,6 +2227,8 @@ def send_to_backend(
     system_prompt: str,
     model: str,
     image: Optional[Image.Image] = None,
+    chat_id: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
 ):
     """Send messages to the selected backend model and yield assistant text chunks for streaming.
 
@@ -1439,7 +2236,9 @@ def send_to_backend(
     - If `model` == "gpt-oss-120b" use the Groq/OpenAI-compatible Responses API.
       The function will first attempt to use the `openai.OpenAI` SDK if available,
       otherwise it will POST to the configured `GROQ_BASE_URL` using `requests`.
-    - For llama3/deepseek-r1, uses Ollama API.
+    - For llama3/deepseek-r1 and the CODE_MODELS, uses Ollama API. `chat_id` keeps a conversation
+      on the same Ollama host when several are configured.
+    - Cancelling `cancel` stops the stream and drops the upstream request.
     - For other modes/models the function falls back to a friendly stub message.
 
     Keys:
@@ -1475,6 +2274,8 @@ def send_to_backend(
     
     # Prepend mode instructions to user prompt
     full_prompt = mode_instructions + user_prompt
+    # Image questions are debugging/reading requests whatever the mode
+    profile = "image-debug" if image is not None else MODE_PROFILES.get(mode, "chat")
 
     # --------------------
     # Groq / OpenAI-compatible (gpt-oss-120b)
@@ -1505,6 +2306,9 @@ def send_to_backend(
             )
             
             for event in response:
+                if cancel is not None and cancel.cancelled:
+                    response.close()
+                    break
                 if hasattr(event, "delta"):
                     delta = event.delta
                     if hasattr(delta, "text") and delta.text:
@@ -1520,10 +2324,22 @@ def send_to_backend(
         return
 
     # --------------------
-    # Ollama Models (llama3, deepseek-r1)
+    # Ollama Models (llama3, deepseek-r1, code models)
     # --------------------
-    if model in ["llama3", "deepseek-r1", "deepseek-ocr:3b"]:
-        yield from stream_generate(model, full_prompt, image)
+    if model in OLLAMA_MODELS or is_code_model(model):
+        if image is None:
+            yield from coalesced_stream(
+                (model, profile, full_prompt),
+                lambda upstream_cancel: stream_generate(
+                    model, full_prompt, chat_id=chat_id, cancel=upstream_cancel,
+                    profile=profile,
+                ),
+                cancel=cancel,
+            )
+        else:
+            yield from stream_generate(
+                model, full_prompt, image, chat_id=chat_id, cancel=cancel, profile=profile
+            )
         return
 
     # --------------------
@@ -1570,6 +2386,78 @@ def send_to_backend(
     )
 
 
+def stop_generation() -> None:
+    """Cancel the reply this session is streaming, if any."""
+    cancel = st.session_state.get("generation_cancel")
+    if cancel is not None:
+        cancel.cancel()
+    st.session_state.generation_cancel = None
+
+
+def stream_assistant_reply(messages: List[Dict[str, Any]], **backend_kwargs: Any) -> str:
+    """Stream a reply into the current chat message, with a Stop button.
+
+    A Stop click or a new prompt reruns the script and interrupts this loop;
+    the finally block then cancels the request so Ollama stops generating, and
+    the partial answer is kept in `messages`.
+    """
+    stop_generation()
+    cancel = CancelToken()
+    st.session_state.generation_cancel = cancel
+
+    decision = None
+    if backend_kwargs.get("model") == AUTO_MODEL:
+        prompt = next(
+            (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        route, reason = classify_prompt(
+            prompt,
+            backend_kwargs.get("mode", ""),
+            backend_kwargs.get("image") is not None,
+            allow_remote=auto_remote_allowed(),
+        )
+        backend_kwargs["model"] = route_model(route)
+        decision = {
+            "ts": time.time(),
+            "route": route,
+            "reason": reason,
+            "model": backend_kwargs["model"],
+            "mode": backend_kwargs.get("mode"),
+            "words": len(prompt.split()),
+            "chars": len(prompt),
+        }
+        st.caption(f"Auto → {decision['model']} ({route}: {reason})")
+
+    stop_slot = st.empty()
+    stop_slot.button("⏹ Stop generating", key="stop_generation", on_click=stop_generation)
+    flusher = StreamFlusher(st.empty())
+    started = time.perf_counter()
+    first_chunk_at = None
+    stream = send_to_backend(messages, cancel=cancel, **backend_kwargs)
+    finished = False
+    try:
+        for chunk in stream:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            flusher.write(chunk)
+        finished = True
+    finally:
+        cancel.cancel()
+        stream.close()
+        if not finished and flusher.parts:
+            messages.append({"role": "assistant", "content": "".join(flusher.parts)})
+        if decision is not None:
+            decision["ttft_ms"] = (
+                round((first_chunk_at - started) * 1000, 1) if first_chunk_at else None
+            )
+            decision["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            decision["cancelled"] = not finished
+            record_route(decision)
+
+    stop_slot.empty()
+    return flusher.close()
+
+
 def handle_user_prompt(
     user_prompt: str, 
     mode: str, 
@@ -1593,22 +2481,18 @@ def handle_user_prompt(
             st.image(image, width=300)
         st.markdown(user_prompt)
     
+    chat_id = None if st.session_state.is_temp_chat else st.session_state.current_chat_id
+
     # Display streaming assistant response
     with st.chat_message("assistant", avatar="✨"):
-        message_placeholder = st.empty()
-        full_response = ""
-        
-        for chunk in send_to_backend(
+        full_response = stream_assistant_reply(
             messages,
             mode=mode,
             system_prompt=system_prompt,
             model=model,
             image=image,
-        ):
-            full_response += chunk
-            message_placeholder.markdown(full_response + "▌")
-        
-        message_placeholder.markdown(full_response)
+            chat_id=chat_id,
+        )
     
     messages.append({"role": "assistant", "content": full_response})
 
@@ -1802,19 +2686,68 @@ def render_sidebar() -> tuple[str, str, str]:
         # Model & Settings
         st.markdown('<div class="sidebar-section-title">Settings</div>', unsafe_allow_html=True)
         
+        hot_models = get_hot_models()
         model = st.selectbox(
             "Model",
             options=MODEL_OPTIONS,
             key="model_select",
-            help="Select the AI model to use"
+            format_func=lambda m: f"{m} • loaded" if m in hot_models else m,
+            on_change=pin_model,
+            help="Select the AI model to use (• loaded = already in memory, answers start faster). "
+                 "Auto picks one per prompt."
         )
+
+        if model == AUTO_MODEL:
+            has_groq_key = bool(get_secret_or_env("GROQ_API_KEY"))
+            st.checkbox(
+                "Let Auto use gpt-oss-120b for long prompts",
+                value=AUTO_ALLOW_REMOTE,
+                key="auto_remote",
+                disabled=not has_groq_key,
+                help="Remote and paid (Groq). Off: Auto only picks local Ollama models."
+                     + ("" if has_groq_key else " Needs GROQ_API_KEY."),
+            )
+
+        routes = router_stats()
+        if model == AUTO_MODEL and routes:
+            with st.expander("Auto routing"):
+                for route, stats in sorted(routes.items()):
+                    ttft = f"{stats['ttft_p50_ms']:.0f} ms" if stats["ttft_p50_ms"] is not None else "–"
+                    total = f"{stats['total_avg_ms'] / 1000:.1f} s" if stats["total_avg_ms"] is not None else "–"
+                    st.caption(
+                        f"{route} → {stats['model']}: {stats['count']} · "
+                        f"first token p50 {ttft} · avg {total}"
+                    )
         
+        metrics = request_metrics()
+        if metrics:
+            with st.expander("Ollama metrics"):
+                for name, stats in sorted(metrics.items()):
+                    ttft, speed = stats["ttft_ms"], stats["tokens_per_s"]
+                    st.caption(
+                        f"{name}: {stats['count']} requests · first token p50/p95/p99 "
+                        + " / ".join(f"{v:.0f}" if v is not None else "–" for v in ttft.values())
+                        + " ms · "
+                        + (f"{speed['p50']:.1f} tok/s p50" if speed["p50"] is not None else "– tok/s")
+                    )
+                st.download_button(
+                    "Export JSONL",
+                    request_metrics_jsonl(),
+                    file_name="ollama_metrics.jsonl",
+                    mime="application/jsonl",
+                )
+
         mode = st.selectbox(
             "Mode", 
             options=CHAT_MODES, 
             key="mode_select",
             help="Select conversation mode"
         )
+
+        if len(OLLAMA_HOSTS) > 1:
+            st.caption(
+                f"{len(OLLAMA_HOSTS)} Ollama hosts · chat affinity {affinity_hit_rate():.0%}"
+            )
         
         with st.expander("⚙️ Advanced"):
             display_name = st.text_input("Your name", value=st.session_state.display_name)
@@ -2017,6 +2950,7 @@ def main() -> None:
         layout="wide"
     )
     inject_custom_css()
+    start_model_residency()
     init_session_state()
 
     mode, model, system_prompt = render_sidebar()
@@ -2272,20 +3206,14 @@ def main() -> None:
                 
                 # Generate new response with streaming
                 with st.chat_message("assistant", avatar="✨"):
-                    message_placeholder = st.empty()
-                    full_response = ""
-                    
-                    for chunk in send_to_backend(
+                    full_response = stream_assistant_reply(
                         messages,
                         mode=mode,
                         system_prompt=system_prompt.strip(),
                         model=model,
                         image=user_image_regen,
-                    ):
-                        full_response += chunk
-                        message_placeholder.markdown(full_response + "▌")
-                    
-                    message_placeholder.markdown(full_response)
+                        chat_id=None if st.session_state.is_temp_chat else st.session_state.current_chat_id,
+                    )
                 
                 messages.append({"role": "assistant", "content": full_response})
                 st.rerun()
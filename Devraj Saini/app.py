@@ -1,7 +1,13 @@
 import streamlit as st
+import ast
+import io
 import json
 import os
+import re
+import tokenize
 import requests
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 
 # OCR imports
@@ -20,7 +26,8 @@ st.set_page_config(
 )
 
 HISTORY_FILE = "chat_history.json"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+OLLAMA_URL = OLLAMA_HOST + "/api/generate"
 MODEL_NAME = "llama3"
 
 # ----------------------- TESSERACT PATH (Windows only) -----------------------
@@ -42,7 +49,36 @@ def save_history(history):
         json.dump(history, f, indent=4)
 
 # ----------------------- OLLAMA FUNCTION -----------------------
+# Identical prompts sent at the same time (e.g. the same template) share
+# one Ollama call instead of queueing duplicates. The registry is a cached
+# resource because Streamlit re-runs this script for every session.
+@st.cache_resource
+def inflight_registry():
+    return {}, threading.Lock()
+
 def ollama_chat(prompt):
+    inflight, lock = inflight_registry()
+    with lock:
+        future = inflight.get(prompt)
+        leader = future is None
+        if leader:
+            future = Future()
+            inflight[prompt] = future
+
+    if not leader:
+        return future.result()
+
+    try:
+        future.set_result(_ollama_chat(prompt))
+    except BaseException as e:
+        # Followers waiting on this future get the error instead of hanging
+        future.set_exception(e)
+    finally:
+        with lock:
+            inflight.pop(prompt, None)
+    return future.result()
+
+def _ollama_chat(prompt):
     payload = {
         "model": MODEL_NAME,
         "prompt": prompt,
@@ -64,6 +100,80 @@ def extract_text_from_image(image):
     text = pytesseract.image_to_string(thresh, lang="eng")
     return text
 
+# ----------------------- PROMPT COMPRESSION -----------------------
+# OCR'd code carries license headers, blank-line runs, trailing spaces and
+# repeated lines. Python that parses keeps its exact AST; anything else
+# gets a plain-text pass.
+COMPRESS_PROMPTS = True
+MAX_LITERAL_CHARS = 200
+LICENSE_PATTERN = re.compile(r"copyright|licen[cs]e|all rights reserved", re.IGNORECASE)
+# Indented lines, lines ending in code punctuation, common keywords
+CODE_PATTERN = re.compile(r"^[ \t]+\S|[;{}():=]\s*$|\b(?:def|class|return|import|function|var|let|const|void)\b", re.MULTILINE)
+# Whole-line comments; C preprocessor lines (#include, #define, ...) are code
+COMMENT_PATTERN = re.compile(r"\s*(?://|/\*|\*/|\* |#(?!\s*(?:include|define|undef|ifn?def|if|elif|else|endif|pragma|error)\b))")
+
+def compress_prompt_text(text):
+    # Returns (text, tokens saved); tokens are estimated as 4 chars each
+    try:
+        tree = ast.dump(ast.parse(text))
+    except (SyntaxError, ValueError):
+        tree = None
+
+    # In Python, lines inside multi-line strings are left exactly as written
+    protected = set()
+    if tree is not None:
+        try:
+            for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+                if tok.type == tokenize.STRING and tok.start[0] != tok.end[0]:
+                    protected.update(range(tok.start[0], tok.end[0] + 1))
+        except (tokenize.TokenError, IndentationError):
+            tree = None
+
+    # Any code (Python or not) only loses trailing spaces, blank-line runs and
+    # license headers: squeezing spaces or cutting long tokens could change a
+    # string literal, and a repeated line may be meant (x += 1 twice).
+    is_code = tree is not None or bool(CODE_PATTERN.search(text))
+
+    out, comments = [], []
+
+    def flush_comments():
+        # License headers go; other comment blocks are kept
+        if not (len(comments) >= 3 and LICENSE_PATTERN.search("\n".join(comments))):
+            out.extend(comments)
+        comments.clear()
+
+    for number, line in enumerate(text.splitlines(), 1):
+        if number in protected:
+            flush_comments()
+            out.append(line)
+            continue
+        line = line.rstrip()
+        if not is_code:
+            line = re.sub(r"(?<=\S)[ \t]{2,}", " ", line)
+            line = re.sub(r"[A-Za-z0-9+/=_-]{%d,}" % MAX_LITERAL_CHARS, lambda m: m.group(0)[:MAX_LITERAL_CHARS] + "...", line)
+            # OCR often reads the same line twice
+            if out and line and line == out[-1]:
+                continue
+        if COMMENT_PATTERN.match(line):
+            comments.append(line)
+            continue
+        flush_comments()
+        if not line and (not out or not out[-1]):
+            continue
+        out.append(line)
+    flush_comments()
+
+    compressed = "\n".join(out).strip("\n")
+    if tree is not None:
+        try:
+            if ast.dump(ast.parse(compressed)) != tree:
+                compressed = text
+        except (SyntaxError, ValueError):
+            compressed = text
+
+    saved = (len(text) - len(compressed)) // 4
+    return (compressed, saved) if saved > 0 else (text, 0)
+
 # ----------------------- TEMPLATE FEATURE -----------------------
 TEMPLATES = {
     "None": "",
@@ -150,6 +260,11 @@ if st.button("Send"):
     if uploaded_image is not None:
         image = Image.open(uploaded_image)
         extracted_text = extract_text_from_image(image)
+        label = "[Image OCR Input]"
+        if COMPRESS_PROMPTS:
+            extracted_text, saved = compress_prompt_text(extracted_text)
+            if saved:
+                label = f"[Image OCR Input, compressed: ~{saved} tokens saved]"
 
         final_prompt = f"""
 The following text was extracted from an image using OCR.
@@ -160,7 +275,7 @@ Analyze it and respond accordingly:
 
         st.session_state.messages.append({
             "role": "user",
-            "content": f"[Image OCR Input]\n{extracted_text}"
+            "content": f"{label}\n{extracted_text}"
         })
 
     # Case 2: Normal text input
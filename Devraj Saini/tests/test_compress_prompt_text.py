@@ -0,0 +1,90 @@
+import ast
+import io
+import os
+import re
+import tokenize
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+NAMES = {"MAX_LITERAL_CHARS", "LICENSE_PATTERN", "CODE_PATTERN", "COMMENT_PATTERN"}
+
+LICENSE = (
+    "/*\n"
+    " * Copyright 2024 Example\n"
+    " * Licensed under the MIT License\n"
+    " */\n"
+)
+
+
+@pytest.fixture(scope="module")
+def compress_prompt_text():
+    """
+    The function and its constants, compiled from app.py without
+    running the Streamlit app around them.
+    """
+    with open(APP, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    wanted = [
+        node for node in tree.body
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) in NAMES
+        or isinstance(node, ast.FunctionDef) and node.name == "compress_prompt_text"
+    ]
+    namespace = {"ast": ast, "io": io, "re": re, "tokenize": tokenize}
+    exec(compile(ast.Module(wanted, []), APP, "exec"), namespace)
+    return namespace["compress_prompt_text"]
+
+
+def test_java_keeps_literals_and_drops_license(compress_prompt_text):
+    token = "A" * 300
+    code = (
+        LICENSE
+        + "public class Main {   \n\n\n\n"
+        + '    String pad = "a    b";\n'
+        + '    String blob = "' + token + '";\n'
+        + "}\n"
+    )
+    compressed, saved = compress_prompt_text(code)
+    assert saved > 0
+    assert "Copyright" not in compressed
+    assert '"a    b"' in compressed
+    assert token in compressed
+    assert "{\n\n    String" in compressed
+
+
+def test_preprocessor_lines_are_not_comments(compress_prompt_text):
+    code = (
+        '#include "license.h"\n'
+        '#include "license_check.h"\n'
+        '#define LICENSE_KEY "abc"\n'
+        "int main() { return 0; }\n"
+    )
+    compressed, _ = compress_prompt_text(code)
+    assert compressed.count("#include") == 2
+    assert "#define LICENSE_KEY" in compressed
+
+
+def test_repeated_code_lines_are_kept(compress_prompt_text):
+    code = "int i = 0;\ni++;\ni++;\nprintf(\"%d\", i);\n"
+    compressed, _ = compress_prompt_text(code)
+    assert compressed.count("i++;") == 2
+
+
+def test_python_keeps_its_ast(compress_prompt_text):
+    source = (
+        "# Copyright 2024 Example\n# Licensed under MIT\n# All rights reserved\n"
+        "import os\n\n\n\n"
+        "S = '''keep   these\n\n\n\n   spaces   '''\n"
+        "x = 1\nx += 1\nx += 1\n"
+    )
+    compressed, saved = compress_prompt_text(source)
+    assert saved > 0
+    assert ast.dump(ast.parse(compressed)) == ast.dump(ast.parse(source))
+
+
+def test_plain_text_is_squeezed(compress_prompt_text):
+    text = "Total   due   now\nTotal   due   now\n\n\n\nThanks   " + "x" * 400 + "\n"
+    compressed, saved = compress_prompt_text(text)
+    assert compressed.startswith("Total due now\n\nThanks ")
+    assert compressed.endswith("x" * 200 + "...")
+    assert saved > 0
@@ -2,18 +2,104 @@ import streamlit as st
 import time
 import json
 import os
+import uuid
 from backend.ocr import extract_text_from_image
 from backend.normalize import normalize_ocr_text
 from backend.prompt import build_image_debug_prompt
 
 
-from backend.llm import generate_response, generate_title
-from backend.prompt import build_prompt
-from backend.memory import init_chat, add_message
+from backend.llm import generate_response, generate_title_async
+from backend.chat_index import load_index, update_index
+from backend.cache import get_cache
+from backend.residency import get_residency_manager
+from backend.streaming import StreamFlusher, stream_to
+from backend.jobs import get_job_manager
+from backend.prompt import (
+    build_prompt, build_turn_prompt, estimate_tokens, SYSTEM_INSTRUCTION
+)
+from backend.memory import init_chat, add_message, RollingMemory, SUMMARY_MODEL
+from backend.conversation import Conversation
+from backend.symbols import file_context, get_symbol_index
+from backend.compress import compress
+from backend.semantic_cache import query_mode
+from backend.metrics import start_metrics_server
+from backend.context import (
+    load_meta, update_meta, delete_meta,
+    context_fingerprint, reusable_context, update_context
+)
 
-def save_index(index):
-    with open(INDEX_FILE, "w", encoding="utf-8") as f:
-        json.dump(index, f, indent=2)
+def update_chat_entry(chat_file, **fields):
+    def apply(index):
+        if chat_file in index:
+            index[chat_file].update(fields)
+
+    update_index(INDEX_FILE, apply)
+
+
+def name_chat(chat_file, title):
+    """
+    Title callback from the background title worker.
+    """
+    def apply(index):
+        entry = index.get(chat_file)
+        # Keep a name the user gave the chat in the meantime
+        if entry and entry["title"] == "New Chat":
+            entry["title"] = title
+
+    update_index(INDEX_FILE, apply)
+
+
+def save_chat(chat_file, chat, chat_context):
+    with open(os.path.join(CHAT_DIR, chat_file), "w", encoding="utf-8") as f:
+        json.dump(chat.to_json(), f, indent=2)
+
+    update_meta(CHAT_DIR, chat_file, context=chat_context)
+
+
+def save_memory(chat_file, state):
+    """
+    Summary callback from the background summary worker.
+    """
+    # The chat may have been deleted while the summary was generated
+    if os.path.exists(os.path.join(CHAT_DIR, chat_file)):
+        update_meta(CHAT_DIR, chat_file, memory=state)
+
+
+def chat_key():
+    # Unsaved chats have no file yet, so key their jobs by session
+    return st.session_state.current_chat_file or st.session_state.session_key
+
+
+def stop_generation():
+    get_job_manager().cancel(chat_key())
+
+
+def collect_job(job):
+    """
+    Fold a finished generation job into this session. A completed answer
+    was already saved by the worker; a stopped one keeps its partial text.
+    Returns False if the generation failed.
+    """
+    get_job_manager().forget(job)
+
+    if job.error is not None:
+        st.error(f"Generation failed: {job.error}")
+        return False
+
+    if job.result is not None:
+        st.session_state.chat = job.result["chat"]
+        st.session_state.chat_context = job.result["context"]
+    elif job.text:
+        st.session_state.chat = add_message(
+            st.session_state.chat, "assistant", job.text
+        )
+        if st.session_state.current_chat_file:
+            save_chat(
+                st.session_state.current_chat_file,
+                st.session_state.chat,
+                st.session_state.chat_context
+            )
+    return True
 
 
 def create_new_chat(chat_index):
@@ -26,7 +112,7 @@ def create_new_chat(chat_index):
         "created_at": ts
     }
 
-    save_index(chat_index)
+    update_index(INDEX_FILE, lambda index: index.update({chat_file: chat_index[chat_file]}))
     
     with open(os.path.join(CHAT_DIR, chat_file), "w", encoding="utf-8") as f:
         json.dump([], f, indent=2)
@@ -39,7 +125,16 @@ def create_new_chat(chat_index):
 
 # ---------------- CONFIG ----------------
 CHAT_DIR = "chats"
+CHAT_MODEL = "llama3"
+CODE_MODEL = "deepseek-coder:6.7b"
+# Titles use the small summary model when it is already loaded, else the
+# chat model; a title is never worth loading another model for.
+TITLE_MODELS = [SUMMARY_MODEL, CHAT_MODEL]
+# Squeeze comments, whitespace and huge literals out of OCR'd code
+COMPRESS_PROMPTS = True
 INDEX_FILE = os.path.join(CHAT_DIR, "index.json")
+# Prometheus endpoint for the Ollama request metrics (off when unset)
+METRICS_PORT = os.environ.get("METRICS_PORT")
 os.makedirs(CHAT_DIR, exist_ok=True)
 
 if not os.path.exists(INDEX_FILE):
@@ -121,9 +216,30 @@ if "current_chat_file" not in st.session_state:
 if "uploaded_context" not in st.session_state:
     st.session_state.uploaded_context = ""
 
+if "uploaded_name" not in st.session_state:
+    st.session_state.uploaded_name = ""
+
+if "chat_context" not in st.session_state:
+    st.session_state.chat_context = {}
+
+if "chat_memory" not in st.session_state:
+    st.session_state.chat_memory = RollingMemory()
+
+if "session_key" not in st.session_state:
+    st.session_state.session_key = f"session_{uuid.uuid4().hex}"
+
+# ---------------- MODEL RESIDENCY ----------------
+# Preload both models once per process and keep them loaded while
+# sessions are active, so the first answer doesn't wait for a model load.
+residency = get_residency_manager([CHAT_MODEL, CODE_MODEL])
+residency.start()
+residency.touch()
+
+if METRICS_PORT:
+    start_metrics_server(int(METRICS_PORT))
+
 # ---------------- LOAD CHAT INDEX ----------------
-with open(INDEX_FILE, "r", encoding="utf-8") as f:
-    chat_index = json.load(f)
+chat_index = load_index(INDEX_FILE)
     
 
 
@@ -135,7 +251,10 @@ with st.sidebar:
     # -------- New Chat --------
     if st.button("➕ New Chat", use_container_width=True):
         st.session_state.chat = init_chat()
+        st.session_state.chat_context = {}
+        st.session_state.chat_memory = RollingMemory()
         st.session_state.uploaded_context = ""
+        st.session_state.uploaded_name = ""
         st.session_state.current_chat_file = create_new_chat(chat_index)
         st.rerun()
 
@@ -171,15 +290,17 @@ with st.sidebar:
         with row[0]:
             if st.button(title, key=f"open_{file}", use_container_width=True):
                 with open(os.path.join(CHAT_DIR, file), "r", encoding="utf-8") as f:
-                    st.session_state.chat = json.load(f)
+                    st.session_state.chat = Conversation.from_json(json.load(f))
+                chat_meta = load_meta(CHAT_DIR, file)
+                st.session_state.chat_context = chat_meta.get("context", {})
+                st.session_state.chat_memory = RollingMemory(chat_meta.get("memory"))
                 st.session_state.current_chat_file = file
                 st.rerun()
 
         # ---- Pin / Unpin ----
         with row[1]:
             if st.button("📌" if not meta["pinned"] else "📍", key=f"pin_{file}"):
-                chat_index[file]["pinned"] = not meta["pinned"]
-                save_index(chat_index)
+                update_chat_entry(file, pinned=not meta["pinned"])
                 st.rerun()
 
         # ---- Rename ----
@@ -191,22 +312,40 @@ with st.sidebar:
                     key=f"rename_input_{file}"
                 )
                 if new_title.strip():
-                    chat_index[file]["title"] = new_title.strip()
-                    save_index(chat_index)
+                    update_chat_entry(file, title=new_title.strip())
                     st.rerun()
 
         # ---- Delete ----
         with row[3]:
             if st.button("🗑️", key=f"delete_{file}"):
+                job = get_job_manager().cancel(file)
+                if job is not None:
+                    job.wait(5)
+                    get_job_manager().forget(job)
                 os.remove(os.path.join(CHAT_DIR, file))
-                chat_index.pop(file)
-                save_index(chat_index)
+                delete_meta(CHAT_DIR, file)
+                update_index(INDEX_FILE, lambda index: index.pop(file, None))
 
                 if st.session_state.current_chat_file == file:
                     st.session_state.chat = init_chat()
+                    st.session_state.chat_context = {}
+                    st.session_state.chat_memory = RollingMemory()
                     st.session_state.current_chat_file = None
 
                 st.rerun()
+
+    # -------- Response cache --------
+    st.divider()
+    cache_stats = get_cache().stats()
+    st.caption(
+        f"Response cache: {cache_stats['hits']} hits · "
+        f"{cache_stats['misses']} misses"
+    )
+    hot = sorted(residency.hot_models())
+    st.caption("Loaded models: " + (", ".join(hot) if hot else "none"))
+    running = get_job_manager().stats()["running"]
+    if running:
+        st.caption(f"Answers generating in background: {running}")
             
 # ---------------- MAIN HEADER ----------------
 st.markdown("<div class='chat-title'>CODEGEN AI</div>", unsafe_allow_html=True)
@@ -240,25 +379,38 @@ if uploaded_file and uploaded_file.type.startswith("image"):
     with st.spinner("Analyzing code from image..."):
         ocr_text = extract_text_from_image(uploaded_file)
 
+        saved = 0
+        if COMPRESS_PROMPTS:
+            ocr_text, saved = compress(ocr_text)
+
         prompt = build_image_debug_prompt(ocr_text)
 
         with st.chat_message("assistant"):
-            box = st.empty()
-            full_response = ""
-
-            for chunk in generate_response(
-                prompt,
-                model="deepseek-coder:6.7b",
-                stream=True
-            ):
-                full_response += chunk
-                box.markdown(full_response)
+            if saved:
+                st.caption(f"Prompt compression saved ~{saved} tokens")
+            full_response = stream_to(
+                st.empty(),
+                generate_response(
+                    prompt,
+                    model=CODE_MODEL,
+                    stream=True,
+                    mode="image-debug"
+                )
+            )
 
         st.session_state.chat.append({
             "role": "assistant",
             "content": full_response
         })
 
+elif uploaded_file:
+    source = uploaded_file.getvalue().decode("utf-8", errors="replace")
+    if source != st.session_state.uploaded_context:
+        st.session_state.uploaded_context = source
+        st.session_state.uploaded_name = uploaded_file.name
+        # Index the file now, so the first question doesn't wait for it
+        get_symbol_index(source, uploaded_file.name)
+
 
 
 # ---------------- CHAT DISPLAY ----------------
@@ -267,7 +419,15 @@ for i, msg in enumerate(st.session_state.chat):
         st.markdown(msg["content"], unsafe_allow_html=False)
         
 # ---------------- USER INPUT ----------------
+jobs = get_job_manager()
+
 if user_input := st.chat_input("Message..."):
+    # A new message supersedes an answer still streaming in this chat
+    previous = jobs.cancel(chat_key())
+    if previous is not None:
+        previous.wait(5)
+        collect_job(previous)
+
     st.session_state.chat = add_message(
         st.session_state.chat, "user", user_input
     )
@@ -275,56 +435,123 @@ if user_input := st.chat_input("Message..."):
     with st.chat_message("user"):
         st.markdown(user_input)
 
+    # Only the parts of the file the question is about (the symbols it
+    # names and what they call) go into the prompt, not the whole file.
     context = ""
     if st.session_state.uploaded_context:
         context = (
             "\nCONTEXT FROM FILE:\n"
-            + st.session_state.uploaded_context
+            + file_context(
+                st.session_state.uploaded_context,
+                st.session_state.uploaded_name,
+                user_input
+            )
             + "\nEND CONTEXT\n"
         )
 
-    prompt = build_prompt(st.session_state.chat) + context
+    # Reuse the Ollama context tokens from the previous turn so only the
+    # new message has to be prefilled. Falls back to the full transcript
+    # when the model, system prompt or uploaded file changed.
+    fingerprint = context_fingerprint(
+        CHAT_MODEL, SYSTEM_INSTRUCTION, st.session_state.uploaded_context
+    )
+    turn_prompt = build_turn_prompt(st.session_state.chat[-1], context=context)
+    past_context = reusable_context(
+        st.session_state.chat_context, fingerprint, st.session_state.chat,
+        turn_tokens=estimate_tokens(turn_prompt)
+    )
 
-    with st.chat_message("assistant"):
-        box = st.empty()
-        full_response = ""
-        cursor = True
+    # Without reusable tokens (or once they would overflow the context
+    # budget), older turns go in as their running summary and only the
+    # rest is sent verbatim.
+    memory = st.session_state.chat_memory
+    if past_context:
+        prompt = turn_prompt
+    else:
+        summary, start = memory.window(st.session_state.chat)
+        prompt = build_prompt(
+            st.session_state.chat, context=context, summary=summary, start=start
+        )
 
-        with st.spinner("Thinking..."):
-            for chunk in generate_response(prompt, model="llama3", stream=True):
-                full_response += chunk
-                box.markdown(
-                    full_response + ("▍" if cursor else ""),
-                    unsafe_allow_html=False
-                )
-                cursor = not cursor
-                time.sleep(0.03)
+    turns = len(st.session_state.chat) + 1
 
-        box.markdown(full_response, unsafe_allow_html=False)
+    # A first question with no file attached stands on its own, so a
+    # paraphrase of an earlier one can be answered from the semantic cache
+    # (unless query_mode says it carries code or asks for a fix).
+    standalone = turns == 2 and not st.session_state.uploaded_context
 
-    st.session_state.chat = add_message(
-        st.session_state.chat, "assistant", full_response
-    )
-
-    # -------- AUTO CHAT NAMING (LLAMA) --------
-       
+    # Save the question now so it is there if the user switches chats
     current_file = st.session_state.current_chat_file
+    if current_file:
+        save_chat(current_file, st.session_state.chat, st.session_state.chat_context)
+
+    # -------- AUTO CHAT NAMING --------
+    # Local keyword title when the message is clear enough, otherwise
+    # a loaded model on the background title worker; the sidebar shows
+    # the title on the next rerun.
+    if current_file and chat_index[current_file]["title"] == "New Chat":
+        generate_title_async(
+            user_input,
+            lambda title, chat_file=current_file: name_chat(chat_file, title),
+            key=current_file,
+            model=residency.prefer(TITLE_MODELS, default=CHAT_MODEL)
+        )
+
+    chat_snapshot = st.session_state.chat.copy()
+    context_state = dict(st.session_state.chat_context)
+
+    def start_answer(job):
+        return generate_response(
+            prompt,
+            model=CHAT_MODEL,
+            stream=True,
+            context=past_context,
+            on_done=job.finish,
+            query=user_input if standalone else None,
+            mode=query_mode(user_input),
+            session_id=current_file,
+            profile="chat",
+            cancel=job.cancel
+        )
+
+    def persist_answer(job):
+        # Runs on the worker thread: no st.* calls in here
+        if job.final:
+            update_context(
+                context_state, fingerprint, job.final.get("context"), turns
+            )
+        chat = add_message(chat_snapshot.copy(), "assistant", job.text)
+        if current_file:
+            save_chat(current_file, chat, context_state)
+        # Fold turns that left the verbatim window into the summary
+        memory.refresh_async(
+            chat,
+            on_update=(lambda state: save_memory(current_file, state)) if current_file else None
+        )
+        return {"chat": chat, "context": context_state}
+
+    jobs.submit(chat_key(), start_answer, on_complete=persist_answer)
 
-    if (
-        current_file
-        and chat_index[current_file]["title"] == "New Chat"
-    ):
-        title = generate_title(user_input)
-        chat_index[current_file]["title"] = title or user_input[:30]
-        save_index(chat_index)
-
-    # -------- SAVE CHAT CONTENT --------
-    if current_file :
-        with open(
-        os.path.join(CHAT_DIR, current_file),
-        "w",
-        encoding="utf-8"
-        ) as f:
-            json.dump(st.session_state.chat, f, indent=2)
-
-    st.rerun()
\ No newline at end of file
+# ---------------- BACKGROUND ANSWER ----------------
+# Answers are generated by a worker that also saves them. This page only
+# follows the job, so a rerun or a chat switch doesn't stop generation;
+# coming back to the chat re-attaches to it.
+job = jobs.get(chat_key())
+
+if job is not None:
+    with st.chat_message("assistant"):
+        stop_slot = st.empty()
+        if not job.done:
+            stop_slot.button("⏹ Stop", key="stop_generation", on_click=stop_generation)
+
+        # Repaint at ~20 fps rather than once per token.
+        flusher = StreamFlusher(st.empty(), unsafe_allow_html=False)
+        with st.spinner("Thinking..."):
+            for chunk in job.follow():
+                flusher.write(chunk)
+
+        flusher.close()
+        stop_slot.empty()
+
+    if collect_job(job):
+        st.rerun()
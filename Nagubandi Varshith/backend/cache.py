@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = "cache"
+CACHE_PATH = os.path.join(CACHE_DIR, "responses.sqlite3")
+
+
+class ResponseCache:
+    """
+    Exact-match cache for LLM responses.
+
+    Two tiers: a small in-memory LRU in front of a SQLite table. Entries
+    expire after `ttl` seconds and each tier is capped by entry count.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_memory_entries=128,
+                 max_disk_entries=2000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model_digest, prompt, options=None):
+        raw = json.dumps(
+            [model_digest, prompt, options or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry["created"] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                del self._memory[key]
+
+            entry = self._disk_get(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.disk_hits += 1
+            self._memory_put(key, entry)
+            return entry
+
+    def put(self, key, text, final=None):
+        entry = {
+            "text": text,
+            "final": final or {},
+            "created": time.time()
+        }
+        with self._lock:
+            self._memory_put(key, entry)
+            self._disk_put(key, entry)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    # ---------------- internals (caller holds the lock) ----------------
+
+    def _memory_put(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key, now):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+
+        self._db.execute(
+            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+        )
+        self._db.commit()
+        entry = json.loads(row[0])
+        entry["created"] = row[1]
+        return entry
+
+    def _disk_put(self, key, entry):
+        if self._db is None:
+            return
+        value = json.dumps({"text": entry["text"], "final": entry["final"]})
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, created, accessed)"
+            " VALUES (?, ?, ?, ?)",
+            (key, value, entry["created"], entry["created"])
+        )
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed DESC"
+            " LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+        self._db.commit()
+
+
+def replay_stream(entry, on_done=None):
+    """
+    Stream a cached answer back word by word, so callers can use the
+    same loop for hits and live generations.
+    """
+    for piece in re.findall(r"\s*\S+|\s+", entry["text"]):
+        yield piece
+    if on_done and entry.get("final"):
+        on_done(entry["final"])
+
+
+_default_cache = None
+
+
+def get_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
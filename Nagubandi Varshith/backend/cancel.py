@@ -0,0 +1,57 @@
+import socket
+import threading
+
+
+class CancelToken:
+    """
+    Cancellation handle for one generation.
+
+    cancel() may be called from any thread. Callbacks registered with
+    on_cancel run once, on the cancelling thread; one registered after
+    cancellation runs immediately.
+    """
+
+    def __init__(self):
+        self._cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def abort_response(response):
+    """
+    Drop a streaming response's connection at once, even while another
+    thread is blocked reading it. close() alone does not wake a blocked
+    read, so the socket is shut down first; Ollama sees the disconnect
+    and stops generating.
+    """
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
@@ -0,0 +1,31 @@
+import json
+import os
+import threading
+
+# One lock for the whole process: the page and background workers
+# (answers, titles) all write chats/index.json.
+_lock = threading.Lock()
+
+
+def load_index(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def update_index(path, update):
+    """
+    Re-read the index, apply update(index) and write it back atomically,
+    so concurrent writers don't overwrite each other's changes.
+    Returns the updated index.
+    """
+    with _lock:
+        index = load_index(path)
+        update(index)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, path)
+        return index
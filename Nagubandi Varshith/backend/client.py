@@ -0,0 +1,109 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.metrics import get_metrics
+
+# Same variable the Ollama CLI uses
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+OLLAMA_URL = OLLAMA_HOST + "/api/generate"
+
+# Endpoints whose replies carry the final-frame timings (not embeddings)
+GENERATION_PATHS = ("/api/generate", "/api/chat")
+
+
+class OllamaClient:
+    """
+    Reusable Ollama client. Owns one pooled keep-alive session so
+    consecutive calls skip the TCP handshake.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, pool_size=10,
+                 connect_timeout=5, read_timeout=120):
+        self.host = host.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._digests = {}
+        self._installed = None
+
+    def post(self, path, payload, stream=False, read_timeout=None, kind=None):
+        """
+        Non-streaming generate/chat calls are timed into backend.metrics
+        (`kind` labels the record); streams are timed by whoever reads
+        them. Model loads (no prompt) and other endpoints such as
+        embeddings are not recorded.
+        """
+        timer = None
+        if (not stream and path in GENERATION_PATHS
+                and (payload.get("prompt") or payload.get("messages"))):
+            timer = get_metrics().start(payload.get("model", ""), kind, self.host)
+
+        response = self.session.post(
+            self.host + path,
+            json=payload,
+            stream=stream,
+            timeout=(self.connect_timeout, read_timeout or self.read_timeout)
+        )
+        response.raise_for_status()
+        if timer is not None:
+            try:
+                timer.finish(response.json())
+            except ValueError:
+                pass
+        return response
+
+    def get(self, path):
+        response = self.session.get(
+            self.host + path,
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        response.raise_for_status()
+        return response
+
+    def model_digest(self, model):
+        """
+        Digest of the installed model, so cached answers are dropped
+        when the model is re-pulled. Falls back to the name.
+        """
+        if model not in self._digests:
+            digest = model
+            try:
+                for entry in self.get("/api/tags").json().get("models", []):
+                    if entry.get("name") in (model, f"{model}:latest"):
+                        digest = entry.get("digest") or model
+                        break
+            except (requests.RequestException, ValueError):
+                return model
+            self._digests[model] = digest
+        return self._digests[model]
+
+    def has_model(self, model):
+        """
+        Whether `model` is installed. /api/tags is asked once; a failed
+        call counts as not installed and is retried next time.
+        """
+        if self._installed is None:
+            try:
+                models = self.get("/api/tags").json().get("models", [])
+            except (requests.RequestException, ValueError):
+                return False
+            self._installed = {entry.get("name") for entry in models}
+        return model in self._installed or f"{model}:latest" in self._installed
+
+    def stream(self, model, open_stream, affinity=None):
+        """
+        Same interface as OllamaPool.stream for a single host.
+        """
+        yield from open_stream(self)
+
+    def close(self):
+        self.session.close()
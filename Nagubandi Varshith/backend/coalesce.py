@@ -0,0 +1,136 @@
+import threading
+
+from backend.cancel import CancelToken
+
+
+class _Flight:
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.final = None
+        self.error = None
+        self.subscribers = 0
+        self.cancel = CancelToken()
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent streams. The first caller for a key
+    starts the upstream generator on a worker thread; everyone who asks
+    for the same key while it is running subscribes to the same chunk
+    list and gets every chunk from the start.
+
+    When the last subscriber goes away (cancelled or closed), the
+    upstream generator is closed so the model stops generating.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.joined = 0
+
+    def stream(self, key, start, on_done=None, cancel=None):
+        """
+        start: callable taking an on_done hook and the flight's
+        CancelToken, returning the upstream generator. Only called by the
+        leader; the final frame it reports is handed to every
+        subscriber's own on_done.
+        cancel: optional CancelToken that ends this subscriber's stream.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(key)
+                self._flights[key] = flight
+                self.started += 1
+                threading.Thread(
+                    target=self._pump, args=(flight, start), daemon=True
+                ).start()
+            else:
+                self.joined += 1
+            flight.subscribers += 1
+        return self._subscribe(flight, on_done, cancel)
+
+    def _pump(self, flight, start):
+        def finish(frame):
+            flight.final = frame
+
+        upstream = start(finish, flight.cancel)
+        try:
+            for chunk in upstream:
+                if flight.cancel.cancelled:
+                    break
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Closing the generator closes the HTTP response, which makes
+            # Ollama abort the generation.
+            upstream.close()
+            self._forget(flight)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _forget(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers or flight.done:
+                return
+            # Unregister while still holding the lock, so a later identical
+            # request can't join a stream that is being torn down
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.cancel.cancel()
+
+    def _subscribe(self, flight, on_done, cancel):
+        if cancel is not None:
+            def wake():
+                with flight.cond:
+                    flight.cond.notify_all()
+            cancel.on_cancel(wake)
+
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while (
+                        index >= len(flight.chunks)
+                        and not flight.done
+                        and not (cancel and cancel.cancelled)
+                    ):
+                        flight.cond.wait()
+                    pending = flight.chunks[index:]
+                    finished = flight.done
+                for chunk in pending:
+                    if cancel and cancel.cancelled:
+                        return
+                    yield chunk
+                if cancel and cancel.cancelled:
+                    return
+                index += len(pending)
+                if finished and index >= len(flight.chunks):
+                    break
+        finally:
+            self._leave(flight)
+        if flight.error is not None:
+            raise flight.error
+        if on_done and flight.final:
+            on_done(flight.final)
+
+
+_default_flights = SingleFlight()
+
+
+def get_single_flight():
+    return _default_flights
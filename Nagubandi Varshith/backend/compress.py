@@ -0,0 +1,304 @@
+import ast
+import io
+import re
+import tokenize
+
+from backend.prompt import estimate_tokens
+
+# Comment blocks longer than this are cut down to their first lines
+COMMENT_BLOCK_LINES = 4
+COMMENT_KEEP_LINES = 2
+
+# String literals longer than this (characters) are shortened
+MAX_LITERAL = 200
+
+_LICENSE = re.compile(r"copyright|licen[cs]e|all rights reserved|spdx", re.IGNORECASE)
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_INNER_SPACES = re.compile(r"(?<=\S)[ \t]{2,}")
+# Indented lines, lines ending in code punctuation, common keywords
+_CODE_HINT = re.compile(
+    r"^[ \t]+\S|[;{}():=]\s*$|\b(?:def|class|return|import|function|var|let|const|void)\b",
+    re.MULTILINE
+)
+_BLOB = r"[A-Za-z0-9+/=_-]{%d,}"
+_C_STRING = r"""(["'`])((?:\\.|(?!\1)[^\\\n]){%d,})\1"""
+
+
+def guess_language(text):
+    """
+    "python", "c" (Java, JavaScript, C-family) or "text".
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        tree = None
+    # A single word or sentence can parse as Python too
+    if tree is not None and any(
+        not isinstance(node, ast.Expr) or isinstance(node.value, ast.Call)
+        for node in tree.body
+    ):
+        return "python"
+    if ";" in text and "{" in text:
+        return "c"
+    return "text"
+
+
+def _squeeze_comment_blocks(blocks, seen):
+    """
+    Decide what is left of each block of whole-line comments: license
+    headers and repeats of an earlier block go, long blocks keep their
+    first lines. `blocks` is a list of lists of comment lines; returns
+    the lines to keep for each block.
+    """
+    kept = []
+    for block in blocks:
+        text = "\n".join(line.strip() for line in block)
+        if text in seen or len(block) >= 3 and _LICENSE.search(text):
+            kept.append([])
+        elif len(block) > COMMENT_BLOCK_LINES:
+            kept.append(block[:COMMENT_KEEP_LINES])
+        else:
+            kept.append(block)
+        seen.add(text)
+    return kept
+
+
+def _cut(body, max_literal):
+    cut = body[:max_literal]
+    # Don't end inside an escape sequence
+    backslash = cut.rfind("\\", max(0, len(cut) - 10))
+    if backslash != -1:
+        cut = cut[:backslash]
+    return cut + "..."
+
+
+def _truncate_string_token(text, max_literal):
+    """
+    Shorten one Python string token, keeping its prefix and quotes.
+    f-strings are left alone (cutting could split a {field}).
+    """
+    match = re.match(r"([A-Za-z]*)('''|\"\"\"|'|\")", text)
+    prefix, quote = match.groups()
+    if "f" in prefix.lower():
+        return text
+    body = text[len(prefix) + len(quote):-len(quote)]
+    if len(body) <= max_literal:
+        return text
+    return f"{prefix}{quote}{_cut(body, max_literal)}{quote}"
+
+
+def _compress_python(source, max_literal):
+    tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    lines = source.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    def offset(pos):
+        row, col = pos
+        return offsets[row - 1] + col if row - 1 < len(offsets) else len(source)
+
+    # Whole-line comments, grouped into blocks of consecutive rows
+    comment_rows = [
+        tok.start[0] for tok in tokens
+        if tok.type == tokenize.COMMENT and not lines[tok.start[0] - 1][:tok.start[1]].strip()
+    ]
+    blocks = []
+    for row in comment_rows:
+        if blocks and blocks[-1][-1] == row - 1:
+            blocks[-1].append(row)
+        else:
+            blocks.append([row])
+    kept = _squeeze_comment_blocks(
+        [[lines[row - 1] for row in block] for block in blocks], set()
+    )
+    dropped = set()
+    for block, keep in zip(blocks, kept):
+        dropped.update(block[len(keep):])
+
+    out = []
+    prev_end = (1, 0)
+    skip_nl = False
+    for tok in tokens:
+        gap = source[offset(prev_end):offset(tok.start)]
+        prev_end = tok.end
+
+        if tok.type == tokenize.COMMENT and tok.start[0] in dropped:
+            skip_nl = True
+            continue
+        if tok.type == tokenize.NL and skip_nl:
+            skip_nl = False
+            continue
+        skip_nl = False
+
+        if tok.type in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER):
+            # Trailing whitespace
+            gap = ""
+        elif "\\" in gap:
+            # Explicit line continuation: keep it, minus trailing spaces
+            gap = re.sub(r"[ \t]+\\", " \\\\", gap)
+        elif tok.start[0] <= len(lines) and lines[tok.start[0] - 1][:tok.start[1]].strip():
+            # Between tokens on a line; indentation is kept as written
+            gap = " " if gap else ""
+
+        # At most one blank line in a row, none at the top
+        if tok.type == tokenize.NL and (not out or "".join(out[-2:]).endswith("\n\n")):
+            continue
+
+        text = tok.string
+        if tok.type == tokenize.STRING and max_literal is not None:
+            text = _truncate_string_token(text, max_literal)
+        out.append(gap + text)
+
+    return "".join(out)
+
+
+def _compress_c(source, max_literal):
+    lines = [line.rstrip() for line in source.splitlines()]
+
+    # Whole-line // comments and multi-line /* */ comments as blocks
+    blocks, spans = [], []
+    i = 0
+    while i < len(lines):
+        stripped = lines[i].lstrip()
+        if stripped.startswith("//"):
+            j = i
+            while j + 1 < len(lines) and lines[j + 1].lstrip().startswith("//"):
+                j += 1
+        elif stripped.startswith("/*"):
+            j = i
+            while "*/" not in lines[j] and j + 1 < len(lines):
+                j += 1
+            # Unterminated, or code after the */
+            if not lines[j].endswith("*/"):
+                i += 1
+                continue
+        else:
+            i += 1
+            continue
+        blocks.append(lines[i:j + 1])
+        spans.append((i, j))
+        i = j + 1
+
+    kept = _squeeze_comment_blocks(blocks, set())
+    out = []
+    block_at = {start: (end, keep) for (start, end), keep in zip(spans, kept)}
+    i = 0
+    while i < len(lines):
+        if i in block_at:
+            end, keep = block_at[i]
+            if keep and len(keep) < end - i + 1 and lines[i].lstrip().startswith("/*"):
+                # Close a cut-down /* */ block
+                indent = lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+                keep = keep + [indent + " */"]
+            out.extend(keep)
+            i = end + 1
+            continue
+        out.append(lines[i])
+        i += 1
+
+    text = "\n".join(out)
+    if max_literal is not None:
+        text = re.sub(
+            _C_STRING % max_literal,
+            lambda m: m.group(1) + _cut(m.group(2), max_literal) + m.group(1),
+            text
+        )
+    return _BLANK_RUNS.sub("\n\n", text).strip("\n") + "\n"
+
+
+def looks_like_code(text):
+    return bool(_CODE_HINT.search(text))
+
+
+def _compress_text(source, max_literal, dedupe=True):
+    """
+    Plain-text pass. `dedupe` drops a line that repeats the one before
+    it; callers turn it off for code, where a repeated line may be
+    meant (x += 1 twice).
+    """
+    out = []
+    for line in source.splitlines():
+        line = _INNER_SPACES.sub(" ", line.rstrip())
+        # OCR often reads the same line twice
+        if dedupe and out and line and line == out[-1]:
+            continue
+        out.append(line)
+    text = "\n".join(out)
+    if max_literal is not None:
+        text = re.sub(_BLOB % max_literal, lambda m: _cut(m.group(0), max_literal), text)
+    return _BLANK_RUNS.sub("\n\n", text).strip("\n") + "\n"
+
+
+def _is_cut(original, value):
+    """
+    True if `value` is `original` shortened by _cut: a strict prefix of
+    it followed by "...".
+    """
+    ellipsis = "..." if isinstance(value, str) else b"..."
+    return (
+        type(original) is type(value)
+        and value.endswith(ellipsis)
+        and len(value) - 3 < len(original)
+        and original.startswith(value[:-3])
+    )
+
+
+def _same_python(original, compressed, max_literal):
+    """
+    True if both parse to the same AST. With `max_literal` set, a string
+    constant may differ only by having been cut (see _is_cut); any other
+    difference in a constant fails the check.
+    """
+    try:
+        before, after = ast.parse(original), ast.parse(compressed)
+    except (SyntaxError, ValueError):
+        return False
+
+    if max_literal is not None:
+        # Same walk order on both trees; if their shapes differ the dumps
+        # below differ anyway.
+        for old, new in zip(ast.walk(before), ast.walk(after)):
+            if (
+                isinstance(old, ast.Constant) and isinstance(new, ast.Constant)
+                and isinstance(old.value, (str, bytes)) and old.value != new.value
+            ):
+                if not _is_cut(old.value, new.value):
+                    return False
+                new.value = old.value
+    return ast.dump(before) == ast.dump(after)
+
+
+def compress(text, language=None, max_literal=MAX_LITERAL):
+    """
+    Squeeze pasted code or OCR text before it goes into a prompt.
+
+    Trailing whitespace and blank-line runs go everywhere. Code loses
+    license headers, repeated comment blocks and the tail of long
+    comment blocks, and string literals longer than `max_literal` are
+    shortened (None keeps them). Python is rewritten token by token and
+    must still parse to the same AST, otherwise the text is returned
+    unchanged. Plain text also loses runs of spaces, and repeated lines
+    unless it looks like code (or is code that did not tokenize).
+
+    Returns (compressed text, tokens saved).
+    """
+    language = language or guess_language(text)
+    try:
+        if language == "python":
+            compressed = _compress_python(text, max_literal)
+            if not _same_python(text, compressed, max_literal):
+                compressed = text
+        elif language == "c":
+            compressed = _compress_c(text, max_literal)
+        else:
+            compressed = _compress_text(
+                text, max_literal, dedupe=not looks_like_code(text)
+            )
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        compressed = _compress_text(text, max_literal, dedupe=False)
+
+    saved = estimate_tokens(text) - estimate_tokens(compressed)
+    if saved <= 0:
+        return text, 0
+    return compressed, saved
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+
+from backend.prompt import CONTEXT_BUDGET
+
+# The page and the background workers (answers, summaries) all write
+# the same sidecar files.
+_meta_lock = threading.Lock()
+
+
+def meta_path(chat_dir, chat_file):
+    """
+    Sidecar file kept next to chats/chat_<ts>.json.
+    """
+    name, _ = os.path.splitext(chat_file)
+    return os.path.join(chat_dir, f"{name}.meta.json")
+
+
+def load_meta(chat_dir, chat_file):
+    path = meta_path(chat_dir, chat_file)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_meta(chat_dir, chat_file, meta):
+    with open(meta_path(chat_dir, chat_file), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def update_meta(chat_dir, chat_file, **fields):
+    """
+    Set `fields` in the sidecar without losing keys written by another
+    thread in the meantime.
+    """
+    path = meta_path(chat_dir, chat_file)
+    with _meta_lock:
+        meta = load_meta(chat_dir, chat_file)
+        meta.update(fields)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+        return meta
+
+
+def delete_meta(chat_dir, chat_file):
+    path = meta_path(chat_dir, chat_file)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def context_fingerprint(model, system_instruction, extra=""):
+    """
+    Context tokens are only valid for the same model and the same
+    system prompt (plus any uploaded file text baked into it).
+    """
+    raw = "\0".join([model, system_instruction, extra])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def reusable_context(state, fingerprint, chat, turn_tokens=0,
+                     budget=CONTEXT_BUDGET):
+    """
+    Return the stored context tokens if they cover every message before
+    the new user turn and, with the `turn_tokens` of the new turn, still
+    fit in `budget`; otherwise None (caller sends the full prompt, which
+    is trimmed to the budget).
+    """
+    if not state or state.get("fingerprint") != fingerprint:
+        return None
+    if state.get("turns") != len(chat) - 1:
+        return None
+    tokens = state.get("tokens")
+    if not tokens or len(tokens) + turn_tokens > budget:
+        return None
+    return tokens
+
+
+def update_context(state, fingerprint, tokens, turns):
+    state.clear()
+    if tokens:
+        state.update({
+            "fingerprint": fingerprint,
+            "turns": turns,
+            "tokens": tokens
+        })
+    return state
@@ -0,0 +1,160 @@
+import sys
+from bisect import bisect_left
+
+from backend.prompt import estimate_tokens
+
+# "USER: " / "ASSISTANT: " etc., one string per role
+_prefixes = {}
+
+
+def _prefix(role):
+    prefix = _prefixes.get(role)
+    if prefix is None:
+        prefix = _prefixes[role] = sys.intern(f"{role.upper()}: ")
+    return prefix
+
+
+class Message:
+    """
+    One chat message. Roles are interned, so 10k messages share a
+    handful of role strings, and the token estimate of the rendered
+    line is computed once. Keys other than role/content found in a saved
+    chat are kept in `extra` so saving it again loses nothing.
+
+    Supports msg["role"] / msg["content"] like the old dicts.
+    """
+
+    __slots__ = ("role", "content", "tokens", "extra")
+
+    def __init__(self, role, content, extra=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = estimate_tokens(_prefix(self.role) + content + "\n")
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {k: v for k, v in data.items() if k not in ("role", "content")}
+        return cls(data["role"], data["content"], extra)
+
+    def to_dict(self):
+        data = {"role": self.role, "content": self.content}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def line(self):
+        return f"{_prefix(self.role)}{self.content}\n"
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+class Conversation:
+    """
+    Append-only list of Messages with running token totals and a cached
+    rendering of the last prompt window.
+
+    Appending a message is O(1); render_tail finds the budget window
+    with a binary search over the running totals and, while the window
+    start doesn't move, extends the cached text with the new lines
+    instead of re-rendering the whole transcript.
+
+    Reads like the old list of dicts: len(), iteration, chat[-1],
+    chat[i]["role"]. to_json()/from_json() round-trip chats/*.json.
+    """
+
+    __slots__ = ("messages", "_totals", "_rendered")
+
+    def __init__(self, messages=()):
+        self.messages = []
+        # _totals[i]: tokens of messages[:i]
+        self._totals = [0]
+        # (start, end, text) of the last render_tail
+        self._rendered = None
+        for message in messages:
+            self.append(message)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data)
+
+    def to_json(self):
+        return [message.to_dict() for message in self.messages]
+
+    def append(self, message):
+        """
+        Add a Message or a {"role": ..., "content": ...} dict.
+        """
+        if not isinstance(message, Message):
+            message = Message.from_dict(message)
+        self.messages.append(message)
+        self._totals.append(self._totals[-1] + message.tokens)
+
+    def copy(self):
+        """
+        Shallow copy; messages are never modified in place, so they are
+        shared.
+        """
+        other = Conversation()
+        other.messages = list(self.messages)
+        other._totals = list(self._totals)
+        other._rendered = self._rendered
+        return other
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def tokens(self, start=0):
+        return self._totals[-1] - self._totals[start]
+
+    def render_tail(self, budget, start=0):
+        """
+        Rendered lines of the newest messages (from `start` on) that fit
+        in `budget` tokens, and how many messages that is. The newest
+        message is always included, and a truncated window doesn't open
+        on an assistant answer whose question was cut off.
+        """
+        end = len(self.messages)
+        if end <= start:
+            return "", 0
+
+        # First i with tokens(messages[i:]) <= budget
+        first = bisect_left(self._totals, self._totals[-1] - budget, lo=start, hi=end)
+        first = min(max(first, start), end - 1)
+        if first > start and end - first > 1 and self.messages[first].role == "assistant":
+            first += 1
+
+        cached = self._rendered
+        if cached and cached[0] == first and cached[1] <= end:
+            text = cached[2] + "".join(m.line() for m in self.messages[cached[1]:end])
+        else:
+            text = "".join(m.line() for m in self.messages[first:end])
+        self._rendered = (first, end, text)
+        return text, end - first
@@ -0,0 +1,158 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.cancel import CancelToken
+
+
+class GenerationJob:
+    """
+    One answer being generated in the background. Chunks are appended
+    to `parts`; any number of readers can follow() the job from the
+    start while it runs.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.parts = []
+        self.final = None
+        self.result = None
+        self.error = None
+        self.done = False
+        self.completed = False
+        self.finished_at = None
+        self.cancel = CancelToken()
+        self.cond = threading.Condition()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def finish(self, frame):
+        """
+        on_done hook for generate_response: keeps the final frame.
+        """
+        self.final = frame
+
+    def follow(self):
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.parts) and not self.done:
+                    self.cond.wait()
+                pending = self.parts[index:]
+                finished = self.done
+            yield from pending
+            index += len(pending)
+            if finished and index >= len(self.parts):
+                return
+
+    def wait(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.done, timeout)
+
+
+class JobManager:
+    """
+    Runs generations on a worker pool, one job per chat key, so an
+    answer keeps streaming (and gets saved) when the page reruns or the
+    user switches chats. The UI re-attaches with get(key).follow().
+
+    Finished jobs are kept for `retain_seconds` so a returning page can
+    still collect them.
+    """
+
+    def __init__(self, max_workers=4, retain_seconds=600):
+        self.retain_seconds = retain_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="generation"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, start, on_complete=None):
+        """
+        start(job) returns the chunk iterator; it should pass job.cancel
+        and job.finish on to generate_response. on_complete(job) runs on
+        the worker after a full answer (not after a cancel) and its
+        return value is kept as job.result.
+
+        A job already running for `key` is cancelled.
+        """
+        job = GenerationJob(key)
+        with self._lock:
+            self._prune()
+            previous = self._jobs.get(key)
+            self._jobs[key] = job
+        if previous is not None:
+            previous.cancel.cancel()
+        self._executor.submit(self._run, job, start, on_complete)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(key)
+
+    def cancel(self, key):
+        job = self.get(key)
+        if job is not None:
+            job.cancel.cancel()
+        return job
+
+    def forget(self, job):
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.done)
+            return {"running": running, "finished": len(self._jobs) - running}
+
+    def _run(self, job, start, on_complete):
+        try:
+            if job.cancel.cancelled:
+                return
+            stream = start(job)
+            try:
+                for chunk in stream:
+                    if job.cancel.cancelled:
+                        break
+                    with job.cond:
+                        job.parts.append(chunk)
+                        job.cond.notify_all()
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+            if not job.cancel.cancelled:
+                job.completed = True
+                if on_complete:
+                    job.result = on_complete(job)
+        except Exception as e:
+            job.error = e
+        finally:
+            with job.cond:
+                job.done = True
+                job.finished_at = time.monotonic()
+                job.cond.notify_all()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, job in list(self._jobs.items()):
+            if job.done and now - job.finished_at > self.retain_seconds:
+                del self._jobs[key]
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager()
+        return _default_manager
@@ -1,41 +1,150 @@
-import requests
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-
-def generate_response(prompt, model="llama3", stream=True):
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": stream
-    }
+import requests
 
-    response = requests.post(
-        OLLAMA_URL,
-        json=payload,
-        stream=stream,
-        timeout=120
-    )
+from backend.cancel import abort_response
+from backend.pool import get_pool
+from backend.cache import ResponseCache, get_cache, replay_stream
+from backend.semantic_cache import get_semantic_cache
+from backend.coalesce import get_single_flight
+from backend.titler import CONFIDENCE_THRESHOLD, local_title
+from backend.profiles import profile_options
+from backend.metrics import get_metrics
 
-    if not stream:
-        return response.json()["response"]
 
-    def stream_generator():
+def stream_generator(response, on_done=None, cancel=None, timer=None):
+    """
+    Yield response text from an Ollama stream. The response is closed
+    when the stream ends, is cancelled or the generator is closed, which
+    drops the connection so Ollama stops generating.
+    timer: backend.metrics.RequestTimer; gets the first chunk and the
+    final frame, or is recorded as cancelled if the stream ends early.
+    """
+    if cancel is not None:
+        cancel.on_cancel(lambda: abort_response(response))
+    try:
         for line in response.iter_lines():
+            if cancel is not None and cancel.cancelled:
+                return
             if not line:
                 continue
             try:
                 data = json.loads(line.decode("utf-8"))
-                yield data.get("response", "")
             except json.JSONDecodeError:
                 continue
+            if timer is not None:
+                timer.chunk()
+            if data.get("done"):
+                if timer is not None:
+                    timer.finish(data)
+                if on_done:
+                    on_done(data)
+            yield data.get("response", "")
+    finally:
+        response.close()
+        if timer is not None:
+            timer.finish(cancelled=True)
+
+
+def record_stream(response, store, on_done=None, cancel=None, timer=None):
+    parts = []
+    final = {}
+
+    def finish(frame):
+        final.update(frame)
+        if on_done:
+            on_done(frame)
+
+    for chunk in stream_generator(response, finish, cancel, timer):
+        parts.append(chunk)
+        yield chunk
+
+    # Only complete answers are cached
+    if final:
+        store("".join(parts), final)
+
+
+def generate_response(prompt, model="llama3", stream=True, client=None,
+                      context=None, on_done=None, use_cache=True,
+                      mode="chat", query=None, session_id=None, cancel=None,
+                      profile=None):
+    """
+    context: token array from a previous final frame. When given, only
+    the new turn needs to be in `prompt`.
+    on_done: called with the final frame (it carries the new `context`).
+    use_cache: serve identical (model, prompt, context) requests from
+    the response cache.
+    query: standalone question for the semantic cache. Only pass it when
+    the answer does not depend on earlier turns; `mode` can opt out.
+    session_id: chat id used to keep a conversation on the same host.
+    cancel: CancelToken; cancelling it ends the stream, and the upstream
+    request is dropped once no other caller shares it.
+    profile: generation profile (backend.profiles); defaults to `mode`.
+    """
+    client = client or get_pool()
+    profile = profile or mode
+    options = profile_options(profile)
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "options": options
+    }
+    if context:
+        payload["context"] = context
+
+    cache = get_cache() if use_cache else None
+    semantic = get_semantic_cache(client) if use_cache and query else None
+
+    key = ResponseCache.make_key(
+        client.model_digest(model) if cache is not None else model,
+        prompt,
+        {"context": context, "options": options}
+    )
+
+    if cache is not None:
+        entry = cache.get(key)
+        if entry is None and semantic is not None:
+            entry = semantic.lookup(query, model, mode, options)
+        if entry is not None:
+            if not stream:
+                if on_done and entry.get("final"):
+                    on_done(entry["final"])
+                return entry["text"]
+            return replay_stream(entry, on_done)
+
+    def store(text, final):
+        if cache is not None:
+            cache.put(key, text, final)
+        if semantic is not None:
+            semantic.add(query, model, text, mode, options, final)
+
+    if not stream:
+        data = client.post("/api/generate", payload, kind=profile).json()
+        if on_done:
+            on_done(data)
+        store(data["response"], data)
+        return data["response"]
+
+    # Identical requests already streaming share that upstream stream
+    def start(finish, upstream_cancel):
+        def open_stream(host_client):
+            timer = get_metrics().start(model, profile, host_client.host)
+            response = host_client.post("/api/generate", payload, stream=True)
+            return record_stream(response, store, finish, upstream_cancel, timer)
+
+        return client.stream(model, open_stream, affinity=session_id)
 
-    return stream_generator()
+    return get_single_flight().stream(key, start, on_done, cancel)
 
-def generate_title(text, model="llama3"):
+
+def generate_title(text, model="llama3", client=None):
     """
     Generate a short chat title from user input.
     """
+    client = client or get_pool()
     prompt = (
         "Generate a very short title (max 5 words) for this message.\n"
         "Do NOT use quotes.\n"
@@ -43,15 +152,60 @@ def generate_title(text, model="llama3"):
         f"Message: {text}\nTitle:"
     )
 
-    response = requests.post(
-        OLLAMA_URL,
-        json={
+    response = client.post(
+        "/api/generate",
+        {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            # Stops at the end of the first line
+            "options": profile_options("title")
         },
-        timeout=60
+        read_timeout=60,
+        kind="title"
     )
 
     title = response.json()["response"].strip()
     return title[:40]
+
+
+# Titles are cosmetic, so they get a single worker and never hold more
+# than one Ollama slot next to the answers.
+_title_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="titles")
+_pending_titles = set()
+_pending_titles_lock = threading.Lock()
+
+
+def generate_title_async(text, on_title, key=None, model="llama3", client=None):
+    """
+    Title a chat from its first message. A confident local title
+    (backend.titler) goes to on_title(title) right away on the caller's
+    thread. Otherwise generate_title is queued on the background title
+    worker and on_title is called from there; the first words of `text`
+    stand in when the model call fails. A request for a `key` that is
+    still queued is ignored.
+    """
+    title, confidence = local_title(text)
+    if confidence >= CONFIDENCE_THRESHOLD:
+        on_title(title)
+        return True
+
+    key = key or text
+    with _pending_titles_lock:
+        if key in _pending_titles:
+            return False
+        _pending_titles.add(key)
+
+    def run():
+        try:
+            try:
+                title = generate_title(text, model=model, client=client)
+            except (requests.RequestException, KeyError, ValueError):
+                title = ""
+            on_title(title or text[:30])
+        finally:
+            with _pending_titles_lock:
+                _pending_titles.discard(key)
+
+    _title_executor.submit(run)
+    return True
@@ -1,5 +1,23 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backend.conversation import Conversation
+from backend.pool import get_pool
+from backend.profiles import profile_options
+
+# Messages always sent word for word (the last few turns)
+RECENT_MESSAGES = 8
+
+# Summaries are a side job: a small model keeps them cheap and off the
+# chat model's slot.
+SUMMARY_MODEL = "llama3.2:1b"
+SUMMARY_MAX_CHARS = 2000
+
+
 def init_chat():
-    return []
+    return Conversation()
 
 def add_message(chat, role, content):
     chat.append({
@@ -7,3 +25,128 @@ def add_message(chat, role, content):
         "content": content
     })
     return chat
+
+
+def summarize(summary, messages, model=SUMMARY_MODEL, client=None):
+    """
+    Fold `messages` into an existing summary with one model call.
+    Only the new messages are sent, never the whole transcript.
+    """
+    client = client or get_pool()
+    transcript = "".join(
+        f"{msg['role'].upper()}: {msg['content']}\n" for msg in messages
+    )
+    prompt = (
+        "Update the running summary of a conversation between a user and "
+        "a coding assistant.\n"
+        "Keep facts, decisions, names, code identifiers and open questions.\n"
+        "Reply with the updated summary only, in at most 150 words.\n\n"
+        f"CURRENT SUMMARY:\n{summary or '(empty)'}\n\n"
+        f"NEW MESSAGES:\n{transcript}\n"
+        "UPDATED SUMMARY:"
+    )
+
+    response = client.post(
+        "/api/generate",
+        {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": profile_options("summary")
+        },
+        read_timeout=120,
+        kind="summary"
+    )
+    return response.json()["response"].strip()[:SUMMARY_MAX_CHARS]
+
+
+# One worker: summaries are never urgent, and a chat's refreshes must
+# run in order anyway.
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summaries")
+
+
+class RollingMemory:
+    """
+    Long-chat memory: the last `keep` messages stay verbatim, older
+    messages are folded into a running summary.
+
+    `summarized` counts the messages already in the summary. Messages
+    past that point are sent verbatim until a background refresh has
+    folded them in, so nothing drops out of the prompt while a summary
+    is pending. The state round-trips through to_dict() so it can be
+    stored next to the chat and is not recomputed on reload.
+    """
+
+    def __init__(self, state=None, keep=RECENT_MESSAGES):
+        state = state or {}
+        self.summary = state.get("summary", "")
+        self.summarized = state.get("summarized", 0)
+        self.keep = keep
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        with self._lock:
+            return {"summary": self.summary, "summarized": self.summarized}
+
+    def window(self, chat):
+        """
+        (summary, index of the first message not yet summarized), i.e.
+        the `summary` and `start` arguments of build_prompt.
+        """
+        with self._lock:
+            if self.summarized > len(chat):
+                # The chat no longer matches this state; start over
+                self.summary, self.summarized = "", 0
+            return self.summary, self.summarized
+
+    def evicted(self, chat):
+        """
+        Messages that left the verbatim window but are not summarized
+        yet. Cut on a user message so a question and its answer are
+        folded together.
+        """
+        with self._lock:
+            end = max(self.summarized, len(chat) - self.keep)
+            while end > self.summarized and chat[end]["role"] != "user":
+                end -= 1
+            return self.summarized, chat[self.summarized:end]
+
+    def refresh_async(self, chat, on_update=None, model=SUMMARY_MODEL, client=None):
+        """
+        Queue a summary refresh for the newly evicted messages of `chat`
+        on the background summary worker. on_update(state) is called
+        from the worker with to_dict() after the summary has changed.
+        Returns False if there was nothing to do or a refresh for this
+        memory is already queued. A failed model call leaves the state
+        as it was; the next refresh retries the same messages.
+        """
+        start, messages = self.evicted(chat)
+        if not messages:
+            return False
+        with self._lock:
+            if self._pending:
+                return False
+            self._pending = True
+            summary = self.summary
+
+        def run():
+            try:
+                try:
+                    new_summary = summarize(summary, messages, model=model, client=client)
+                except (requests.RequestException, KeyError, ValueError):
+                    return
+                with self._lock:
+                    # Another copy of this state may have moved on
+                    if self.summarized != start:
+                        return
+                    self.summary = new_summary
+                    self.summarized = start + len(messages)
+                if on_update:
+                    on_update(self.to_dict())
+            finally:
+                with self._lock:
+                    self._pending = False
+
+        _summary_executor.submit(run)
+        return True
@@ -0,0 +1,270 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Append every request record here as JSON lines (optional)
+METRICS_JSONL = os.environ.get("OLLAMA_METRICS_JSONL")
+
+# Per-record fields summarised per model, and their Prometheus names
+# (Prometheus wants seconds, the records keep milliseconds).
+_SERIES = [
+    ("ttft_ms", "ollama_time_to_first_token_seconds", "Client-side time to first token", 1e-3),
+    ("total_ms", "ollama_request_duration_seconds", "Client-side request duration", 1e-3),
+    ("tokens_per_s", "ollama_eval_tokens_per_second", "Generation speed (eval_count / eval_duration)", 1),
+    ("prompt_tokens_per_s", "ollama_prompt_eval_tokens_per_second", "Prefill speed", 1),
+    ("load_ms", "ollama_load_duration_seconds", "Model load time reported by Ollama", 1e-3),
+]
+
+
+def _ms(nanoseconds):
+    return round(nanoseconds / 1e6, 3) if nanoseconds else None
+
+
+def _rate(count, nanoseconds):
+    return round(count / (nanoseconds / 1e9), 2) if count and nanoseconds else None
+
+
+def quantile(sorted_values, q):
+    """
+    Nearest-rank quantile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class RequestTimer:
+    """
+    Times one Ollama request. chunk() marks output arriving (the first
+    call sets TTFT); finish() takes Ollama's final frame and stores the
+    record. finish() only records once.
+    """
+
+    def __init__(self, registry, model, kind=None, host=None):
+        self.registry = registry
+        self.model = model
+        self.kind = kind
+        self.host = host
+        self.started = time.perf_counter()
+        self.first_chunk = None
+        self.frame = None
+        self._finished = False
+
+    def chunk(self):
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter()
+
+    def finish(self, frame=None, cancelled=False):
+        if self._finished:
+            return None
+        self._finished = True
+        frame = frame or self.frame or {}
+        ended = time.perf_counter()
+        first = self.first_chunk or (ended if frame else None)
+
+        record = {
+            "ts": time.time(),
+            "model": self.model,
+            "kind": self.kind,
+            "host": self.host,
+            "cancelled": cancelled,
+            "ttft_ms": round((first - self.started) * 1000, 3) if first else None,
+            "total_ms": round((ended - self.started) * 1000, 3),
+            "eval_count": frame.get("eval_count"),
+            "eval_ms": _ms(frame.get("eval_duration")),
+            "prompt_eval_count": frame.get("prompt_eval_count"),
+            "prompt_eval_ms": _ms(frame.get("prompt_eval_duration")),
+            "load_ms": _ms(frame.get("load_duration")),
+            "tokens_per_s": _rate(frame.get("eval_count"), frame.get("eval_duration")),
+            "prompt_tokens_per_s": _rate(
+                frame.get("prompt_eval_count"), frame.get("prompt_eval_duration")
+            ),
+        }
+        self.registry.record(record)
+        return record
+
+
+class MetricsRegistry:
+    """
+    Per-request records for Ollama calls, kept per model in a rolling
+    window of the last `window` requests (the p50/p95/p99 are over that
+    window), plus all-time counters. Records can also be appended to a
+    JSONL file as they come in.
+    """
+
+    def __init__(self, window=1000, jsonl_path=METRICS_JSONL):
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self._records = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def start(self, model, kind=None, host=None):
+        return RequestTimer(self, model, kind, host)
+
+    def record(self, record):
+        with self._lock:
+            model = record["model"]
+            self._records.setdefault(model, deque(maxlen=self.window)).append(record)
+            totals = self._totals.setdefault(model, {
+                "requests": 0, "cancelled": 0, "eval_tokens": 0, "prompt_tokens": 0,
+                "sums": {field: 0.0 for field, *_ in _SERIES},
+                "counts": {field: 0 for field, *_ in _SERIES},
+            })
+            totals["requests"] += 1
+            totals["cancelled"] += bool(record["cancelled"])
+            totals["eval_tokens"] += record["eval_count"] or 0
+            totals["prompt_tokens"] += record["prompt_eval_count"] or 0
+            for field, *_ in _SERIES:
+                if record.get(field) is not None:
+                    totals["sums"][field] += record[field]
+                    totals["counts"][field] += 1
+
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError:
+                    pass
+
+    def records(self, model=None):
+        with self._lock:
+            if model is not None:
+                return list(self._records.get(model, ()))
+            merged = [r for records in self._records.values() for r in records]
+        return sorted(merged, key=lambda r: r["ts"])
+
+    def summary(self):
+        """
+        {model: {"requests", "cancelled", "eval_tokens", field: {p50, p95, p99}}}
+        """
+        with self._lock:
+            snapshot = {model: list(records) for model, records in self._records.items()}
+            totals = {model: dict(t) for model, t in self._totals.items()}
+
+        summary = {}
+        for model, records in snapshot.items():
+            entry = {
+                "requests": totals[model]["requests"],
+                "cancelled": totals[model]["cancelled"],
+                "eval_tokens": totals[model]["eval_tokens"],
+            }
+            for field, *_ in _SERIES:
+                values = sorted(r[field] for r in records if r.get(field) is not None)
+                entry[field] = {
+                    f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES
+                }
+            summary[model] = entry
+        return summary
+
+    def prometheus(self):
+        """
+        Prometheus text exposition format: one summary per series with
+        p50/p95/p99 over the rolling window and all-time _sum/_count.
+        """
+        with self._lock:
+            snapshot = {model: list(records) for model, records in self._records.items()}
+            totals = {
+                model: {
+                    "requests": t["requests"], "cancelled": t["cancelled"],
+                    "eval_tokens": t["eval_tokens"], "prompt_tokens": t["prompt_tokens"],
+                    "sums": dict(t["sums"]), "counts": dict(t["counts"]),
+                }
+                for model, t in self._totals.items()
+            }
+
+        def label(model):
+            return model.replace("\\", "\\\\").replace('"', '\\"')
+
+        lines = []
+        for name, help_text, key in [
+            ("ollama_requests_total", "Ollama requests", "requests"),
+            ("ollama_cancelled_requests_total", "Requests cancelled before the final frame", "cancelled"),
+            ("ollama_eval_tokens_total", "Generated tokens", "eval_tokens"),
+            ("ollama_prompt_eval_tokens_total", "Prefilled prompt tokens", "prompt_tokens"),
+        ]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for model, t in sorted(totals.items()):
+                lines.append(f'{name}{{model="{label(model)}"}} {t[key]}')
+
+        for field, name, help_text, scale in _SERIES:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for model, records in sorted(snapshot.items()):
+                values = sorted(r[field] for r in records if r.get(field) is not None)
+                for q in QUANTILES:
+                    value = quantile(values, q)
+                    value = "NaN" if value is None else f"{value * scale:.6g}"
+                    lines.append(f'{name}{{model="{label(model)}",quantile="{q}"}} {value}')
+                lines.append(f'{name}_sum{{model="{label(model)}"}} {totals[model]["sums"][field] * scale:.6g}')
+                lines.append(f'{name}_count{{model="{label(model)}"}} {totals[model]["counts"][field]}')
+        return "\n".join(lines) + "\n"
+
+    def export_jsonl(self, path):
+        """
+        Write the records currently in the window to `path`.
+        """
+        records = self.records()
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = MetricsRegistry()
+        return _default_registry
+
+
+_server = None
+
+
+def start_metrics_server(port, registry=None):
+    """
+    Serve registry.prometheus() at http://0.0.0.0:<port>/metrics on a
+    daemon thread. Only the first call starts a server; returns it, or
+    None if the port is taken.
+    """
+    global _server
+    with _default_registry_lock:
+        if _server is not None:
+            return _server
+
+    registry = registry or get_metrics()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with _default_registry_lock:
+        _server = server
+    return server
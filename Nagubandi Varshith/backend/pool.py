@@ -0,0 +1,302 @@
+import bisect
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+
+from backend.client import OLLAMA_HOST, OllamaClient
+
+# Comma-separated list of Ollama base URLs, e.g.
+# OLLAMA_HOSTS=http://gpu1:11434,http://gpu2:11434
+OLLAMA_HOSTS = [
+    h.strip() for h in os.environ.get("OLLAMA_HOSTS", OLLAMA_HOST).split(",")
+    if h.strip()
+]
+
+
+def base_model_name(name):
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+def _ring_hash(value):
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class Host:
+    def __init__(self, url, client):
+        self.url = url
+        self.client = client
+        self.healthy = True
+        self.in_flight = 0
+        self.ewma_ttft = None
+        self.installed = {}   # model name -> digest
+        self.resident = set()
+
+
+class OllamaPool:
+    """
+    Routes requests over several Ollama hosts.
+
+    Hosts are health-checked through /api/tags (and /api/ps for the
+    models currently loaded). Each request goes to the healthy host with
+    the model resident that has the lowest in-flight count, ties broken
+    by the EWMA of time-to-first-token.
+
+    Requests carrying an affinity key (a chat id) are placed on a
+    consistent-hash ring instead, so a chat keeps hitting the node that
+    holds its KV cache. A node already above `load_factor` times the
+    average load is skipped (bounded load), and dead nodes drop out of
+    the walk, which rehomes their chats onto the next node.
+    """
+
+    def __init__(self, urls=None, alpha=0.3, health_interval=10,
+                 health_timeout=2, load_factor=1.25, virtual_nodes=64,
+                 max_tracked_sessions=10000, **client_kwargs):
+        self.alpha = alpha
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.load_factor = load_factor
+        self.max_tracked_sessions = max_tracked_sessions
+        self.hosts = [
+            Host(url.rstrip("/"), OllamaClient(host=url, **client_kwargs))
+            for url in (urls or OLLAMA_HOSTS)
+        ]
+        self._ring = sorted(
+            (_ring_hash(f"{host.url}#{i}"), index)
+            for index, host in enumerate(self.hosts)
+            for i in range(virtual_nodes)
+        )
+        self._ring_keys = [point for point, _ in self._ring]
+        self._homes = OrderedDict()
+        self.affinity_hits = 0
+        self.affinity_moves = 0
+        self.affinity_new = 0
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    # ---------------- health ----------------
+
+    def check_health(self):
+        with self._lock:
+            self._last_check = time.monotonic()
+        for host in self.hosts:
+            try:
+                tags = host.client.session.get(
+                    host.url + "/api/tags", timeout=self.health_timeout
+                )
+                tags.raise_for_status()
+                installed = {
+                    base_model_name(m["name"]): m.get("digest", "")
+                    for m in tags.json().get("models", [])
+                }
+                resident = set()
+                ps = host.client.session.get(
+                    host.url + "/api/ps", timeout=self.health_timeout
+                )
+                if ps.ok:
+                    resident = {
+                        base_model_name(m["name"]) for m in ps.json().get("models", [])
+                    }
+            except (requests.RequestException, ValueError, KeyError):
+                with self._lock:
+                    host.healthy = False
+                continue
+
+            with self._lock:
+                host.healthy = True
+                host.installed = installed
+                host.resident = resident
+
+    def _maybe_check_health(self):
+        """
+        The first check runs inline so routing starts with real data;
+        later ones refresh in the background.
+        """
+        with self._lock:
+            now = time.monotonic()
+            first = self._last_check == 0.0
+            stale = now - self._last_check > self.health_interval
+            if stale:
+                self._last_check = now
+        if first:
+            self.check_health()
+        elif stale:
+            threading.Thread(target=self.check_health, daemon=True).start()
+
+    # ---------------- routing ----------------
+
+    def _load(self, host):
+        return (host.in_flight, host.ewma_ttft or 0.0)
+
+    def candidates(self, model):
+        """
+        Hosts able to serve `model`, best tier first: resident, then
+        installed, then any healthy host, then everything as a last resort.
+        """
+        model = base_model_name(model)
+        healthy = [h for h in self.hosts if h.healthy]
+        for tier in (
+            [h for h in healthy if model in h.resident],
+            [h for h in healthy if model in h.installed],
+            healthy,
+            self.hosts
+        ):
+            if tier:
+                return tier
+        return []
+
+    def _ring_walk(self, key, allowed):
+        """
+        Hosts in `allowed` in ring order starting at the key's position.
+        """
+        start = bisect.bisect(self._ring_keys, _ring_hash(key))
+        seen = []
+        for offset in range(len(self._ring)):
+            host = self.hosts[self._ring[(start + offset) % len(self._ring)][1]]
+            if host in allowed and host not in seen:
+                seen.append(host)
+                if len(seen) == len(allowed):
+                    break
+        return seen
+
+    def _pick_affine(self, key, candidates):
+        total = sum(h.in_flight for h in candidates) + 1
+        limit = math.ceil(self.load_factor * total / len(candidates))
+        order = self._ring_walk(key, candidates)
+        for host in order:
+            if host.in_flight < limit:
+                return host
+        return order[0]
+
+    def _record_home(self, key, host):
+        previous = self._homes.get(key)
+        if previous is None:
+            self.affinity_new += 1
+        elif previous == host.url:
+            self.affinity_hits += 1
+        else:
+            self.affinity_moves += 1
+        self._homes[key] = host.url
+        self._homes.move_to_end(key)
+        while len(self._homes) > self.max_tracked_sessions:
+            self._homes.popitem(last=False)
+
+    def acquire(self, model, affinity=None):
+        self._maybe_check_health()
+        with self._lock:
+            candidates = self.candidates(model)
+            if affinity:
+                host = self._pick_affine(affinity, candidates)
+                self._record_home(affinity, host)
+            else:
+                host = min(candidates, key=self._load)
+            host.in_flight += 1
+            return host
+
+    def release(self, host, ttft=None, failed=False):
+        with self._lock:
+            host.in_flight -= 1
+            if failed:
+                host.healthy = False
+            if ttft is not None:
+                if host.ewma_ttft is None:
+                    host.ewma_ttft = ttft
+                else:
+                    host.ewma_ttft = self.alpha * ttft + (1 - self.alpha) * host.ewma_ttft
+
+    @contextmanager
+    def use(self, model):
+        host = self.acquire(model)
+        failed = False
+        try:
+            yield host.client
+        except requests.ConnectionError:
+            failed = True
+            raise
+        finally:
+            self.release(host, failed=failed)
+
+    # ---------------- client interface ----------------
+
+    def post(self, path, payload, stream=False, read_timeout=None, kind=None):
+        with self.use(payload.get("model", "")) as client:
+            return client.post(path, payload, stream=stream,
+                               read_timeout=read_timeout, kind=kind)
+
+    def stream(self, model, open_stream, affinity=None):
+        """
+        open_stream(client) -> generator. The host stays counted as
+        in flight until the generator finishes; the first chunk feeds
+        the host's TTFT average.
+        """
+        host = self.acquire(model, affinity)
+        started = time.perf_counter()
+        ttft = None
+        failed = False
+        try:
+            for chunk in open_stream(host.client):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                yield chunk
+        except requests.ConnectionError:
+            failed = True
+            raise
+        finally:
+            self.release(host, ttft=ttft, failed=failed)
+
+    def model_digest(self, model):
+        self._maybe_check_health()
+        name = base_model_name(model)
+        for host in self.hosts:
+            if host.installed.get(name):
+                return host.installed[name]
+        return model
+
+    def has_model(self, model):
+        """
+        Whether a healthy host has `model` installed, from the last
+        health check (no request of its own).
+        """
+        self._maybe_check_health()
+        name = base_model_name(model)
+        with self._lock:
+            return any(h.healthy and name in h.installed for h in self.hosts)
+
+    def affinity_stats(self):
+        with self._lock:
+            routed = self.affinity_hits + self.affinity_moves
+            return {
+                "hits": self.affinity_hits,
+                "moves": self.affinity_moves,
+                "new": self.affinity_new,
+                "hit_rate": self.affinity_hits / routed if routed else 0.0
+            }
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "host": h.url,
+                    "healthy": h.healthy,
+                    "in_flight": h.in_flight,
+                    "ewma_ttft": h.ewma_ttft,
+                    "resident": sorted(h.resident)
+                }
+                for h in self.hosts
+            ]
+
+
+_default_pool = None
+
+
+def get_pool():
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = OllamaPool()
+    return _default_pool
@@ -0,0 +1,30 @@
+# Ollama reloads a model whenever a request asks for a different num_ctx,
+# so every profile (and the residency preload) uses the same one. It
+# covers the prompt budget (backend.prompt.CONTEXT_BUDGET) plus the
+# longest answer.
+NUM_CTX = 8192
+
+# Ollama "options" per kind of request
+PROFILES = {
+    # One line of at most a few words
+    "title": {"num_predict": 16, "temperature": 0.2, "stop": ["\n"]},
+    "summary": {"num_predict": 256, "temperature": 0.2},
+    "chat": {"num_predict": 1024, "temperature": 0.7},
+    "code-gen": {"num_predict": 2048, "temperature": 0.2},
+    "explain": {"num_predict": 1536, "temperature": 0.4},
+    "image-debug": {"num_predict": 2048, "temperature": 0.2},
+}
+
+DEFAULT_PROFILE = "chat"
+
+
+def profile_options(name):
+    """
+    The options dict for profile `name` (unknown names get the chat
+    profile). A fresh copy, so callers may add to it.
+    """
+    options = dict(PROFILES.get(name) or PROFILES[DEFAULT_PROFILE])
+    options["num_ctx"] = NUM_CTX
+    if "stop" in options:
+        options["stop"] = list(options["stop"])
+    return options
@@ -1,23 +1,85 @@
-def build_prompt(chat_history):
-    system_instruction = (
-        "You are a coding assistant.\n"
-        "When you write code, ALWAYS format it using Markdown code blocks.\n"
-        "Example:\n"
-        "```python\n"
-        "print('Hello')\n"
-        "```\n"
-        "Explain clearly outside code blocks.\n\n"
+from functools import lru_cache
+
+SYSTEM_INSTRUCTION = (
+    "You are a coding assistant.\n"
+    "When you write code, ALWAYS format it using Markdown code blocks.\n"
+    "Example:\n"
+    "```python\n"
+    "print('Hello')\n"
+    "```\n"
+    "Explain clearly outside code blocks.\n\n"
+)
+
+
+# llama3 has an 8k context; leave room for the answer.
+CONTEXT_BUDGET = 6144
+
+# Rough English/code average for llama-family tokenizers.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=4096)
+def _message_line(role, content):
+    """
+    Rendered transcript line and its token estimate. Cached, so each
+    message is measured once rather than on every turn.
+    """
+    line = f"{role.upper()}: {content}\n"
+    return line, estimate_tokens(line)
+
+
+def build_prompt(chat_history, context="", budget=CONTEXT_BUDGET, summary="",
+                 start=0):
+    """
+    System instruction, the running `summary` of older turns (if any),
+    then as many of the most recent messages (from index `start` on) as
+    fit in `budget` tokens, then the uploaded-file `context`, then the
+    ASSISTANT: marker. The newest message is always kept.
+
+    A backend.conversation.Conversation renders its own window from
+    cached token totals; a plain list of dicts is measured here.
+    """
+    if summary:
+        summary = f"SUMMARY OF EARLIER CONVERSATION:\n{summary}\n\n"
+    used = (
+        estimate_tokens(SYSTEM_INSTRUCTION) + estimate_tokens(summary)
+        + estimate_tokens(context) + 3
     )
 
-    prompt = system_instruction
+    if hasattr(chat_history, "render_tail"):
+        transcript, _ = chat_history.render_tail(budget - used, start)
+        return "".join([SYSTEM_INSTRUCTION, summary, transcript, context, "ASSISTANT:"])
+
+    chat_history = chat_history[start:]
+
+    lines = []
+    first_role = None
+    for msg in reversed(chat_history):
+        line, tokens = _message_line(msg["role"], msg["content"])
+        if lines and used + tokens > budget:
+            break
+        lines.append(line)
+        first_role = msg["role"]
+        used += tokens
+
+    # Don't open the window on an answer whose question was cut off
+    if len(lines) < len(chat_history) and len(lines) > 1 and first_role == "assistant":
+        lines.pop()
 
-    for msg in chat_history:
-        role = msg["role"].upper()
-        content = msg["content"]
-        prompt += f"{role}: {content}\n"
+    lines.reverse()
+    return "".join([SYSTEM_INSTRUCTION, summary, *lines, context, "ASSISTANT:"])
 
-    prompt += "ASSISTANT:"
-    return prompt
+def build_turn_prompt(message, context=""):
+    """
+    Prompt for a single new turn, used when the earlier conversation is
+    already held in the Ollama context tokens. `context` is the file
+    excerpt picked for this question.
+    """
+    return f"{message['role'].upper()}: {message['content']}\n{context}ASSISTANT:"
 
 def build_image_debug_prompt(ocr_text):
     return f"""
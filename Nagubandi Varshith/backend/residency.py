@@ -0,0 +1,122 @@
+import threading
+import time
+
+import requests
+
+from backend.pool import get_pool, base_model_name
+from backend.profiles import NUM_CTX
+
+KEEP_ALIVE = "30m"
+
+
+class ResidencyManager:
+    """
+    Keeps the app's models loaded in Ollama.
+
+    warm() asks every host to load each model with a long keep_alive
+    (an empty prompt only loads the weights). While sessions keep calling
+    touch(), a background loop re-sends that request before keep_alive
+    runs out; once the app has been idle for `idle_timeout` the models
+    are left to unload on their own.
+    """
+
+    def __init__(self, models, pool=None, keep_alive=KEEP_ALIVE,
+                 refresh_interval=600, idle_timeout=1800, hot_ttl=5):
+        self.models = list(models)
+        self.pool = pool or get_pool()
+        self.keep_alive = keep_alive
+        self.refresh_interval = refresh_interval
+        self.idle_timeout = idle_timeout
+        self.hot_ttl = hot_ttl
+
+        self._last_active = time.monotonic()
+        self._hot = set()
+        self._hot_checked = 0.0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def touch(self):
+        self._last_active = time.monotonic()
+
+    def warm(self):
+        for host in self.pool.hosts:
+            for model in self.models:
+                try:
+                    host.client.post(
+                        "/api/generate",
+                        # Load with the context size the requests will use
+                        {
+                            "model": model,
+                            "keep_alive": self.keep_alive,
+                            "options": {"num_ctx": NUM_CTX}
+                        },
+                        read_timeout=300
+                    )
+                except requests.RequestException:
+                    continue
+        with self._lock:
+            self._hot_checked = 0.0
+
+    def hot_models(self):
+        """
+        Models currently loaded on at least one host (from /api/ps).
+        """
+        with self._lock:
+            if time.monotonic() - self._hot_checked < self.hot_ttl:
+                return set(self._hot)
+
+        hot = set()
+        for host in self.pool.hosts:
+            if not host.healthy:
+                continue
+            try:
+                ps = host.client.get("/api/ps").json()
+            except (requests.RequestException, ValueError):
+                continue
+            hot.update(base_model_name(m["name"]) for m in ps.get("models", []))
+
+        with self._lock:
+            self._hot = hot
+            self._hot_checked = time.monotonic()
+        return set(hot)
+
+    def prefer(self, candidates, default=None):
+        """
+        First resident model among `candidates`; if none is loaded,
+        `default` (or the first candidate).
+        """
+        hot = self.hot_models()
+        for model in candidates:
+            if base_model_name(model) in hot:
+                return model
+        if default is not None:
+            return default
+        return candidates[0] if candidates else None
+
+    def _run(self):
+        while True:
+            if time.monotonic() - self._last_active < self.idle_timeout:
+                self.warm()
+            time.sleep(self.refresh_interval)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_residency_manager(models):
+    """
+    One manager per model set for the whole process.
+    """
+    key = tuple(models)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = ResidencyManager(models)
+        return _managers[key]
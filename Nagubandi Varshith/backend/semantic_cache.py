@@ -0,0 +1,193 @@
+import hashlib
+import json
+import re
+import threading
+
+import numpy as np
+
+from backend.compress import looks_like_code
+
+EMBED_MODEL = "nomic-embed-text"
+SIMILARITY_THRESHOLD = 0.92
+
+# Modes whose answers depend on the exact input and must never be
+# served from a paraphrase.
+NO_CACHE_MODES = {"code-fix", "image-debug"}
+
+_FIX_REQUEST = re.compile(
+    r"\b(?:fix|debug|bug|error|exception|traceback|wrong|fails?|crash(?:es)?|not working)\b",
+    re.IGNORECASE
+)
+
+
+def query_mode(text):
+    """
+    "code-fix" for a question that pastes code or asks to fix something
+    (its answer depends on the exact text), otherwise "chat".
+    """
+    if "```" in text or looks_like_code(text) or _FIX_REQUEST.search(text):
+        return "code-fix"
+    return "chat"
+
+
+def ollama_embedder(client, model=EMBED_MODEL):
+    """
+    Embed text through Ollama's embeddings endpoint.
+    """
+    def embed(text):
+        response = client.post(
+            "/api/embeddings",
+            {"model": model, "prompt": text}
+        )
+        return np.asarray(response.json()["embedding"], dtype=np.float32)
+
+    return embed
+
+
+def hashing_embedder(dim=256):
+    """
+    Deterministic local stand-in for tests and offline use: hashed bag of
+    words plus character trigrams.
+    """
+    def embed(text):
+        vec = np.zeros(dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        features = words + [
+            w[i:i + 3] for w in words for i in range(max(len(w) - 2, 1))
+        ]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % dim
+            vec[index] += 1.0 if digest[4] & 1 else -1.0
+        return vec
+
+    return embed
+
+
+class SemanticCache:
+    """
+    Near-duplicate prompt cache. Vectors live in one preallocated matrix
+    so a lookup is a single matrix-vector product; the least recently
+    used row is overwritten when the cache is full.
+
+    Entries only match requests for the same model and generation
+    options. available: optional fn() -> bool; while it returns False
+    the cache is skipped without embedding anything.
+    """
+
+    def __init__(self, embed, threshold=SIMILARITY_THRESHOLD, capacity=512,
+                 no_cache_modes=NO_CACHE_MODES, available=None):
+        self.embed = embed
+        self.available = available
+        self.threshold = threshold
+        self.capacity = capacity
+        self.no_cache_modes = set(no_cache_modes)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors = None
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._model_ids = np.full(capacity, -1, dtype=np.int32)
+        self._models = {}
+        self._entries = [None] * capacity
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def enabled_for(self, mode):
+        if mode in self.no_cache_modes:
+            return False
+        return self.available is None or self.available()
+
+    @staticmethod
+    def _variant(model, options):
+        return model + "\0" + json.dumps(options or {}, sort_keys=True)
+
+    def lookup(self, query, model, mode="chat", options=None):
+        if not self.enabled_for(mode):
+            return None
+        vec = self._embed(query)
+        if vec is None:
+            return None
+
+        with self._lock:
+            if self._size == 0 or vec.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            sims = self._vectors[:self._size] @ vec
+            variant = self._models.get(self._variant(model, options), -1)
+            sims[self._model_ids[:self._size] != variant] = -1.0
+
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._clock += 1
+            self._last_used[best] = self._clock
+            self.hits += 1
+            return self._entries[best]
+
+    def add(self, query, model, text, mode="chat", options=None, final=None):
+        """
+        final: the answer's final Ollama frame, handed back on a hit for
+        its timings. Its `context` is dropped: those tokens belong to the
+        chat that asked first, not to the one that gets the hit.
+        """
+        if not self.enabled_for(mode) or not text:
+            return
+        vec = self._embed(query)
+        if vec is None:
+            return
+
+        with self._lock:
+            if self._vectors is None or vec.shape[0] != self._vectors.shape[1]:
+                self._vectors = np.zeros((self.capacity, vec.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.capacity
+                self._size = 0
+
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._clock += 1
+            self._vectors[slot] = vec
+            variant = self._variant(model, options)
+            self._model_ids[slot] = self._models.setdefault(variant, len(self._models))
+            self._last_used[slot] = self._clock
+            self._entries[slot] = {
+                "query": query, "model": model, "text": text,
+                "final": {k: v for k, v in (final or {}).items() if k != "context"}
+            }
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._size}
+
+    def _embed(self, text):
+        try:
+            vec = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception:
+            return None
+        norm = np.linalg.norm(vec)
+        if not norm:
+            return None
+        return vec / norm
+
+
+_default_cache = None
+
+
+def get_semantic_cache(client):
+    global _default_cache
+    if _default_cache is None:
+        # Without the embedding model every lookup would be a failed call
+        _default_cache = SemanticCache(
+            ollama_embedder(client),
+            available=lambda: client.has_model(EMBED_MODEL)
+        )
+    return _default_cache
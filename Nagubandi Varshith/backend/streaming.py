@@ -0,0 +1,67 @@
+import time
+
+CURSOR = "▍"
+
+
+class StreamFlusher:
+    """
+    Buffers streamed chunks and repaints a Streamlit placeholder at most
+    `fps` times a second (or sooner once `max_pending` characters are
+    waiting), instead of once per token.
+
+    Chunks are kept in a list and joined only when a frame is drawn.
+    """
+
+    def __init__(self, box, fps=20, max_pending=2048, cursor=CURSOR,
+                 clock=time.monotonic, **markdown_kwargs):
+        self.box = box
+        self.interval = 1.0 / fps if fps else 0.0
+        self.max_pending = max_pending
+        self.cursor = cursor
+        self.clock = clock
+        self.markdown_kwargs = markdown_kwargs
+
+        self.parts = []
+        self.frames = 0
+        self._pending = 0
+        self._last_flush = clock()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.parts.append(chunk)
+        self._pending += len(chunk)
+        if (
+            self._pending >= self.max_pending
+            or self.clock() - self._last_flush >= self.interval
+        ):
+            self.flush()
+
+    def flush(self, final=False):
+        """
+        Repaint the placeholder; the final frame drops the cursor.
+        """
+        text = self.text
+        self.parts = [text]
+        self.box.markdown(text if final else text + self.cursor, **self.markdown_kwargs)
+        self.frames += 1
+        self._pending = 0
+        self._last_flush = self.clock()
+
+    def close(self):
+        self.flush(final=True)
+        return self.text
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+def stream_to(box, chunks, **kwargs):
+    """
+    Drain `chunks` into `box` through a StreamFlusher and return the text.
+    """
+    flusher = StreamFlusher(box, **kwargs)
+    for chunk in chunks:
+        flusher.write(chunk)
+    return flusher.close()
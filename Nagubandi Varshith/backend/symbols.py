@@ -0,0 +1,276 @@
+import ast
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from backend.prompt import estimate_tokens
+
+# Most of the prompt is left for the chat itself
+FILE_CONTEXT_BUDGET = 2048
+
+_IDENTIFIER = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+
+# Java / JavaScript definitions, matched line by line
+_BRACE_DEFINITIONS = [
+    ("class", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|abstract\s+|final\s+|static\s+)*(?:class|interface|enum)\s+([A-Za-z_$][\w$]*)")),
+    ("function", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)\s*\(")),
+    ("function", re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)")),
+    ("method", re.compile(r"^\s*(?:(?:public|private|protected|static|final|abstract|synchronized|async|get|set)\s+)*(?:[\w$<>\[\],.?]+\s+)?([A-Za-z_$][\w$]*)\s*\([^;]*\)\s*(?:throws\s+[\w.,\s]+)?\{")),
+]
+_BRACE_IMPORT = re.compile(r"^\s*(?:import\s|package\s|(?:const|let|var)\s+.*=\s*require\()")
+_NOT_METHODS = {"if", "for", "while", "switch", "catch", "return", "new", "else", "do", "try", "synchronized"}
+
+
+class Symbol:
+    __slots__ = ("name", "kind", "start", "end", "refs")
+
+    def __init__(self, name, kind, start, end, refs=()):
+        self.name = name
+        self.kind = kind
+        # 1-based, inclusive
+        self.start = start
+        self.end = end
+        self.refs = set(refs)
+
+    @property
+    def short_name(self):
+        return self.name.rsplit(".", 1)[-1]
+
+
+class SymbolIndex:
+    """
+    Functions, classes and imports of one source file with their line
+    ranges, plus the names each symbol refers to.
+    """
+
+    def __init__(self, source, symbols, imports):
+        self.lines = source.splitlines()
+        self.symbols = symbols
+        self.imports = imports
+        self._by_name = {}
+        for symbol in symbols:
+            for name in {symbol.name, symbol.short_name}:
+                self._by_name.setdefault(name.lower(), []).append(symbol)
+
+    def lookup(self, name):
+        return self._by_name.get(name.lower(), [])
+
+    def referenced(self, question):
+        """
+        Symbols named in the question, then the symbols they use
+        directly (one level deep).
+        """
+        found = []
+        for word in _IDENTIFIER.findall(question):
+            for symbol in self.lookup(word):
+                if symbol not in found:
+                    found.append(symbol)
+
+        selected = list(found)
+        for symbol in found:
+            for ref in sorted(symbol.refs):
+                dependency = self._resolve(ref, symbol)
+                if dependency is not None and dependency not in selected:
+                    selected.append(dependency)
+        return selected
+
+    def _resolve(self, name, user):
+        """
+        The symbol `name` means inside `user`: a member of the same class
+        first, otherwise the only symbol with that name. Ambiguous names
+        (a common method name in several classes) are skipped.
+        """
+        candidates = [s for s in self.lookup(name) if s is not user]
+        scope = user.name.rsplit(".", 1)[0] + "." if "." in user.name else None
+        if scope:
+            local = [s for s in candidates if s.name.startswith(scope)]
+            if local:
+                candidates = local
+        return candidates[0] if len(candidates) == 1 else None
+
+    def source_of(self, symbol):
+        return "\n".join(self.lines[symbol.start - 1:symbol.end])
+
+    def outline(self):
+        return "\n".join(
+            f"{symbol.kind} {symbol.name} (lines {symbol.start}-{symbol.end})"
+            for symbol in self.symbols
+        )
+
+
+def _python_index(source):
+    tree = ast.parse(source)
+    symbols, imports = [], []
+
+    def refs(node):
+        # Names read in the body, minus its own arguments and locals
+        loads, local = set(), set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                (loads if isinstance(child.ctx, ast.Load) else local).add(child.id)
+            elif isinstance(child, ast.Attribute):
+                loads.add(child.attr)
+            elif isinstance(child, ast.arg):
+                local.add(child.arg)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child is not node:
+                local.add(child.name)
+        return loads - local
+
+    def visit(body, prefix=""):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                imports.append((node.lineno, node.end_lineno))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                kind = "class" if isinstance(node, ast.ClassDef) else "function"
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                symbol = Symbol(prefix + node.name, kind, start, node.end_lineno, refs(node))
+                symbol.refs.discard(node.name)
+                symbols.append(symbol)
+                if kind == "class":
+                    visit(node.body, prefix + node.name + ".")
+
+    visit(tree.body)
+    return symbols, imports
+
+
+def _block_end(lines, start):
+    """
+    Last line (1-based) of the brace block opened on or after `start`.
+    """
+    depth, opened = 0, False
+    for i in range(start - 1, len(lines)):
+        code = re.sub(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|//.*)", "", lines[i])
+        depth += code.count("{") - code.count("}")
+        opened = opened or "{" in code
+        if opened and depth <= 0:
+            return i + 1
+        if not opened and code.rstrip().endswith(";"):
+            return i + 1
+    return len(lines)
+
+
+def _brace_index(source):
+    """
+    Regex fallback for Java and JavaScript: definitions are found line
+    by line and end at their matching closing brace.
+    """
+    lines = source.splitlines()
+    symbols, imports = [], []
+    classes = []
+
+    for number, line in enumerate(lines, 1):
+        if _BRACE_IMPORT.match(line):
+            imports.append((number, number))
+            continue
+        for kind, pattern in _BRACE_DEFINITIONS:
+            match = pattern.match(line)
+            if not match or match.group(1) in _NOT_METHODS:
+                continue
+            end = _block_end(lines, number)
+            name = match.group(1)
+            while classes and classes[-1].end < number:
+                classes.pop()
+            if kind == "method":
+                if not classes:
+                    break
+                name = f"{classes[-1].name}.{name}"
+            symbol = Symbol(name, kind, number, end)
+            body = "\n".join(lines[number - 1:end])
+            symbol.refs = set(_IDENTIFIER.findall(body)) - {symbol.short_name}
+            symbols.append(symbol)
+            if kind == "class":
+                classes.append(symbol)
+            break
+
+    return symbols, imports
+
+
+def build_index(source, filename):
+    """
+    SymbolIndex for a .py/.java/.js file, or None for other files.
+    Python that doesn't parse falls back to an empty index (or the
+    brace scanner if it looks like another language).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".py":
+        try:
+            symbols, imports = _python_index(source)
+        except (SyntaxError, ValueError):
+            symbols, imports = _brace_index(source) if "{" in source else ([], [])
+    elif ext in (".java", ".js", ".jsx", ".ts"):
+        symbols, imports = _brace_index(source)
+    else:
+        return None
+    return SymbolIndex(source, symbols, imports)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(source, filename, max_entries=32):
+    """
+    build_index, cached by content hash: asking again about the same
+    file doesn't parse it again.
+    """
+    key = hashlib.sha1(f"{filename}\0{source}".encode("utf-8")).hexdigest()
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = build_index(source, filename)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > max_entries:
+            _indexes.popitem(last=False)
+    return index
+
+
+def file_context(source, filename, question, budget=FILE_CONTEXT_BUDGET):
+    """
+    The part of an uploaded file worth sending with `question`.
+
+    A file that fits in `budget` tokens is sent whole. Otherwise only the
+    symbols the question names and their direct dependencies are sent,
+    with the file's imports; when no symbol is named, an outline of the
+    file. Plain text files are cut at the budget.
+    """
+    if estimate_tokens(source) <= budget:
+        return source
+
+    index = get_symbol_index(source, filename)
+    if index is None:
+        return source[:budget * 4]
+
+    parts = []
+    used = 0
+
+    def add(text):
+        nonlocal used
+        tokens = estimate_tokens(text)
+        if used + tokens > budget:
+            return False
+        parts.append(text)
+        used += tokens
+        return True
+
+    if index.imports:
+        add("\n".join(
+            "\n".join(index.lines[start - 1:end]) for start, end in index.imports
+        ))
+
+    selected = index.referenced(question)
+    covered = []
+    for symbol in selected:
+        # A method inside a class that is already included
+        if any(c.start <= symbol.start and symbol.end <= c.end for c in covered):
+            continue
+        if add(f"# {filename} lines {symbol.start}-{symbol.end}\n{index.source_of(symbol)}"):
+            covered.append(symbol)
+
+    if not covered:
+        add(f"Outline of {filename}:\n{index.outline()}")
+
+    return "\n\n".join(parts)
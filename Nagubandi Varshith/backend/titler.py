@@ -0,0 +1,130 @@
+import re
+
+MAX_TITLE_WORDS = 5
+
+# Titles at or above this confidence are used without asking the model
+CONFIDENCE_THRESHOLD = 0.5
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing done down
+during each even ever every few for from further get gets getting got had has
+have having he her here hers him his how i if in into is it its itself just
+let like make me more most my no nor not now of off on once only or other our
+out over own please same she should so some such than that the their them
+then there these they this those through to too under until up us use using
+very via was we were what when where which while who whom why will with would
+you your yours yourself hi hii hey heyy hello thanks thank ok okay yes pls
+""".split())
+
+# Request phrasing that says nothing about the topic
+FILLER = frozenset("""
+write writing give show tell explain create build generate implement need
+want help find provide say know make code program programs script snippet
+example examples simple small basic quick function method question solve
+answer way ways one something thing things kindly fix work works vs two
+""".split())
+
+# Language keywords that show up when code is pasted without a fence
+CODE_KEYWORDS = frozenset("""
+def return class import from print if elif else for while try except
+finally with lambda yield none true false null var let const public private
+static void int float str self this new function end
+""".split())
+
+LANGUAGES = {
+    "python": "Python", "py": "Python", "java": "Java",
+    "javascript": "JavaScript", "js": "JavaScript", "typescript": "TypeScript",
+    "ts": "TypeScript", "c++": "C++", "cpp": "C++", "c#": "C#", "csharp": "C#",
+    "c": "C", "golang": "Go", "rust": "Rust", "kotlin": "Kotlin",
+    "swift": "Swift", "php": "PHP", "ruby": "Ruby", "sql": "SQL",
+    "html": "HTML", "css": "CSS", "bash": "Bash", "react": "React",
+}
+
+ACRONYMS = {"api", "sql", "html", "css", "json", "xml", "http", "url", "dfs",
+            "bfs", "oop", "gcd", "lcm", "ocr", "csv", "jwt", "rest", "ui"}
+
+_FENCE = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+_DEFINITION = re.compile(r"\b(?:def|class|function|func|fn|void|int)\s+([A-Za-z_]\w*)")
+_ERROR = re.compile(r"\b([A-Z]\w*(?:Error|Exception))\b")
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:[+#]{1,2})?")
+_CAMEL = re.compile(r"[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])")
+
+
+def _split_identifier(name):
+    """
+    binary_search / binarySearch -> ["binary", "search"]
+    """
+    words = []
+    for part in name.split("_"):
+        words.extend(w.lower() for w in _CAMEL.findall(part))
+    return words
+
+
+def _display(word):
+    if word in LANGUAGES:
+        return LANGUAGES[word]
+    if word in ACRONYMS:
+        return word.upper()
+    return word[:1].upper() + word[1:]
+
+
+def local_title(text, max_words=MAX_TITLE_WORDS):
+    """
+    Extractive title for a chat's first message, without a model call.
+
+    Returns (title, confidence). The title is the language (if any)
+    followed by the first topic words: identifiers from code, error
+    names, then non-stopword words in order. Confidence is low when the
+    message has almost no topic words (greetings, "help me").
+    """
+    text = text.strip()
+    code = " ".join(_FENCE.findall(text))
+    prose = _FENCE.sub(" ", text)
+
+    language = None
+    keywords = []
+
+    def add(word):
+        if word in LANGUAGES:
+            nonlocal language
+            language = language or word
+        elif word not in keywords:
+            keywords.append(word)
+
+    # Error names are shown as written (ZeroDivisionError), not lowercased
+    errors = {name.lower(): name for name in _ERROR.findall(text)}
+    for name in errors:
+        add(name)
+
+    definitions = _DEFINITION.findall(code or prose)
+    for name in definitions:
+        for word in _split_identifier(name):
+            if word not in STOPWORDS and word not in FILLER and word not in CODE_KEYWORDS:
+                add(word)
+
+    for token in _WORD.findall(prose):
+        if token.lower() in errors:
+            continue
+        if token[1:] != token[1:].lower() and not token.isupper():
+            words = _split_identifier(token)
+        else:
+            words = [token.lower()]
+        for word in words:
+            if (
+                word in STOPWORDS or word in FILLER or word in CODE_KEYWORDS
+                or len(word) < 2 and word not in LANGUAGES
+            ):
+                continue
+            add(word)
+
+    words = ([language] if language else []) + keywords
+    title = " ".join(
+        errors.get(w) or _display(w) for w in words[:max_words]
+    )
+
+    topic = len(keywords) + len(errors) + len(definitions)
+    confidence = min(1.0, topic / 2.0)
+    if language and keywords:
+        confidence = min(1.0, confidence + 0.25)
+    return title, confidence
@@ -0,0 +1,78 @@
+import streamlit as st
+import time
+import json
+
+from backend.metrics import get_metrics
+from backend.pool import get_pool
+
+st.set_page_config(page_title="CODEGEN AI · Admin", layout="wide")
+
+st.markdown("## Ollama metrics")
+st.caption(
+    "Per-request timings from the final Ollama frame plus client-side "
+    "TTFT, over the last requests of each model."
+)
+
+metrics = get_metrics()
+summary = metrics.summary()
+
+if st.button("🔄 Refresh"):
+    st.rerun()
+
+# ---------------- PER MODEL ----------------
+if not summary:
+    st.info("No requests recorded yet.")
+else:
+    rows = []
+    for model, entry in sorted(summary.items()):
+        row = {
+            "model": model,
+            "requests": entry["requests"],
+            "cancelled": entry["cancelled"],
+            "tokens": entry["eval_tokens"],
+        }
+        for field, label in [
+            ("ttft_ms", "TTFT ms"),
+            ("total_ms", "total ms"),
+            ("tokens_per_s", "tok/s"),
+            ("prompt_tokens_per_s", "prefill tok/s"),
+        ]:
+            for p in ("p50", "p95", "p99"):
+                row[f"{label} {p}"] = entry[field][p]
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    # ---------------- RECENT REQUESTS ----------------
+    st.markdown("### Recent requests")
+    recent = metrics.records()[-50:][::-1]
+    st.dataframe(
+        [
+            {**r, "ts": time.strftime("%H:%M:%S", time.localtime(r["ts"]))}
+            for r in recent
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+# ---------------- HOSTS ----------------
+st.markdown("### Hosts")
+st.dataframe(get_pool().stats(), use_container_width=True, hide_index=True)
+
+# ---------------- EXPORT ----------------
+st.markdown("### Export")
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button(
+        "Download JSONL",
+        "".join(json.dumps(r) + "\n" for r in metrics.records()),
+        file_name="ollama_metrics.jsonl",
+        mime="application/jsonl"
+    )
+with col2:
+    st.download_button(
+        "Download Prometheus text",
+        metrics.prometheus(),
+        file_name="ollama_metrics.prom",
+        mime="text/plain"
+    )
+st.caption("Set METRICS_PORT to scrape the same data at /metrics.")
@@ -0,0 +1,20 @@
+import os
+import socket
+import sys
+
+import pytest
+
+# The app folder, so `backend` and `tools` import as they do when the app runs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def dead_url():
+    """
+    URL of a local port with nothing listening on it.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
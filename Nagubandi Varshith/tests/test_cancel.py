@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from backend.cancel import CancelToken
+from backend.client import OllamaClient
+from backend.llm import generate_response
+from tools.mock_ollama import MockOllama
+
+# The mock only notices a hang-up when it writes the next token
+TOKEN_DELAY = 0.05
+DISCONNECT_WITHIN = 2.0
+
+
+@pytest.fixture
+def mock():
+    server = MockOllama(ttft=0, token_delay=TOKEN_DELAY, jitter=0, tokens=500).start()
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_cancel_mid_stream_drops_upstream_connection(mock):
+    cancel = CancelToken()
+    stream = generate_response(
+        "write a long answer", client=OllamaClient(host=mock.url),
+        use_cache=False, cancel=cancel
+    )
+
+    received = [next(stream) for _ in range(3)]
+    assert all(received)
+
+    cancelled_at = time.monotonic()
+    cancel.cancel()
+    assert list(stream) == []
+
+    assert wait_for(lambda: mock.stats()["cancelled"] == 1, DISCONNECT_WITHIN)
+    assert time.monotonic() - cancelled_at < DISCONNECT_WITHIN
+    stats = mock.stats()
+    assert stats["completed"] == 0
+    assert stats["eval_tokens"] == 0
+    assert wait_for(lambda: mock.stats()["in_flight"] == 0, DISCONNECT_WITHIN)
+
+
+def test_cancel_from_another_thread_wakes_blocked_reader(mock):
+    mock.token_delay = 5.0
+    cancel = CancelToken()
+    stream = generate_response(
+        "slow answer", client=OllamaClient(host=mock.url),
+        use_cache=False, cancel=cancel
+    )
+    assert next(stream)
+
+    # The reader is now blocked waiting for a token 5s away
+    threading.Timer(0.2, cancel.cancel).start()
+    started = time.monotonic()
+    assert list(stream) == []
+    assert time.monotonic() - started < DISCONNECT_WITHIN
@@ -0,0 +1,92 @@
+import queue
+import threading
+
+from backend.cancel import CancelToken
+from backend.coalesce import SingleFlight
+
+TIMEOUT = 2.0
+
+
+class Upstream:
+    """
+    Fake model stream: yields whatever is put() into it until None.
+    Records whether it was closed before the end.
+    """
+
+    def __init__(self):
+        self.feed = queue.Queue()
+        self.closed_early = threading.Event()
+        self.calls = 0
+
+    def start(self, finish, cancel):
+        self.calls += 1
+
+        def generate():
+            try:
+                while True:
+                    chunk = self.feed.get(timeout=TIMEOUT)
+                    if chunk is None:
+                        finish({"done": True})
+                        return
+                    yield chunk
+            except GeneratorExit:
+                self.closed_early.set()
+                raise
+
+        return generate()
+
+    def put(self, *chunks):
+        for chunk in chunks:
+            self.feed.put(chunk)
+
+
+def test_identical_requests_share_one_upstream():
+    flights, upstream = SingleFlight(), Upstream()
+    first = flights.stream("k", upstream.start)
+    upstream.put("a")
+    assert next(first) == "a"
+
+    # A caller joining mid-stream still gets every chunk from the start
+    second = flights.stream("k", upstream.start)
+    upstream.put("b", None)
+    assert list(first) == ["b"]
+    assert list(second) == ["a", "b"]
+    assert upstream.calls == 1
+    assert (flights.started, flights.joined) == (1, 1)
+
+
+def test_upstream_runs_until_the_last_subscriber_leaves():
+    flights, upstream = SingleFlight(), Upstream()
+    leaving, staying = CancelToken(), CancelToken()
+    first = flights.stream("k", upstream.start, cancel=leaving)
+    second = flights.stream("k", upstream.start, cancel=staying)
+    upstream.put("a")
+    assert next(first) == "a" and next(second) == "a"
+
+    leaving.cancel()
+    assert list(first) == []
+    assert not upstream.closed_early.is_set()
+
+    staying.cancel()
+    assert list(second) == []
+    upstream.put("never read")
+    assert upstream.closed_early.wait(TIMEOUT)
+    assert "k" not in flights._flights
+
+
+def test_late_caller_starts_a_new_flight_after_the_last_leave():
+    flights, upstream = SingleFlight(), Upstream()
+    first = flights.stream("k", upstream.start)
+    upstream.put("a")
+    assert next(first) == "a"
+    first.close()
+
+    # The first flight is being torn down: a new caller gets its own
+    # upstream and a complete answer instead of a truncated one
+    again = Upstream()
+    late = flights.stream("k", again.start)
+    again.put("x", "y", None)
+    assert list(late) == ["x", "y"]
+    assert (flights.started, flights.joined) == (2, 0)
+    upstream.put("never read")
+    assert upstream.closed_early.wait(TIMEOUT)
@@ -0,0 +1,57 @@
+import ast
+import glob
+import os
+
+import pytest
+
+from backend.compress import _same_python, compress
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parsable_sources():
+    for path in sorted(glob.glob(os.path.join(PROJECT, "**", "*.py"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        try:
+            ast.parse(source)
+        except (SyntaxError, ValueError):
+            continue
+        yield os.path.relpath(path, PROJECT), source
+
+
+@pytest.mark.parametrize("path,source", list(parsable_sources()))
+def test_python_keeps_its_ast(path, source):
+    compressed, _ = compress(source, language="python", max_literal=None)
+    assert ast.dump(ast.parse(compressed)) == ast.dump(ast.parse(source))
+
+
+def test_long_literals_are_cut_to_a_prefix():
+    source = "DATA = '" + "ab" * 500 + "'\nB = b'" + "x" * 500 + "'\n"
+    compressed, saved = compress(source, max_literal=50)
+    assert saved > 0
+    tree = ast.parse(compressed)
+    text, data = tree.body[0].value.value, tree.body[1].value.value
+    assert text.endswith("...") and ("ab" * 500).startswith(text[:-3])
+    assert data.endswith(b"...") and len(data) == 53
+
+
+def test_same_python_rejects_changed_literals():
+    original = "A = '" + "x" * 300 + "'\n"
+    assert _same_python(original, "A = '" + "x" * 100 + "...'\n", 100)
+    # Same first characters, different tail: not a cut
+    assert not _same_python(original, "A = '" + "x" * 50 + "y...'\n", 100)
+    assert not _same_python("A = 'abc'\n", "A = 'abd'\n", 100)
+
+
+def test_repeated_lines_are_kept_in_code():
+    code = "count = 0\n  count += 1\n  count += 1\n  print(count"
+    compressed, _ = compress(code)
+    assert compressed.count("count += 1") == 2
+
+
+def test_repeated_lines_are_dropped_in_plain_text():
+    text = "Total due   now\nTotal due   now\n\n\n\nThanks\n"
+    compressed, saved = compress(text)
+    assert compressed == "Total due now\n\nThanks\n"
+    assert saved > 0
@@ -0,0 +1,23 @@
+from backend.context import reusable_context, update_context
+
+CHAT = [
+    {"role": "user", "content": "hi"},
+    {"role": "assistant", "content": "hello"},
+    {"role": "user", "content": "next"},
+]
+
+
+def test_reuses_tokens_that_cover_the_chat():
+    state = update_context({}, "fp", [1] * 100, turns=2)
+    assert reusable_context(state, "fp", CHAT, turn_tokens=10, budget=200) == [1] * 100
+
+
+def test_rejects_tokens_that_would_overflow_the_budget():
+    state = update_context({}, "fp", [1] * 190, turns=2)
+    assert reusable_context(state, "fp", CHAT, turn_tokens=20, budget=200) is None
+
+
+def test_rejects_stale_or_foreign_tokens():
+    state = update_context({}, "fp", [1] * 10, turns=2)
+    assert reusable_context(state, "other", CHAT) is None
+    assert reusable_context(state, "fp", CHAT + CHAT[:2]) is None
@@ -0,0 +1,41 @@
+from backend.memory import RollingMemory
+from backend.prompt import build_prompt
+
+
+def chat_of(turns):
+    chat = []
+    for i in range(turns):
+        chat.append({"role": "user", "content": f"question {i}"})
+        chat.append({"role": "assistant", "content": f"answer {i}"})
+    return chat
+
+
+def test_short_chat_evicts_nothing():
+    memory = RollingMemory(keep=8)
+    for turns in range(5):
+        start, messages = memory.evicted(chat_of(turns))
+        assert (start, messages) == (0, [])
+        assert not memory.refresh_async(chat_of(turns))
+
+
+def test_evicts_whole_turns_past_the_window():
+    memory = RollingMemory(keep=4)
+    chat = chat_of(4)
+    start, messages = memory.evicted(chat)
+    assert start == 0
+    assert messages == chat[:4]
+
+
+def test_evicts_nothing_when_summary_is_ahead_of_the_window():
+    memory = RollingMemory({"summary": "s", "summarized": 4}, keep=8)
+    assert memory.evicted(chat_of(3)) == (4, [])
+
+
+def test_overflow_prompt_carries_the_summary():
+    memory = RollingMemory({"summary": "user is porting a parser", "summarized": 4})
+    chat = chat_of(4)
+    summary, start = memory.window(chat)
+    prompt = build_prompt(chat, summary=summary, start=start)
+    assert "user is porting a parser" in prompt
+    assert "question 1" not in prompt
+    assert "question 3" in prompt
@@ -0,0 +1,52 @@
+import pytest
+
+from backend.client import OllamaClient
+from backend.metrics import MetricsRegistry, get_metrics, quantile
+from tools.mock_ollama import MockOllama
+
+
+@pytest.mark.parametrize("n,q,expected", [
+    (10, 0.5, 5),     # rank 5 of 10, not 6
+    (10, 0.95, 10),
+    (100, 0.5, 50),
+    (100, 0.95, 95),
+    (100, 0.99, 99),
+    (4, 0.5, 2),
+    (3, 0.5, 2),
+    (1, 0.99, 1),
+])
+def test_quantile_is_nearest_rank(n, q, expected):
+    assert quantile(list(range(1, n + 1)), q) == expected
+
+
+def test_quantile_of_nothing():
+    assert quantile([], 0.5) is None
+
+
+def test_summary_uses_nearest_rank():
+    registry = MetricsRegistry(jsonl_path=None)
+    # One second of eval time each, so tokens_per_s == eval_count
+    for tokens in range(1, 11):
+        registry.start("llama3").finish({"eval_count": tokens, "eval_duration": 10 ** 9})
+    summary = registry.summary()["llama3"]
+    assert summary["requests"] == 10
+    assert summary["tokens_per_s"] == {"p50": 5, "p95": 10, "p99": 10}
+
+
+@pytest.fixture
+def mock():
+    server = MockOllama(ttft=0, token_delay=0, jitter=0, tokens=4).start()
+    yield server
+    server.stop()
+
+
+def test_only_generations_are_recorded(mock):
+    client = OllamaClient(host=mock.url)
+
+    client.post("/api/generate", {"model": "llama3", "prompt": "hi", "stream": False}, kind="metrics-test")
+    client.post("/api/embeddings", {"model": "llama3", "prompt": "hi"}, kind="metrics-test")
+    client.post("/api/generate", {"model": "llama3", "keep_alive": "5m"}, kind="metrics-test")
+
+    records = [r for r in get_metrics().records("llama3") if r["kind"] == "metrics-test"]
+    assert len(records) == 1
+    assert records[0]["eval_count"]
@@ -0,0 +1,88 @@
+import pytest
+import requests
+
+from backend.llm import generate_response
+from backend.pool import OllamaPool
+from tools.mock_ollama import MockOllama
+
+
+@pytest.fixture
+def hosts():
+    mocks = [MockOllama(ttft=0, token_delay=0, jitter=0, tokens=4).start() for _ in range(2)]
+    yield mocks
+    for mock in mocks:
+        mock.stop()
+
+
+def load(mock, model):
+    requests.post(mock.url + "/api/generate", json={"model": model}, timeout=5).raise_for_status()
+
+
+def answer(pool, prompt, session_id=None):
+    return "".join(generate_response(
+        prompt, client=pool, use_cache=False, session_id=session_id
+    ))
+
+
+def test_routes_to_host_with_model_resident(hosts):
+    load(hosts[1], "llama3")
+    pool = OllamaPool([mock.url for mock in hosts])
+    pool.check_health()
+
+    assert pool.hosts[1].resident == {"llama3"}
+    for i in range(4):
+        answer(pool, f"question {i}")
+    assert hosts[0].stats()["completed"] == 0
+    assert hosts[1].stats()["completed"] == 4
+
+
+def test_spreads_concurrent_requests_by_load(hosts):
+    pool = OllamaPool([mock.url for mock in hosts])
+    pool.check_health()
+
+    first = pool.acquire("llama3")
+    second = pool.acquire("llama3")
+    assert first is not second
+    pool.release(first)
+    pool.release(second)
+    assert [h.in_flight for h in pool.hosts] == [0, 0]
+
+
+def test_session_affinity_keeps_a_chat_on_one_host(hosts):
+    pool = OllamaPool([mock.url for mock in hosts])
+    pool.check_health()
+
+    for i in range(5):
+        answer(pool, f"turn {i}", session_id="chat-1")
+    served = [mock.stats()["requests"] for mock in hosts]
+    assert sorted(served) == [0, 5]
+    assert pool.affinity_stats()["hits"] == 4
+
+
+def test_health_check_marks_dead_host(hosts, dead_url):
+    pool = OllamaPool([hosts[0].url, dead_url], health_timeout=1)
+    pool.check_health()
+
+    assert pool.hosts[0].healthy
+    assert not pool.hosts[1].healthy
+    assert pool.has_model("llama3")
+    for i in range(3):
+        answer(pool, f"question {i}")
+    assert hosts[0].stats()["requests"] == 3
+
+
+def test_fails_over_when_a_host_dies(hosts, dead_url):
+    pool = OllamaPool([dead_url, hosts[0].url], health_timeout=1)
+    # Both look healthy until a request finds out otherwise
+    pool.check_health()
+    pool.hosts[0].healthy = True
+    pool.hosts[0].installed = dict(pool.hosts[1].installed)
+    pool.hosts[0].resident = {"llama3"}
+
+    with pytest.raises(requests.ConnectionError):
+        answer(pool, "first")
+    assert not pool.hosts[0].healthy
+    assert pool.hosts[0].in_flight == 0
+
+    assert answer(pool, "second")
+    assert hosts[0].stats()["completed"] == 1
@@ -0,0 +1,42 @@
+import pytest
+import requests
+
+from backend.pool import OllamaPool
+from backend.residency import ResidencyManager
+from tools.mock_ollama import MockOllama
+
+
+@pytest.fixture
+def mock():
+    server = MockOllama(ttft=0, token_delay=0, jitter=0, tokens=4).start()
+    yield server
+    server.stop()
+
+
+def manager(mock):
+    return ResidencyManager(["llama3"], pool=OllamaPool([mock.url]), hot_ttl=0)
+
+
+def load(mock, model):
+    requests.post(mock.url + "/api/generate", json={"model": model}, timeout=5).raise_for_status()
+
+
+def test_warm_loads_the_configured_models(mock):
+    residency = manager(mock)
+    assert residency.hot_models() == set()
+    residency.warm()
+    assert residency.hot_models() == {"llama3"}
+
+
+def test_prefer_picks_a_resident_model(mock):
+    residency = manager(mock)
+    load(mock, "llama3")
+    assert residency.prefer(["llama3.2:1b", "llama3"]) == "llama3"
+    load(mock, "llama3.2:1b")
+    assert residency.prefer(["llama3.2:1b", "llama3"]) == "llama3.2:1b"
+
+
+def test_prefer_falls_back_when_nothing_is_loaded(mock):
+    residency = manager(mock)
+    assert residency.prefer(["llama3.2:1b", "llama3"]) == "llama3.2:1b"
+    assert residency.prefer(["llama3.2:1b", "llama3"], default="llama3") == "llama3"
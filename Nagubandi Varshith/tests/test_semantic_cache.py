@@ -0,0 +1,64 @@
+from backend.semantic_cache import SemanticCache, hashing_embedder, query_mode
+
+QUESTION = "how do I reverse a list in python"
+OPTIONS = {"temperature": 0.7, "num_ctx": 8192}
+
+
+def cache(**kwargs):
+    return SemanticCache(hashing_embedder(), threshold=0.8, capacity=8, **kwargs)
+
+
+def test_near_duplicate_is_a_hit():
+    semantic = cache()
+    semantic.add(QUESTION, "llama3", "use reversed()", options=OPTIONS)
+    entry = semantic.lookup("How do I reverse a list in Python?", "llama3", options=OPTIONS)
+    assert entry["text"] == "use reversed()"
+    assert semantic.stats() == {"hits": 1, "misses": 0, "entries": 1}
+
+
+def test_unrelated_question_misses():
+    semantic = cache()
+    semantic.add(QUESTION, "llama3", "use reversed()", options=OPTIONS)
+    assert semantic.lookup("what is a mutex in operating systems", "llama3", options=OPTIONS) is None
+    assert semantic.stats()["misses"] == 1
+
+
+def test_no_cache_modes_are_skipped():
+    semantic = cache()
+    semantic.add(QUESTION, "llama3", "use reversed()", mode="code-fix", options=OPTIONS)
+    assert semantic.stats()["entries"] == 0
+    semantic.add(QUESTION, "llama3", "use reversed()", options=OPTIONS)
+    assert semantic.lookup(QUESTION, "llama3", mode="code-fix", options=OPTIONS) is None
+    assert semantic.lookup(QUESTION, "llama3", options=OPTIONS) is not None
+
+
+def test_entries_are_keyed_by_model_and_options():
+    semantic = cache()
+    semantic.add(QUESTION, "llama3", "use reversed()", options=OPTIONS)
+    assert semantic.lookup(QUESTION, "llama3", options={**OPTIONS, "temperature": 0.2}) is None
+    assert semantic.lookup(QUESTION, "codellama", options=OPTIONS) is None
+    assert semantic.lookup(QUESTION, "llama3", options=dict(reversed(OPTIONS.items()))) is not None
+
+
+def test_unavailable_embedder_skips_the_cache():
+    calls = []
+    semantic = cache(available=lambda: False)
+    semantic.embed = lambda text: calls.append(text)
+    semantic.add(QUESTION, "llama3", "use reversed()")
+    assert semantic.lookup(QUESTION, "llama3") is None
+    assert calls == []
+
+
+def test_hit_does_not_carry_another_chats_context():
+    semantic = cache()
+    final = {"done": True, "eval_count": 12, "context": [1, 2, 3]}
+    semantic.add(QUESTION, "llama3", "use reversed()", final=final)
+    entry = semantic.lookup(QUESTION, "llama3")
+    assert entry["final"] == {"done": True, "eval_count": 12}
+
+
+def test_code_and_fix_questions_opt_out():
+    assert query_mode(QUESTION) == "chat"
+    assert query_mode("fix this: for i in range(10) print(i)") == "code-fix"
+    assert query_mode("def f(x):\n    return x +") == "code-fix"
+    assert query_mode("```\nSELECT * FROM t\n```") == "code-fix"
@@ -0,0 +1,48 @@
+"""
+Per-request overhead of a fresh requests.post vs the pooled OllamaClient.
+
+Runs against tools.mock_ollama with no simulated latency and a one-token
+reply, so the numbers only show connection cost.
+Usage (from the app folder):  python -m tools.bench_client
+"""
+import time
+
+import requests
+
+from backend.client import OllamaClient
+from tools.mock_ollama import MockOllama
+
+
+def bench(label, call, n):
+    call()  # warm up
+    start = time.perf_counter()
+    for _ in range(n):
+        call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed / n * 1000:.3f} ms/request")
+
+
+def main(n=500):
+    mock = MockOllama(ttft=0, token_delay=0, jitter=0, tokens=1).start()
+    host = mock.url
+    payload = {"model": "llama3", "prompt": "hi", "stream": False}
+
+    client = OllamaClient(host=host)
+
+    bench(
+        "requests.post (fresh)",
+        lambda: requests.post(host + "/api/generate", json=payload, timeout=5).json(),
+        n
+    )
+    bench(
+        "OllamaClient (pooled)",
+        lambda: client.post("/api/generate", payload).json(),
+        n
+    )
+
+    client.close()
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Prompt compression benchmark: runs backend.compress over every Python
+file under a folder (default: the whole project) and over a few
+OCR-style samples, and reports the tokens saved and the time taken.
+The AST-identity check lives in tests/test_compress.py.
+
+Usage (from the app folder):  python -m tools.bench_compress [folder]
+"""
+import ast
+import glob
+import os
+import sys
+import time
+
+from backend.compress import compress
+from backend.prompt import estimate_tokens
+
+LICENSE_HEADER = """\
+# Copyright (c) 2024 Example Corp.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# See http://www.apache.org/licenses/LICENSE-2.0
+"""
+
+SAMPLES = {
+    "ocr text": (
+        "def  add(a, b):   \n"
+        "    return a + b\n"
+        "    return a + b\n\n\n\n\n"
+        "print(add(2,  3))      \n"
+        "Output:     5\n"
+    ),
+    "java": (
+        "/*\n * Copyright 2024 Example\n * Licensed under MIT\n * All rights reserved\n */\n"
+        "public class Main {   \n\n\n\n"
+        "    // Entry point\n"
+        "    public static void main(String[] args) {\n"
+        "        String blob = \"" + "A" * 500 + "\";\n"
+        "        System.out.println(\"hi\");\n"
+        "    }\n"
+        "}\n"
+    ),
+    "python": (
+        LICENSE_HEADER + LICENSE_HEADER
+        + "import os\n\n\n\n"
+        + "DATA = '" + "x" * 1000 + "'\n"
+        + "def  f(x ,  y):     \n"
+        + "    # " + "\n    # ".join(["explain"] * 8) + "\n"
+        + "    return   x+y   # sum\n"
+        + "S = '''keep   these\n\n\n\n   spaces   '''\n"
+    ),
+}
+
+
+def python_files(folder):
+    for path in glob.glob(os.path.join(folder, "**", "*.py"), recursive=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield path, f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+
+
+def main(folder=".."):
+    checked = 0
+    before = after = 0
+    seconds = 0.0
+
+    for path, source in python_files(folder):
+        try:
+            ast.parse(source)
+        except (SyntaxError, ValueError):
+            continue
+
+        start = time.perf_counter()
+        compressed, saved = compress(source, language="python", max_literal=None)
+        seconds += time.perf_counter() - start
+        checked += 1
+        before += estimate_tokens(source)
+        after += estimate_tokens(source) - saved
+
+    print(f"{checked} Python files")
+    if checked:
+        print(f"tokens {before} -> {after} ({(before - after) / before:.1%} saved), "
+              f"{seconds / checked * 1000:.2f} ms/file")
+    print()
+
+    for name, text in SAMPLES.items():
+        compressed, saved = compress(text)
+        print(f"{name:<10} {estimate_tokens(text):5d} -> {estimate_tokens(compressed):5d} tokens (saved {saved})")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,78 @@
+"""
+Chat history as a list of dicts vs backend.conversation.Conversation:
+memory held by a 10k-message history, cost of a turn (append + build
+the prompt), and a JSON round-trip check.
+
+Usage (from the app folder):  python -m tools.bench_memory [messages]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from backend.conversation import Conversation
+from backend.prompt import build_prompt
+
+WORDS = (
+    "def return list index value error loop print python function class "
+    "array string sort binary search node tree graph result test fix"
+).split()
+
+
+def make_history(n, seed=0):
+    rng = random.Random(seed)
+    history = []
+    for i in range(n):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = rng.randint(5, 40) if role == "user" else rng.randint(40, 300)
+        # json.loads gives every message its own role string, like a saved chat
+        history.append(json.loads(json.dumps({
+            "role": role,
+            "content": " ".join(rng.choice(WORDS) for _ in range(length)),
+        })))
+    return history
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def turn_cost(chat, turns=200):
+    """
+    Average ms to append a user message and build the full-history prompt.
+    """
+    start = time.perf_counter()
+    for i in range(turns):
+        chat.append({"role": "user", "content": f"question {i} about binary search"})
+        build_prompt(chat)
+    return (time.perf_counter() - start) / turns * 1000
+
+
+def main(n=10_000):
+    raw = json.dumps(make_history(n))
+
+    dicts, dict_bytes = measure(lambda: json.loads(raw))
+    conversation, conv_bytes = measure(lambda: Conversation.from_json(json.loads(raw)))
+    content_bytes = sum(len(m["content"]) + 49 for m in dicts)
+
+    assert conversation.to_json() == dicts
+    assert json.dumps(conversation.to_json()) == raw
+
+    print(f"{n} messages, {content_bytes / 1e6:.2f} MB of content strings")
+    print(f"list of dicts  {dict_bytes / 1e6:8.2f} MB   {(dict_bytes - content_bytes) / n:6.0f} B/message overhead")
+    print(f"Conversation   {conv_bytes / 1e6:8.2f} MB   {(conv_bytes - content_bytes) / n:6.0f} B/message overhead")
+    print("JSON round-trip lossless")
+    print()
+    print(f"turn (append + build_prompt), list of dicts  {turn_cost(dicts):7.3f} ms")
+    print(f"turn (append + build_prompt), Conversation   {turn_cost(conversation):7.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
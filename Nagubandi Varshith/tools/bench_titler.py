@@ -0,0 +1,98 @@
+"""
+Local extractive titler vs the LLM title call: latency and quality on a
+small labeled set of first messages.
+
+Quality is word overlap (F1) with the reference title. The LLM column
+needs a running Ollama and is skipped with --no-llm.
+Usage (from the app folder):  python -m tools.bench_titler [--no-llm]
+"""
+import re
+import sys
+import time
+
+import requests
+
+from backend.llm import generate_title
+from backend.titler import CONFIDENCE_THRESHOLD, local_title
+
+# (first message, reference title)
+LABELED = [
+    ("python code for armstrong number check", "Python Armstrong Number Check"),
+    ("how does binary search work", "Binary Search"),
+    ("write a java program to reverse a linked list", "Java Reverse Linked List"),
+    ("explain recursion with factorial example", "Recursion Factorial"),
+    ("Why do I get ZeroDivisionError in my average function?", "ZeroDivisionError Average"),
+    ("def fibonacci(n):\n    return fib(n-1) + fib(n-2)\nwhy is this slow", "Fibonacci Slow"),
+    ("difference between list and tuple in python", "Python List Tuple Difference"),
+    ("sql query to find second highest salary", "SQL Second Highest Salary"),
+    ("how to center a div in css", "CSS Center Div"),
+    ("implement bubble sort in c++", "C++ Bubble Sort"),
+    ("what is a REST API", "REST API"),
+    ("fix IndexError: list index out of range", "IndexError List Index Range"),
+    ("javascript promise vs async await", "JavaScript Promise Async Await"),
+    ("check if a string is a palindrome", "String Palindrome Check"),
+    ("merge two sorted arrays in java", "Java Merge Sorted Arrays"),
+    ("explain the getUserProfile function", "User Profile"),
+    ("detect cycle in a graph using dfs", "Detect Cycle Graph DFS"),
+    ("read a csv file with pandas", "Read CSV Pandas"),
+    ("hii", ""),
+    ("help me", ""),
+]
+
+
+def words(title):
+    return set(re.findall(r"[a-z0-9+#]+", title.lower()))
+
+
+def f1(predicted, reference):
+    p, r = words(predicted), words(reference)
+    if not p and not r:
+        return 1.0
+    if not p or not r:
+        return 0.0
+    overlap = len(p & r)
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / len(p), overlap / len(r)
+    return 2 * precision * recall / (precision + recall)
+
+
+def main(use_llm=True, repeat=2000):
+    local_scores, llm_scores, fallbacks = [], [], 0
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, _ in LABELED:
+            local_title(message)
+    local_us = (time.perf_counter() - start) / (repeat * len(LABELED)) * 1e6
+
+    llm_ms = []
+    for message, reference in LABELED:
+        title, confidence = local_title(message)
+        confident = confidence >= CONFIDENCE_THRESHOLD
+        fallbacks += not confident
+        local_scores.append(f1(title if confident else "", reference))
+
+        llm = ""
+        if use_llm:
+            t = time.perf_counter()
+            try:
+                llm = generate_title(message)
+            except requests.RequestException:
+                use_llm = False
+            llm_ms.append((time.perf_counter() - t) * 1000)
+        llm_scores.append(f1(llm, reference))
+
+        print(f"{confidence:4.2f} {title!r:<38} ref={reference!r}" + (f"  llm={llm!r}" if llm else ""))
+
+    print()
+    print(f"local titler   {local_us:8.1f} us/title   F1 {sum(local_scores) / len(local_scores):.2f}")
+    print(f"LLM fallbacks  {fallbacks}/{len(LABELED)} below confidence {CONFIDENCE_THRESHOLD}")
+    if llm_ms:
+        print(f"generate_title {sum(llm_ms) / len(llm_ms):8.1f} ms/title   F1 {sum(llm_scores) / len(llm_scores):.2f}")
+    else:
+        print("generate_title skipped (no Ollama)")
+
+
+if __name__ == "__main__":
+    main(use_llm="--no-llm" not in sys.argv)
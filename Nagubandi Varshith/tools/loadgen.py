@@ -0,0 +1,314 @@
+"""
+Concurrent chat sessions against one deployment: how many simultaneous
+users it holds before TTFT, latency or errors fall over.
+
+Each simulated session replays the user turns of a chat sampled from
+chats/*.json, one turn after another (with optional think time), through
+the same client code the apps use:
+
+    backend   backend.llm.generate_response, like app.py (rolling
+              Ollama context, session affinity)
+    frontend  send_to_backend from Deepesh V/FrontEnd.py (needs
+              streamlit importable)
+
+Concurrency ramps through --levels; each level runs for --duration
+seconds and reports throughput, TTFT and latency percentiles, and the
+error rate. Without --host an in-process tools.mock_ollama is started.
+
+Sessions replaying the same chat would send identical prompts, which the
+apps merge into one upstream request (backend.coalesce); each turn is
+tagged with its session so every user costs a generation. Pass
+--shared-prompts to measure with that merging.
+
+Usage (from the app folder):
+    python -m tools.loadgen --levels 1,4,16,32 --duration 20
+    python -m tools.loadgen --host http://gpu1:11434 --target frontend
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.metrics import quantile
+
+FRONTEND_PATH = os.path.join("..", "Deepesh V", "FrontEnd.py")
+FRONTEND_ERRORS = ("[Error connecting to Ollama", "[Ollama API error")
+
+
+def load_sessions(pattern):
+    """
+    The user turns of every chat file matching `pattern` (chats with no
+    user message are skipped).
+    """
+    sessions = []
+    for path in sorted(glob.glob(pattern)):
+        if path.endswith(".meta.json") or os.path.basename(path) == "index.json":
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        except (OSError, ValueError):
+            continue
+        turns = [
+            m["content"] for m in messages
+            if isinstance(m, dict) and m.get("role") == "user" and m.get("content")
+        ]
+        if turns:
+            sessions.append(turns)
+    return sessions
+
+
+class BackendTarget:
+    """
+    One chat session through backend.llm, the way app.py drives it.
+    """
+
+    name = "backend"
+
+    def __init__(self, host, model, use_cache):
+        from backend.pool import OllamaPool
+
+        self.client = OllamaPool([host])
+        self.model = model
+        self.use_cache = use_cache
+
+    def session(self, session_id):
+        from backend.conversation import Conversation
+        from backend.llm import generate_response
+        from backend.prompt import build_prompt, build_turn_prompt
+
+        chat = Conversation()
+        state = {"context": None}
+
+        def ask(text):
+            chat.append({"role": "user", "content": text})
+            if state["context"]:
+                prompt = build_turn_prompt(chat[-1])
+            else:
+                prompt = build_prompt(chat)
+
+            final = {}
+            stream = generate_response(
+                prompt,
+                model=self.model,
+                stream=True,
+                client=self.client,
+                context=state["context"],
+                on_done=final.update,
+                use_cache=self.use_cache,
+                session_id=session_id,
+                profile="chat"
+            )
+            parts = []
+            for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+            if not final:
+                raise RuntimeError("stream ended without a final frame")
+            state["context"] = final.get("context")
+            chat.append({"role": "assistant", "content": "".join(parts)})
+
+        return ask
+
+
+class FrontendTarget:
+    """
+    One chat session through FrontEnd.send_to_backend.
+    """
+
+    name = "frontend"
+
+    def __init__(self, host, model, path):
+        # FrontEnd reads its hosts at import time
+        os.environ["OLLAMA_HOST"] = host
+        os.environ["OLLAMA_HOSTS"] = host
+        spec = importlib.util.spec_from_file_location("frontend_app", path)
+        self.app = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.app)
+        self.model = model
+
+    def session(self, session_id):
+        messages = []
+
+        def ask(text):
+            messages.append({"role": "user", "content": text})
+            parts = []
+            for chunk in self.app.send_to_backend(
+                list(messages),
+                mode="Chat",
+                system_prompt="You are a helpful coding assistant.",
+                model=self.model,
+                chat_id=session_id,
+            ):
+                # FrontEnd reports failures as text, also after a partial answer
+                if chunk.startswith(FRONTEND_ERRORS):
+                    raise RuntimeError(chunk.strip()[:120])
+                parts.append(chunk)
+                yield chunk
+            messages.append({"role": "assistant", "content": "".join(parts)})
+
+        return ask
+
+
+def run_level(target, sessions, users, duration, think, seed, shared_prompts=False):
+    """
+    `users` sessions in parallel for `duration` seconds. Returns one
+    record per request: (ttft, latency, chunks, error or None).
+    """
+    records = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            session_id = f"load-{users}-{index}-{rng.random():.6f}"
+            ask = target.session(session_id)
+            for text in rng.choice(sessions):
+                if not shared_prompts:
+                    text = f"[{session_id}] {text}"
+                if time.monotonic() >= deadline:
+                    return
+                started = time.perf_counter()
+                first = None
+                chunks = 0
+                error = None
+                try:
+                    for chunk in ask(text):
+                        if first is None and chunk:
+                            first = time.perf_counter()
+                        chunks += 1
+                except Exception as exc:
+                    error = type(exc).__name__
+                ended = time.perf_counter()
+                with lock:
+                    records.append((
+                        first - started if first else None,
+                        ended - started,
+                        chunks,
+                        error
+                    ))
+                if error:
+                    # A broken session starts over with a new chat
+                    break
+                if think:
+                    time.sleep(rng.expovariate(1 / think))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="loadgen") as pool:
+        list(pool.map(user, range(users)))
+    return records, time.monotonic() - started
+
+
+def summarize(users, records, elapsed):
+    ok = [r for r in records if r[3] is None]
+    ttft = sorted(r[0] * 1000 for r in ok if r[0] is not None)
+    latency = sorted(r[1] * 1000 for r in ok)
+    errors = {}
+    for r in records:
+        if r[3]:
+            errors[r[3]] = errors.get(r[3], 0) + 1
+    return {
+        "users": users,
+        "requests": len(records),
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "chunks_per_s": sum(r[2] for r in ok) / elapsed if elapsed else 0.0,
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "errors": errors,
+        "ttft_ms": {f"p{p}": quantile(ttft, p / 100) for p in (50, 95, 99)},
+        "latency_ms": {f"p{p}": quantile(latency, p / 100) for p in (50, 95, 99)},
+    }
+
+
+def print_row(row):
+    def ms(values):
+        return " ".join(
+            f"{v:7.0f}" if v is not None else "      -" for v in values.values()
+        )
+
+    print(
+        f"{row['users']:5d} {row['requests']:6d} {row['throughput_rps']:7.2f} "
+        f"{row['chunks_per_s']:8.1f}  {ms(row['ttft_ms'])}  {ms(row['latency_ms'])} "
+        f"{row['error_rate']:6.1%}"
+        + (f"  {row['errors']}" if row["errors"] else "")
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent chat session load test")
+    parser.add_argument("--target", choices=["backend", "frontend"], default="backend")
+    parser.add_argument("--host", help="Ollama URL (default: start a mock)")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="concurrent sessions per step")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between turns")
+    parser.add_argument("--chats", default=os.path.join("chats", "*.json"))
+    parser.add_argument("--frontend", default=FRONTEND_PATH, help="path to FrontEnd.py")
+    parser.add_argument("--cache", action="store_true", help="allow response cache hits (backend)")
+    parser.add_argument("--shared-prompts", action="store_true",
+                        help="replay turns verbatim, so concurrent sessions can share a generation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the per-level results here")
+    # Mock settings (ignored with --host)
+    parser.add_argument("--mock-ttft", type=float, default=0.15)
+    parser.add_argument("--mock-token-delay", type=float, default=0.02)
+    parser.add_argument("--mock-tokens", type=int, default=64)
+    parser.add_argument("--mock-parallel", type=int, default=4)
+    parser.add_argument("--mock-fail-rate", type=float, default=0.0)
+    parser.add_argument("--mock-drop-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.chats)
+    if not sessions:
+        print(f"No chats with user messages match {args.chats}")
+        return 1
+
+    mock = None
+    host = args.host
+    if host is None:
+        from tools.mock_ollama import MockOllama
+
+        mock = MockOllama(
+            ttft=args.mock_ttft, token_delay=args.mock_token_delay,
+            tokens=args.mock_tokens, parallel=args.mock_parallel,
+            fail_rate=args.mock_fail_rate, drop_rate=args.mock_drop_rate,
+            seed=args.seed,
+        ).start()
+        host = mock.url
+
+    if args.target == "backend":
+        target = BackendTarget(host, args.model, args.cache)
+    else:
+        target = FrontendTarget(host, args.model, args.frontend)
+
+    print(f"{target.name} -> {host} · {len(sessions)} chats · {args.duration:.0f}s per level")
+    print("users   reqs   req/s  chunks/s  TTFT ms p50/p95/p99      latency ms p50/p95/p99   errors")
+
+    results = []
+    try:
+        for users in [int(n) for n in args.levels.split(",") if n.strip()]:
+            records, elapsed = run_level(
+                target, sessions, users, args.duration, args.think, args.seed,
+                args.shared_prompts
+            )
+            row = summarize(users, records, elapsed)
+            results.append(row)
+            print_row(row)
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,528 @@
+"""
+Stand-in for an Ollama server, for benchmarks and load tests without a
+model. Serves /api/generate and /api/chat (NDJSON streams or single
+JSON replies, with Ollama's final-frame stats), /api/tags, /api/ps,
+/api/embeddings, /api/embed and /api/version.
+
+Timing is simulated: a cold model load, time to first token (plus
+prefill time per prompt token), a delay per output token, all with
+jitter, and at most `parallel` generations at once (the rest queue, as
+with OLLAMA_NUM_PARALLEL). Failures can be injected: HTTP 500s before
+the stream starts and connections dropped mid-stream.
+
+Replies are deterministic per (model, prompt), so response caches can be
+tested against it. Embeddings are hashed bags of words, so similar
+texts get similar vectors.
+
+In code:
+    with MockOllama(ttft=0.2, token_delay=0.02) as mock:
+        client = OllamaClient(host=mock.url)
+
+From the command line (then point OLLAMA_HOST / OLLAMA_HOSTS at it):
+    python -m tools.mock_ollama --port 11434 --ttft 0.2 --token-delay 0.02
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = [
+    "llama3", "llama3.2:1b", "deepseek-coder:6.7b", "deepseek-r1",
+    "deepseek-ocr:3b", "gpt-oss-120b", "nomic-embed-text", "llava",
+    "codellama:7b",
+]
+
+# Output vocabulary; a token is " word"
+WORDS = (
+    "the a to of and in is for that it with as on this function value "
+    "list return loop index error code python java string number call "
+    "variable class method object array key file line input output "
+    "because so then if else when use can should will first next"
+).split()
+
+EMBEDDING_DIM = 768
+_WORD = re.compile(r"\w+")
+
+
+def parse_keep_alive(value, default=300.0):
+    """
+    Ollama keep_alive ("5m", "30s", "1h", seconds, negative = forever)
+    as seconds, or None for forever.
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value))
+        if not match:
+            return default
+        seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return None if seconds < 0 else seconds
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+
+def embed(text, dim=EMBEDDING_DIM):
+    """
+    Unit vector of hashed word counts.
+    """
+    vector = [0.0] * dim
+    for word in _WORD.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class _Dropped(Exception):
+    """The mock cut the connection on purpose."""
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up (cancelled streams, closed pools) are normal
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class MockOllama:
+    """
+    A mock Ollama on a background thread. Times are in seconds; jitter
+    is a fraction (0.2 = +-20%) applied to every delay.
+
+    models: names served (a missing ":latest" tag is accepted); other
+    names get Ollama's 404. None serves any name.
+    tokens: reply length, capped by options.num_predict.
+    prefill_rate: prompt tokens per second added to TTFT (None = free).
+    load_time: delay when a model is not loaded; models stay loaded for
+    their keep_alive.
+    fail_rate / drop_rate: chance a request gets a 500, or has its
+    connection closed partway through the stream.
+    responder: optional fn(model, prompt) -> reply text.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, models=DEFAULT_MODELS,
+                 ttft=0.15, token_delay=0.02, jitter=0.1, tokens=64,
+                 prefill_rate=None, load_time=0.0, parallel=4, max_queue=512,
+                 fail_rate=0.0, drop_rate=0.0, seed=None, responder=None):
+        self.models = list(models) if models is not None else None
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.tokens = tokens
+        self.prefill_rate = prefill_rate
+        self.load_time = load_time
+        self.max_queue = max_queue
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.responder = responder
+
+        self._random = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._stats = {
+            "requests": 0, "in_flight": 0, "queued": 0, "completed": 0,
+            "cancelled": 0, "failed": 0, "dropped": 0, "rejected": 0,
+            "eval_tokens": 0,
+        }
+
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._server.serve_forever, daemon=True, name="mock-ollama"
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    # ---------------- simulation ----------------
+
+    def _chance(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _delay(self, seconds):
+        if seconds <= 0:
+            return 0.0
+        if self.jitter:
+            with self._lock:
+                seconds *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, seconds))
+        return seconds
+
+    def _known(self, model):
+        if self.models is None:
+            return True
+        return model in self.models or model.split(":")[0] in self.models \
+            or f"{model}:latest" in self.models
+
+    def _load(self, model, keep_alive):
+        """
+        Make `model` resident (sleeping load_time if it was not) and
+        refresh its expiry. Returns the load time in seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expiry = self._loaded.get(model, 0)
+            cold = expiry is not None and expiry <= now
+        loaded = self._delay(self.load_time) if cold else 0.0
+        keep = parse_keep_alive(keep_alive)
+        with self._lock:
+            self._loaded[model] = None if keep is None else time.monotonic() + keep
+        return loaded
+
+    def _unload(self, model):
+        with self._lock:
+            self._loaded.pop(model, None)
+
+    def resident(self):
+        now = time.monotonic()
+        with self._lock:
+            return sorted(
+                model for model, expiry in self._loaded.items()
+                if expiry is None or expiry > now
+            )
+
+    def reply_tokens(self, model, prompt, limit):
+        if self.responder is not None:
+            text = self.responder(model, prompt)
+            tokens = re.findall(r"\s*\S+", text) or [text]
+        else:
+            seed = hashlib.sha1(f"{model}\0{prompt}".encode("utf-8")).digest()
+            rng = random.Random(seed)
+            tokens = [" " + rng.choice(WORDS) for _ in range(self.tokens)]
+            tokens[0] = tokens[0].lstrip().capitalize()
+            tokens[-1] += "."
+        if limit is not None and limit >= 0:
+            tokens = tokens[:limit]
+        return tokens
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _text(self, status, text):
+                data = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def do_HEAD(self):
+                self._text(200, "Ollama is running")
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/":
+                    self._text(200, "Ollama is running")
+                elif path == "/api/version":
+                    self._json(200, {"version": "0.0.0-mock"})
+                elif path == "/api/tags":
+                    self._json(200, {"models": [
+                        mock._model_entry(name) for name in (mock.models or mock.resident())
+                    ]})
+                elif path == "/api/ps":
+                    self._json(200, {"models": [
+                        mock._model_entry(name, running=True) for name in mock.resident()
+                    ]})
+                else:
+                    self._text(404, "404 page not found")
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except (ValueError, OSError):
+                    self._json(400, {"error": "invalid request body"})
+                    return
+
+                model = payload.get("model", "")
+                if path in ("/api/generate", "/api/chat", "/api/embeddings", "/api/embed"):
+                    if not model:
+                        self._json(400, {"error": "model is required"})
+                        return
+                    if not mock._known(model):
+                        self._json(404, {"error": f'model "{model}" not found, try pulling it first'})
+                        return
+
+                if path in ("/api/generate", "/api/chat"):
+                    mock._count("requests")
+                    self._generate(path == "/api/chat", payload)
+                elif path == "/api/embeddings":
+                    mock._load(model, payload.get("keep_alive"))
+                    self._json(200, {"embedding": embed(payload.get("prompt", ""))})
+                elif path == "/api/embed":
+                    inputs = payload.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+                    loaded = mock._load(model, payload.get("keep_alive"))
+                    self._json(200, {
+                        "model": model,
+                        "embeddings": [embed(text) for text in inputs],
+                        "load_duration": int(loaded * 1e9),
+                        "prompt_eval_count": sum(estimate_tokens(t) for t in inputs),
+                    })
+                else:
+                    self._text(404, "404 page not found")
+
+            def _generate(self, chat, payload):
+                model = payload["model"]
+                started = time.monotonic()
+                stream = payload.get("stream", True)
+
+                if chat:
+                    messages = payload.get("messages") or []
+                    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+                else:
+                    prompt = payload.get("prompt") or ""
+
+                # Load / unload requests carry no prompt
+                if not prompt and (not chat or not payload.get("messages")):
+                    if parse_keep_alive(payload.get("keep_alive")) == 0:
+                        mock._unload(model)
+                        reason = "unload"
+                    else:
+                        mock._load(model, payload.get("keep_alive"))
+                        reason = "load"
+                    frame = {"model": model, "created_at": _now(), "done": True, "done_reason": reason}
+                    frame.update({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})
+                    self._json(200, frame)
+                    return
+
+                if mock._chance(mock.fail_rate):
+                    mock._count("failed")
+                    self._json(500, {"error": "mock failure"})
+                    return
+
+                with mock._lock:
+                    if mock._stats["queued"] >= mock.max_queue:
+                        mock._stats["rejected"] += 1
+                        rejected = True
+                    else:
+                        mock._stats["queued"] += 1
+                        rejected = False
+                if rejected:
+                    self._json(503, {"error": "server busy, please try again.  maximum pending requests exceeded"})
+                    return
+
+                mock._slots.acquire()
+                mock._count("queued", -1)
+                mock._count("in_flight")
+                try:
+                    self._run(chat, payload, model, prompt, stream, started)
+                finally:
+                    mock._count("in_flight", -1)
+                    mock._slots.release()
+
+            def _run(self, chat, payload, model, prompt, stream, started):
+                options = payload.get("options") or {}
+                limit = options.get("num_predict")
+                tokens = mock.reply_tokens(model, prompt, limit)
+                prompt_tokens = estimate_tokens(prompt)
+                drop_at = None
+                if mock._chance(mock.drop_rate):
+                    with mock._lock:
+                        drop_at = mock._random.randint(0, max(0, len(tokens) - 1))
+
+                load = mock._load(model, payload.get("keep_alive"))
+                prefill_started = time.monotonic()
+                first = mock.ttft
+                if mock.prefill_rate:
+                    first += prompt_tokens / mock.prefill_rate
+                mock._delay(first)
+                eval_started = time.monotonic()
+
+                def frame(text, done=False):
+                    body = {"model": model, "created_at": _now()}
+                    if chat:
+                        body["message"] = {"role": "assistant", "content": text}
+                    else:
+                        body["response"] = text
+                    body["done"] = done
+                    return body
+
+                def final(text):
+                    ended = time.monotonic()
+                    body = frame(text, done=True)
+                    body["done_reason"] = "length" if limit is not None and len(tokens) >= limit else "stop"
+                    if not chat:
+                        context = list(payload.get("context") or [])
+                        body["context"] = context + list(range(1, prompt_tokens + len(tokens) + 1))
+                    body.update({
+                        "total_duration": int((ended - started) * 1e9),
+                        "load_duration": int(load * 1e9),
+                        "prompt_eval_count": prompt_tokens,
+                        "prompt_eval_duration": int((eval_started - prefill_started) * 1e9),
+                        "eval_count": len(tokens),
+                        "eval_duration": int((ended - eval_started) * 1e9),
+                    })
+                    return body
+
+                try:
+                    if not stream:
+                        for i in range(len(tokens)):
+                            if i:
+                                mock._delay(mock.token_delay)
+                            if i == drop_at:
+                                raise _Dropped()
+                        self._json(200, final("".join(tokens)))
+                    else:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.end_headers()
+                        for i, token in enumerate(tokens):
+                            if i:
+                                mock._delay(mock.token_delay)
+                            if i == drop_at:
+                                raise _Dropped()
+                            self._chunk(frame(token))
+                        self._chunk(final(""))
+                        self.wfile.write(b"0\r\n\r\n")
+                        self.wfile.flush()
+                except _Dropped:
+                    mock._count("dropped")
+                    self.close_connection = True
+                    try:
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    return
+                except (BrokenPipeError, ConnectionResetError):
+                    mock._count("cancelled")
+                    self.close_connection = True
+                    return
+
+                mock._count("completed")
+                mock._count("eval_tokens", len(tokens))
+
+            def _chunk(self, body):
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+    def _model_entry(self, name, running=False):
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+        full = name if ":" in name else f"{name}:latest"
+        entry = {
+            "name": full,
+            "model": full,
+            "modified_at": "2024-01-01T00:00:00Z",
+            "size": 4_000_000_000,
+            "digest": digest,
+            "details": {"format": "gguf", "family": name.split(":")[0],
+                        "parameter_size": "mock", "quantization_level": "Q4_0"},
+        }
+        if running:
+            with self._lock:
+                expiry = self._loaded.get(name)
+            remaining = 10 ** 8 if expiry is None else max(0.0, expiry - time.monotonic())
+            entry["expires_at"] = datetime.fromtimestamp(
+                time.time() + remaining, timezone.utc
+            ).isoformat().replace("+00:00", "Z")
+            entry["size_vram"] = entry["size"]
+        return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.15, help="seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+- fraction on every delay")
+    parser.add_argument("--tokens", type=int, default=64, help="reply length in tokens")
+    parser.add_argument("--prefill-rate", type=float, default=None, help="prompt tokens/s added to TTFT")
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a cold model")
+    parser.add_argument("--parallel", type=int, default=4, help="generations at once")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of streams cut partway")
+    parser.add_argument("--any-model", action="store_true", help="serve any model name")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    mock = MockOllama(
+        host=args.host, port=args.port,
+        models=None if args.any_model else DEFAULT_MODELS,
+        ttft=args.ttft, token_delay=args.token_delay, jitter=args.jitter,
+        tokens=args.tokens, prefill_rate=args.prefill_rate, load_time=args.load_time,
+        parallel=args.parallel, fail_rate=args.fail_rate, drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+    print(f"Mock Ollama on {mock.url} (Ctrl+C to stop)")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(mock.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,19 @@ from ollama import Client
 import numpy as np
 from PIL import Image, ImageOps, ImageEnhance, ImageFilter
 import io
+import os
 import easyocr
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------------- Models ----------------
 VISION_MODEL = "llava"
 TEXT_MODEL = "llama3"
+# Titles are one short line: cap the length and stop at the first newline.
+# num_ctx is left at the default the chat calls use, so the model isn't reloaded.
+TITLE_OPTIONS = {"num_predict": 16, "temperature": 0.2, "stop": ["\n"]}
 
-ollama_client = Client(host='http://localhost:11434')
+# Point at another Ollama (or tools/mock_ollama.py) with OLLAMA_HOST
+ollama_client = Client(host=os.environ.get('OLLAMA_HOST', 'http://localhost:11434'))
 
 @st.cache_resource
 def load_ocr():
@@ -17,12 +23,18 @@ def load_ocr():
 
 ocr_reader = load_ocr()
 
+@st.cache_resource
+def load_title_executor():
+    # One low-priority worker for chat titles, shared by every session
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="titles")
+
 def generate_chat_title(user_msg):
     try:
         prompt = f"Give a short title (3 words) based on this message: '{user_msg}'. Do NOT add quotes."
         response = ollama_client.chat(
             model=TEXT_MODEL,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            options=TITLE_OPTIONS
         )
         return response["message"]["content"].strip()
     except:
@@ -121,6 +133,20 @@ if "show_uploader" not in st.session_state:
     st.session_state.show_uploader = False
 if "pending_image" not in st.session_state:
     st.session_state.pending_image = None
+if "pending_titles" not in st.session_state:
+    st.session_state.pending_titles = {}
+
+# ---------------- Apply finished titles ----------------
+# Titles are generated in the background; rename chats whose title is ready
+for chat_name, future in list(st.session_state.pending_titles.items()):
+    if not future.done():
+        continue
+    del st.session_state.pending_titles[chat_name]
+    new_title = future.result()
+    if chat_name in st.session_state.chat_history and new_title not in st.session_state.chat_history:
+        st.session_state.chat_history[new_title] = st.session_state.chat_history.pop(chat_name)
+        if st.session_state.current_chat == chat_name:
+            st.session_state.current_chat = new_title
 
 # ---------------- Sidebar (Updated) ----------------
 with st.sidebar:
@@ -209,12 +235,14 @@ if user_msg:
         payload["content"] = ocr_prompt
         model = TEXT_MODEL 
 
-    if st.session_state.current_chat.startswith("Chat"):
-        new_title = generate_chat_title(user_msg)
-        st.session_state.chat_history[new_title] = st.session_state.chat_history.pop(
-            st.session_state.current_chat
+    if (
+        st.session_state.current_chat.startswith("Chat")
+        and st.session_state.current_chat not in st.session_state.pending_titles
+    ):
+        # Name the chat off the critical path; the sidebar picks it up on the next rerun
+        st.session_state.pending_titles[st.session_state.current_chat] = (
+            load_title_executor().submit(generate_chat_title, user_msg)
         )
-        st.session_state.current_chat = new_title
 
     with st.chat_message("assistant"):
         try:
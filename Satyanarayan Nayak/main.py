@@ -1,7 +1,9 @@
 import streamlit as st
+import math
+import re
 import uuid
+from collections import Counter
 import ollama
-import re
 from PIL import Image
 import pytesseract
 from pdf2image import convert_from_bytes
@@ -50,6 +52,132 @@ def extract_text_from_file(uploaded_file):
 
     return ""
 
+# ---------------- FILE CONTEXT RETRIEVAL ----------------
+# Uploaded text is split into overlapping chunks and indexed with BM25;
+# each question gets only the best chunks that fit the budget instead
+# of the whole file.
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 30
+CONTEXT_TOP_K = 4
+CONTEXT_BUDGET_TOKENS = 1200
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def chunk_text(text):
+    """
+    Split text into chunks of about CHUNK_WORDS words, on line
+    boundaries so code lines stay whole, each starting CHUNK_OVERLAP
+    words before the previous one ended.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    chunks, start = [], 0
+    while start < len(lines):
+        end, words = start, 0
+        while end < len(lines) and (words < CHUNK_WORDS or end == start):
+            words += len(lines[end].split())
+            end += 1
+        chunks.append("\n".join(lines[start:end]))
+        if end >= len(lines):
+            break
+        # Step back over the last lines for the overlap
+        back, overlap = end, 0
+        while back > start + 1 and overlap < CHUNK_OVERLAP:
+            back -= 1
+            overlap += len(lines[back].split())
+        start = back
+    return chunks
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one uploaded file.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = sum(self.lengths) / len(chunks) if chunks else 0
+        doc_freq = Counter()
+        for counts in self.term_counts:
+            doc_freq.update(counts.keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def search(self, query, k=CONTEXT_TOP_K):
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for i, counts in enumerate(self.term_counts):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [i for _, i in scores[:k]]
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def load_context_index(file_name, text):
+    """
+    Built once per uploaded file and shared by every chat and rerun.
+    """
+    return BM25Index(chunk_text(text))
+
+
+def retrieve_context(index, query, budget=CONTEXT_BUDGET_TOKENS):
+    """
+    Best matching chunks for `query`, in file order, within `budget`
+    tokens. A file that fits the budget is used whole; a question that
+    matches no chunk ("summarize this", "what is wrong here?") gets the
+    start of the file.
+    """
+    if sum(estimate_tokens(chunk) for chunk in index.chunks) <= budget:
+        return "\n...\n".join(index.chunks)
+
+    hits = index.search(query)
+    if not hits:
+        return leading_context(index, budget)
+
+    picked, used = [], 0
+    for i in hits:
+        tokens = estimate_tokens(index.chunks[i])
+        if picked and used + tokens > budget:
+            continue
+        picked.append(i)
+        used += tokens
+    return "\n...\n".join(index.chunks[i] for i in sorted(picked))
+
+
+def leading_context(index, budget=CONTEXT_BUDGET_TOKENS):
+    """
+    The file's first chunks, up to `budget` tokens (always at least one).
+    """
+    picked, used = [], 0
+    for chunk in index.chunks:
+        tokens = estimate_tokens(chunk)
+        if picked and used + tokens > budget:
+            break
+        picked.append(chunk)
+        used += tokens
+    return "\n...\n".join(picked)
+
 # ---------------- SESSION STATE ----------------
 if "username" not in st.session_state:
     st.session_state.username = None
@@ -117,26 +245,102 @@ st.subheader(f"What’s on the agenda today, {st.session_state.username}?")
 chat_container = st.container()
 
 # ---------------- MESSAGE RENDERING ----------------
-code_block_pattern = re.compile(r"```(\w+)?\n(.*?)```", re.DOTALL)
+class SegmentParser:
+    """
+    Splits a reply into text and ``` code segments as it streams in.
+    Closed segments are handed out once; only the trailing open segment
+    is re-examined when more text arrives. An unterminated fence is
+    reported as an open code segment.
+    """
+
+    def __init__(self):
+        self.in_code = False
+        self.lang = None
+        self.pending = ""
+        self._scan = 0
+        self._fence_wait = False
+
+    def feed(self, chunk):
+        self.pending += chunk
+        closed = []
+        while True:
+            fence = self.pending.find("```", self._scan)
+            if fence < 0:
+                # A fence may be split across chunks: rescan the last two chars
+                self._scan = max(len(self.pending) - 2, 0)
+                self._fence_wait = False
+                return closed
+
+            if self.in_code:
+                closed.append(("code", self.pending[:fence], self.lang))
+                self.pending = self.pending[fence + 3:]
+                self.in_code = False
+            else:
+                newline = self.pending.find("\n", fence + 3)
+                if newline < 0:
+                    # Opening fence seen, language line not finished yet
+                    self._scan = fence
+                    self._fence_wait = True
+                    return closed
+                closed.append(("text", self.pending[:fence], None))
+                self.lang = self.pending[fence + 3:newline].strip() or None
+                self.pending = self.pending[newline + 1:]
+                self.in_code = True
+            self._scan = 0
+
+    def open_segment(self):
+        if self.in_code:
+            return ("code", self.pending, self.lang)
+        if self._fence_wait:
+            return ("text", self.pending[:self._scan], None)
+        return ("text", self.pending, None)
+
+    def close(self):
+        if self.in_code:
+            return [("code", self.pending, self.lang)]
+        return [("text", self.pending, None)]
+
+
+def render_segment(target, segment):
+    kind, body, lang = segment
+    if kind == "code":
+        target.code(body, language=lang)
+        return
+    text = body.strip()
+    if text:
+        target.markdown(
+            f'<div class="chat-bot"><div class="chat-bubble bot-bubble">{text}</div></div>',
+            unsafe_allow_html=True
+        )
+
 
 def render_assistant_message(content):
-    last_end = 0
-    for match in code_block_pattern.finditer(content):
-        text = content[last_end:match.start()].strip()
-        if text:
-            st.markdown(
-                f'<div class="chat-bot"><div class="chat-bubble bot-bubble">{text}</div></div>',
-                unsafe_allow_html=True
-            )
-        st.code(match.group(2), language=match.group(1))
-        last_end = match.end()
+    parser = SegmentParser()
+    for segment in parser.feed(content) + parser.close():
+        render_segment(st, segment)
+
+
+class StreamingMessage:
+    """
+    Live view of a streaming reply: every closed segment keeps its own
+    frozen element, and only the open tail is redrawn per chunk.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.parser = SegmentParser()
+        self.tail = container.empty()
+
+    def feed(self, chunk):
+        for segment in self.parser.feed(chunk):
+            render_segment(self.tail, segment)
+            self.tail = self.container.empty()
+        render_segment(self.tail, self.parser.open_segment())
+
+    def close(self):
+        for segment in self.parser.close():
+            render_segment(self.tail, segment)
 
-    tail = content[last_end:].strip()
-    if tail:
-        st.markdown(
-            f'<div class="chat-bot"><div class="chat-bubble bot-bubble">{tail}</div></div>',
-            unsafe_allow_html=True
-        )
 
 # ---------------- CHAT HISTORY ----------------
 with chat_container:
@@ -162,6 +366,7 @@ if uploaded_file and current_chat.get("file_name") != uploaded_file.name:
     with st.status("Reading file..."):
         current_chat["ocr_text"] = extract_text_from_file(uploaded_file)
         current_chat["file_name"] = uploaded_file.name
+        load_context_index(current_chat["file_name"], current_chat["ocr_text"])
     st.toast("OCR context added")
 
 # ---------------- CHAT INPUT ----------------
@@ -185,17 +390,28 @@ if prompt:
         f"User name: {st.session_state.username}."
     )
 
+    # File excerpts go with the question, not the system prompt, so the
+    # system prompt and history stay the same from turn to turn.
+    question = prompt
     if current_chat["ocr_text"]:
-        system_prompt += f"\n\nContext from uploaded file:\n{current_chat['ocr_text']}"
+        index = load_context_index(current_chat["file_name"], current_chat["ocr_text"])
+        # The previous question helps with follow-ups like "fix it"
+        earlier = [m["content"] for m in current_chat["messages"][:-1] if m["role"] == "user"]
+        excerpts = retrieve_context(index, " ".join(earlier[-1:] + [prompt]))
+        if excerpts:
+            question = (
+                f"Relevant excerpts from the uploaded file ({current_chat['file_name']}):\n"
+                f"{excerpts}\n\n{prompt}"
+            )
 
     messages = [{"role": "system", "content": system_prompt}]
     messages += current_chat["messages"][:-1]
-    messages.append({"role": "user", "content": prompt})
+    messages.append({"role": "user", "content": question})
 
     try:
         with chat_container:
-            full_reply = ""
-            placeholder = st.empty()
+            parts = []
+            view = StreamingMessage(st.container())
 
             stream = ollama.chat(
                 model="codellama:7b",
@@ -204,12 +420,13 @@ if prompt:
             )
 
             for chunk in stream:
-                full_reply += chunk["message"]["content"]
-                with placeholder.container():
-                    render_assistant_message(full_reply)
+                piece = chunk["message"]["content"]
+                parts.append(piece)
+                view.feed(piece)
+            view.close()
 
             current_chat["messages"].append(
-                {"role": "assistant", "content": full_reply}
+                {"role": "assistant", "content": "".join(parts)}
             )
             st.rerun()
 
@@ -1,5 +1,9 @@
 import streamlit as st
+import ast
+import math
 import random
+import re
+import tokenize
 import time
 from datetime import datetime
 import requests
@@ -8,6 +12,25 @@ import pytesseract
 from PIL import Image
 import io
 import os
+import threading
+from collections import deque
+
+# Ollama server (override with OLLAMA_HOST to use another machine)
+OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/") + "/api/generate"
+# Streaming replies are repainted at most this many times a second
+STREAM_FPS = 20
+# OCR'd code carries license headers, blank-line runs, trailing spaces and
+# repeated lines. Python that parses keeps its exact AST; anything else
+# gets a plain-text pass.
+COMPRESS_PROMPTS = True
+MAX_LITERAL_CHARS = 200
+LICENSE_PATTERN = re.compile(r"copyright|licen[cs]e|all rights reserved", re.IGNORECASE)
+# Text that looks like source code: indentation, trailing code punctuation, keywords
+CODE_PATTERN = re.compile(r"^[ \t]+\S|[;{}():=]\s*$|\b(?:def|class|return|import|function|var|let|const|void)\b", re.MULTILINE)
+# Comment lines (but not #include/#define and other preprocessor lines)
+COMMENT_PATTERN = re.compile(r"\s*(?://|/\*|\*/|\* |#(?!\s*(?:include|define|undef|ifn?def|if|elif|else|endif|pragma|error)\b))")
+# Per-request Ollama timings (final frame + client TTFT); set to append them as JSONL
+METRICS_LOG_FILE = os.environ.get("OLLAMA_METRICS_JSONL")
 
 # Set Tesseract path explicitly
 tesseract_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -76,7 +99,7 @@ def extract_text_from_image(image):
 
 
 def ask_ollama(prompt):
-    url = "http://localhost:11434/api/generate"
+    url = OLLAMA_URL
     data = {
         "model": "llama3",
         "prompt": prompt
@@ -101,6 +124,83 @@ def ask_ollama(prompt):
         return f"⚠️ Error contacting Ollama: {str(e)}"
 
 
+def compress_prompt_text(text):
+    """Squeeze OCR'd code/text before prompting; returns (text, tokens saved, ~4 chars per token)."""
+    try:
+        tree = ast.dump(ast.parse(text))
+    except (SyntaxError, ValueError):
+        tree = None
+
+    # Lines of Python multi-line strings are copied through untouched
+    protected = set()
+    if tree is not None:
+        try:
+            for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+                if tok.type == tokenize.STRING and tok.start[0] != tok.end[0]:
+                    protected.update(range(tok.start[0], tok.end[0] + 1))
+        except (tokenize.TokenError, IndentationError):
+            tree = None
+
+    # Code keeps its inner spacing, long tokens (either may sit inside a string
+    # literal) and repeated lines; it only loses trailing spaces, extra blank
+    # lines and license headers.
+    is_code = tree is not None or bool(CODE_PATTERN.search(text))
+
+    out, comments = [], []
+
+    def flush_comments():
+        # Drop license header blocks, keep other comments
+        if not (len(comments) >= 3 and LICENSE_PATTERN.search("\n".join(comments))):
+            out.extend(comments)
+        comments.clear()
+
+    for number, line in enumerate(text.splitlines(), 1):
+        if number in protected:
+            flush_comments()
+            out.append(line)
+            continue
+        line = line.rstrip()
+        if not is_code:
+            line = re.sub(r"(?<=\S)[ \t]{2,}", " ", line)
+            line = re.sub(r"[A-Za-z0-9+/=_-]{%d,}" % MAX_LITERAL_CHARS, lambda m: m.group(0)[:MAX_LITERAL_CHARS] + "...", line)
+            # OCR tends to read a line twice
+            if out and line and line == out[-1]:
+                continue
+        if COMMENT_PATTERN.match(line):
+            comments.append(line)
+            continue
+        flush_comments()
+        if not line and (not out or not out[-1]):
+            continue
+        out.append(line)
+    flush_comments()
+
+    compressed = "\n".join(out).strip("\n")
+    if tree is not None:
+        try:
+            if ast.dump(ast.parse(compressed)) != tree:
+                compressed = text
+        except (SyntaxError, ValueError):
+            compressed = text
+
+    saved = (len(text) - len(compressed)) // 4
+    return (compressed, saved) if saved > 0 else (text, 0)
+
+
+def compressed_extracted_text():
+    """Extracted image text for a prompt, compressed once per image; shows the tokens saved."""
+    text = st.session_state.extracted_text
+    if not COMPRESS_PROMPTS:
+        return text
+    cached = st.session_state.get("compressed_text")
+    if not cached or cached[0] != text:
+        cached = (text,) + compress_prompt_text(text)
+        st.session_state.compressed_text = cached
+    if cached[2]:
+        st.caption(f"Prompt compression saved ~{cached[2]} tokens")
+    return cached[1]
+
+
 def process_image_prompt(prompt, image):
     """Process image-related prompts and return appropriate response."""
     if image is None:
@@ -130,7 +230,7 @@ def process_image_prompt(prompt, image):
                     return f"Unable to extract text from the image for code analysis: {extracted_text}"
         
         if st.session_state.get('extracted_text'):
-            code_text = st.session_state.extracted_text
+            code_text = compressed_extracted_text()
             analysis_prompt = f"Please analyze and correct this code if needed:\n\n```\n{code_text}\n```\n\nUser request: {prompt}"
             return ask_ollama(analysis_prompt)
     
@@ -146,7 +246,7 @@ def process_image_prompt(prompt, image):
                     return f"Unable to extract text from the image for execution: {extracted_text}"
         
         if st.session_state.get('extracted_text'):
-            code_text = st.session_state.extracted_text
+            code_text = compressed_extracted_text()
             execution_prompt = f"Please analyze this code and explain what the output would be:\n\n```\n{code_text}\n```\n\nUser request: {prompt}"
             return ask_ollama(execution_prompt)
     
@@ -162,7 +262,7 @@ def process_image_prompt(prompt, image):
                     return f"Unable to extract text from the image for analysis: {extracted_text}"
         
         if st.session_state.get('extracted_text'):
-            code_text = st.session_state.extracted_text
+            code_text = compressed_extracted_text()
             example_prompt = f"Based on this code/topic from the image:\n\n```\n{code_text}\n```\n\n{prompt}"
             return ask_ollama(example_prompt)
     
@@ -170,45 +270,92 @@ def process_image_prompt(prompt, image):
     elif any(keyword in prompt_lower for keyword in ["analyze", "describe", "explain", "what do you see", "what is in"]):
         analysis_prompt = f"Please analyze this image and respond to: {prompt}. The image contains text/code that has been extracted."
         if st.session_state.get('extracted_text'):
-            analysis_prompt += f"\n\nExtracted text/code:\n{st.session_state.extracted_text}"
+            analysis_prompt += f"\n\nExtracted text/code:\n{compressed_extracted_text()}"
         return ask_ollama(analysis_prompt)
     
     # If no specific image processing request, treat as general prompt with image context
     else:
         context_prompt = f"I have an uploaded image. {prompt}"
         if st.session_state.get('extracted_text'):
-            context_prompt += f"\n\nThe image contains this text/code:\n{st.session_state.extracted_text}"
+            context_prompt += f"\n\nThe image contains this text/code:\n{compressed_extracted_text()}"
         return ask_ollama(context_prompt)
 
 
+@st.cache_resource
+def ollama_metrics():
+    """Process-wide store of the last 1000 request records."""
+    return {"lock": threading.Lock(), "records": deque(maxlen=1000)}
+
+
+def record_ollama_metrics(model, started, first_token_at, frame):
+    """Store one request's client TTFT/total time and the timings in Ollama's final frame."""
+    def rate(count, ns):
+        return round(count / (ns / 1e9), 2) if count and ns else None
+
+    record = {
+        "ts": time.time(),
+        "model": model,
+        "cancelled": not frame,
+        "ttft_ms": round((first_token_at - started) * 1000, 3) if first_token_at else None,
+        "total_ms": round((time.monotonic() - started) * 1000, 3),
+        "eval_count": frame.get("eval_count"),
+        "eval_ms": frame["eval_duration"] / 1e6 if frame.get("eval_duration") else None,
+        "prompt_eval_count": frame.get("prompt_eval_count"),
+        "prompt_eval_ms": frame["prompt_eval_duration"] / 1e6 if frame.get("prompt_eval_duration") else None,
+        "load_ms": frame["load_duration"] / 1e6 if frame.get("load_duration") else None,
+        "tokens_per_s": rate(frame.get("eval_count"), frame.get("eval_duration")),
+        "prompt_tokens_per_s": rate(frame.get("prompt_eval_count"), frame.get("prompt_eval_duration")),
+    }
+    store = ollama_metrics()
+    with store["lock"]:
+        store["records"].append(record)
+        if METRICS_LOG_FILE:
+            try:
+                with open(METRICS_LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError:
+                pass
+
+
 def ask_ollama_stream(prompt, message_placeholder=None):
-    url = "http://localhost:11434/api/generate"
+    url = OLLAMA_URL
     data = {
         "model": "llama3",
         "prompt": prompt
     }
 
     try:
+        started = time.monotonic()
+        first_token_at = None
+        frame = {}
         # connection timeout 5s, read timeout 120s
         response = requests.post(url, json=data, stream=True, timeout=(5, 120))
-        full_reply = ""
+        parts = []
+        last_flush = time.monotonic()
 
         for line in response.iter_lines(decode_unicode=True):
             if line:
                 try:
                     json_line = json.loads(line)
                     part = json_line.get("response", "")
+                    if json_line.get("done"):
+                        frame = json_line
                 except Exception:
                     # If not JSON, treat as raw text
                     part = line
 
                 if part:
-                    full_reply += part
-                    if message_placeholder is not None:
-                        # Update UI incrementally as we receive chunks
-                        message_placeholder.markdown(full_reply + "▌")
-
-        return full_reply.strip()
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(part)
+                    # Repaint at most STREAM_FPS times a second, not per token
+                    if message_placeholder is not None and time.monotonic() - last_flush >= 1 / STREAM_FPS:
+                        parts = ["".join(parts)]
+                        message_placeholder.markdown(parts[0] + "▌")
+                        last_flush = time.monotonic()
+
+        record_ollama_metrics(data["model"], started, first_token_at, frame)
+        return "".join(parts).strip()
 
     except requests.exceptions.ConnectTimeout:
         return "⚠️ Connection timed out while contacting Ollama."
@@ -428,6 +575,23 @@ with st.sidebar:
         st.caption("No chat history. Start a new chat!")
     
     st.markdown("---")
+
+    # Ollama request metrics
+    with ollama_metrics()["lock"]:
+        metric_records = list(ollama_metrics()["records"])
+    if metric_records:
+        with st.expander("📊 Ollama Metrics"):
+            for key, label, unit in [("ttft_ms", "First token", "ms"), ("tokens_per_s", "Speed", "tok/s")]:
+                values = sorted(r[key] for r in metric_records if r[key] is not None)
+                if values:
+                    p50, p95, p99 = (values[max(0, math.ceil(q * len(values)) - 1)] for q in (0.5, 0.95, 0.99))
+                    st.caption(f"{label} p50/p95/p99: {p50:.0f} / {p95:.0f} / {p99:.0f} {unit}")
+            st.caption(f"{len(metric_records)} requests")
+            st.download_button(
+                "Export JSONL",
+                "".join(json.dumps(r) + "\n" for r in metric_records),
+                file_name="ollama_metrics.jsonl"
+            )
 # Main chat interface
 col1, col2, col3 = st.columns([1, 2, 1])
 